@@ -0,0 +1,387 @@
+"""Reproducible benchmarks for the LogisticsSystem hot paths
+
+Every workload is generated from a fixed seed, so two runs on the same machine time
+the same work. Each benchmark reports its best wall time over --repeat runs and,
+unless --no-memory is given, the peak traced allocation of one extra run under
+tracemalloc (NumPy buffers included). Results are written as JSON:
+
+    python benchmarks.py --sizes 1000 10000 100000 1000000 -o baseline.json
+    python benchmarks.py --compare baseline.json      # exit status 1 on regression
+"""
+
+import argparse
+import gc
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from logistics import (Depot, LogisticsSystem, Simulator, StateJournal, TrackingService, Vehicle,
+                       WorkloadGenerator, iter_distance_blocks, restore_system)
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+START = datetime(2026, 1, 1, 8)
+PACKAGES_PER_VEHICLE = 200
+HUB_COUNT = 256
+DEPOTS = ((-25.0, -25.0), (25.0, -25.0), (-25.0, 25.0), (25.0, 25.0))
+TRACKING_CLIENTS = 50
+TRACKING_REQUESTS = 10000
+
+
+# ----------------------
+# Workloads
+# ----------------------
+
+def make_system(size, seed=0, depots=()):
+    """A seeded system of `size` uniform packages and one depot vehicle per ~200 packages
+
+    Vehicle capacity leaves ~10% headroom over the expected load, so assignment places
+    nearly everything. With depot locations given, vehicles are based at them round-robin.
+    """
+    system = LogisticsSystem()
+    WorkloadGenerator(seed=seed, start=START).populate(system, size)
+    weights = system.store.weight[:size]
+    vehicle_count = max(1, size // PACKAGES_PER_VEHICLE)
+    capacity = math.ceil(1.1 * weights.sum() / vehicle_count)
+    for i, location in enumerate(depots):
+        system.add_depot(Depot(f"D{i+1}", location))
+    for i in range(vehicle_count):
+        depot = system.depots[i % len(depots)].id if depots else None
+        system.add_vehicle(Vehicle(f"V{i+1}", capacity=capacity, speed=50), depot)
+    return system
+
+
+def _assigned_system(size, seed):
+    system = make_system(size, seed)
+    system.assign_packages(mode="greedy")
+    return system
+
+
+# ----------------------
+# Benchmarks
+# ----------------------
+# Each entry maps a name to (setup, run). setup(size, seed) builds untimed state;
+# run(state) is the timed call and may return a dict of extra metrics.
+
+def _sort_ids(system):
+    system._sorted_dirty = True
+    system._ensure_sorted()
+
+
+def _sort_by_distance(system):
+    order = np.argsort(system.depot_distances(), kind="stable")
+    return {"sorted": len(order)}
+
+
+def _lookup_setup(size, seed):
+    system = make_system(size, seed)
+    system._ensure_sorted()
+    rng = np.random.default_rng(seed + 1)
+    hits = [f"P{i}" for i in rng.integers(1, size + 1, 10000).tolist()]
+    misses = [f"Q{i}" for i in range(1000)]
+    return system, hits + misses
+
+
+def _lookup_ids(state):
+    system, queries = state
+    started = time.perf_counter()
+    found = sum(system.find_package(package_id) is not None for package_id in queries)
+    elapsed = time.perf_counter() - started
+    return {"lookups": len(queries), "found": found, "per_lookup_us": elapsed / len(queries) * 1e6}
+
+
+def _lookup_prefixes(state):
+    system, queries = state
+    prefixes = [package_id[:4] for package_id in queries[:1000]]
+    started = time.perf_counter()
+    matched = sum(len(system.find_packages_by_prefix(prefix)) for prefix in prefixes)
+    elapsed = time.perf_counter() - started
+    return {"lookups": len(prefixes), "matched": matched, "per_lookup_us": elapsed / len(prefixes) * 1e6}
+
+
+def _depot_distances(system):
+    return {"distances": len(system.depot_distances())}
+
+
+def _dispatch_setup(size, seed):
+    system, queries = _lookup_setup(size, seed)
+    return system, queries[:10000]
+
+
+def _dispatch(state):
+    """Build the dispatch queue, re-prioritize 10k packages and pop 10k"""
+    system, queries = state
+    queue = system.dispatch_queue
+    for index, package_id in enumerate(queries):
+        queue.update(package_id, priority=index % 3 + 1)
+    popped = queue.pop_many(10000)
+    return {"queued": len(queue), "popped": len(popped)}
+
+
+def _hub_setup(size, seed):
+    hubs = np.random.default_rng(seed + 2).uniform(-50, 50, (HUB_COUNT, 2))
+    return make_system(size, seed), hubs
+
+
+def _nearest_hub(state):
+    """Nearest of HUB_COUNT hubs for every package, streamed in blocks so memory stays bounded"""
+    system, hubs = state
+    destinations = system.destination_array()
+    nearest = np.empty(len(destinations), dtype=np.int64)
+    for start, block in iter_distance_blocks(destinations, hubs, block_rows=4096):
+        nearest[start:start + len(block)] = block.argmin(axis=1)
+    return {"pairs": len(destinations) * len(hubs)}
+
+
+def _assign(mode):
+    def run(system):
+        report = system.assign_packages(mode=mode)
+        return {"assigned": report.assigned, "unassigned": len(report.unassigned),
+                "compactness": round(float(report.compactness), 4)}
+    return run
+
+
+def _plan_routes(system):
+    """Plan every route to convergence so the work, not a time budget, sets the time"""
+    system.plan_routes(time_budget=math.inf)
+    distance = sum(system.route_distance(vehicle) for vehicle in system.vehicles if vehicle.route)
+    return {"stops": sum(len(vehicle.route) for vehicle in system.vehicles), "distance": round(distance, 3)}
+
+
+def _depot_setup(size, seed):
+    return make_system(size, seed, DEPOTS)
+
+
+def _plan_depots(system):
+    """Shard by depot, balance overflow and plan every shard to convergence across processes"""
+    report = system.plan_depots(time_budget=None)
+    return {"assigned": report.assigned, "unassigned": len(report.unassigned),
+            "shards": int(report.segments.max()) + 1 if len(report.segments) else 0}
+
+
+def _simulate(system):
+    simulator = Simulator(system, start=START)
+    simulator.dispatch_all()
+    simulator.run()
+    return {"events": simulator.processed, "delivered": len(system.delivered_packages),
+            "virtual_hours": round(simulator.now, 3)}
+
+
+def _routed_setup(size, seed):
+    system = _assigned_system(size, seed)
+    system.plan_routes(time_budget=0)
+    return system
+
+
+def _replan_traffic(system):
+    """Slow a 5x5 zone in the middle of the map and re-plan only the routes crossing it"""
+    report = system.update_traffic("incident", (-2.5, -2.5, 2.5, 2.5), 0.25)
+    return {"vehicles": len(report.vehicles), "windows": report.windows, "stops": report.stops,
+            "hours_saved": round(report.hours_before - report.hours_after, 4)}
+
+
+def _estimate_deliveries(system):
+    """Project every routed package's delivery time from its route in one vectorized pass"""
+    return {"estimated": system.estimate_deliveries(START)}
+
+
+def _journal_restore(system):
+    """Snapshot an assigned system, journal one batch of changes, then restore it"""
+    import tempfile
+    with tempfile.TemporaryDirectory(prefix="logistics-bench-") as directory:
+        with StateJournal(system, directory) as journal:
+            rows = system.packages.rows[::10]
+            system.store.priority[rows] = 1
+            system.store.touch(rows)
+            journal.flush()
+            log_bytes = journal.log_bytes
+        restored = restore_system(directory)
+    return {"packages": len(restored.packages), "log_bytes": log_bytes}
+
+
+def _tracking_setup(size, seed):
+    system = _assigned_system(size, seed)
+    rng = np.random.default_rng(seed)
+    ids = system.store.ids
+    # Four in five lookups hit a hot set of 1000 packages, the rest are spread over everything
+    hot = rng.integers(0, min(size, 1000), TRACKING_REQUESTS)
+    cold = rng.integers(0, size, TRACKING_REQUESTS)
+    rows = np.where(rng.random(TRACKING_REQUESTS) < 0.8, hot, cold)
+    return system, [ids[row] for row in rows.tolist()]
+
+
+def _tracking_api(state):
+    """TRACKING_REQUESTS package lookups over HTTP from TRACKING_CLIENTS keep-alive clients on this core"""
+    import asyncio
+    system, package_ids = state
+    service = TrackingService(system)
+    
+    async def client(port, ids):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for package_id in ids:
+            writer.write(f"GET /packages/{package_id} HTTP/1.1\r\nHost: localhost\r\n\r\n".encode())
+            head = await reader.readuntil(b"\r\n\r\n")
+            length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+            await reader.readexactly(length)
+        writer.close()
+    
+    async def main():
+        async with await service.serve(port=0):
+            await asyncio.gather(*(client(service.port, package_ids[i::TRACKING_CLIENTS])
+                                   for i in range(TRACKING_CLIENTS)))
+    
+    asyncio.run(main())
+    return {"requests": service.requests, "batches": service.batches, "cache_hits": service.cache_hits}
+
+
+def _cold_start_setup(size, seed):
+    """The command for a fresh interpreter importing logistics; size and seed do not apply"""
+    return [sys.executable, "-X", "importtime", "-c", "import logistics"]
+
+
+def _cold_start(command):
+    """Start a new interpreter and import the headless core, as the batch CLI does"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(command, cwd=here, capture_output=True, text=True, check=True)
+    # -X importtime lines read "import time: self [us] | cumulative | module"
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            cumulative[fields[2].strip()] = int(fields[1])
+    return {"import_logistics_us": cumulative.get("logistics"), "import_numpy_us": cumulative.get("numpy")}
+
+
+BENCHMARKS = {
+    "cold_start": (_cold_start_setup, _cold_start),
+    "sort_ids": (make_system, _sort_ids),
+    "sort_by_distance": (make_system, _sort_by_distance),
+    "lookup_id": (_lookup_setup, _lookup_ids),
+    "lookup_prefix": (_lookup_setup, _lookup_prefixes),
+    "dispatch_queue": (_dispatch_setup, _dispatch),
+    "depot_distances": (make_system, _depot_distances),
+    "nearest_hub": (_hub_setup, _nearest_hub),
+    "assign_greedy": (make_system, _assign("greedy")),
+    "assign_compact": (make_system, _assign("compact")),
+    "plan_routes": (_assigned_system, _plan_routes),
+    "plan_depots": (_depot_setup, _plan_depots),
+    "simulate": (_assigned_system, _simulate),
+    "journal_restore": (_assigned_system, _journal_restore),
+    "replan_traffic": (_routed_setup, _replan_traffic),
+    "estimate_deliveries": (_routed_setup, _estimate_deliveries),
+    "tracking_api": (_tracking_setup, _tracking_api),
+}
+
+
+# ----------------------
+# Harness
+# ----------------------
+
+def measure(name, size, seed=0, repeat=3, memory=True):
+    """Run one benchmark; returns a result record"""
+    setup, run = BENCHMARKS[name]
+    times = []
+    metrics = {}
+    for _ in range(repeat):
+        state = setup(size, seed)
+        gc.collect()
+        started = time.perf_counter()
+        metrics = run(state) or {}
+        times.append(time.perf_counter() - started)
+        del state
+
+    peak = None
+    if memory:
+        state = setup(size, seed)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run(state)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        del state
+    return {"benchmark": name, "size": size, "seconds": min(times), "runs": times,
+            "peak_bytes": peak, "metrics": metrics}
+
+
+def environment():
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold, min_delta=0.005):
+    """Print time ratios against a baseline run; returns the regressed (name, size) pairs
+
+    A benchmark regresses when it is more than `threshold` times slower and also at least
+    min_delta seconds slower, so timer noise on millisecond benchmarks is not flagged.
+    """
+    previous = {(record["benchmark"], record["size"]): record for record in baseline["results"]}
+    regressions = []
+    for record in results:
+        before = previous.get((record["benchmark"], record["size"]))
+        if before is None or not before["seconds"]:
+            continue
+        ratio = record["seconds"] / before["seconds"]
+        flag = ""
+        if ratio > threshold and record["seconds"] - before["seconds"] >= min_delta:
+            flag = "  REGRESSION"
+            regressions.append((record["benchmark"], record["size"]))
+        print(f"{record['benchmark']:>18} {record['size']:>9}  {before['seconds']:.4f}s -> "
+              f"{record['seconds']:.4f}s  x{ratio:.2f}{flag}", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark LogisticsSystem hot paths")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="package counts to run")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per benchmark (best is reported)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory run")
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against an earlier JSON result")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="slowdown ratio counted as a regression (default 1.25)")
+    parser.add_argument("--min-delta", type=float, default=0.005,
+                        help="ignore slowdowns smaller than this many seconds (default 0.005)")
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        for name in args.only or BENCHMARKS:
+            record = measure(name, size, args.seed, max(1, args.repeat), not args.no_memory)
+            peak = "" if record["peak_bytes"] is None else f"  peak {record['peak_bytes'] / 2**20:.1f} MiB"
+            print(f"{name:>18} {size:>9}  {record['seconds']:.4f}s{peak}", file=sys.stderr)
+            results.append(record)
+
+    report = {"environment": environment(), "seed": args.seed, "results": results}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            handle.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        if compare(results, baseline, args.threshold, args.min_delta):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,4871 @@
+"""Headless core of the logistics optimizer: data model, planning and simulation
+
+Importing this module pulls in NumPy and the standard library only; the Tk GUI lives
+in x.py. Process pools and file formats are imported where they are first needed,
+so scripts and worker processes start quickly. Run it as a script for batch planning:
+
+    python logistics.py manifest.csv --vehicles 20 --capacity 500 --simulate -o plan.csv
+"""
+
+import functools
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+# ----------------------
+# Profiling
+# ----------------------
+
+class _Timing:
+    """Running statistics and a latency histogram for one timed operation"""
+    __slots__ = ("calls", "total", "items", "max", "buckets", "recent")
+    
+    # Bucket 0 holds calls under 1 µs, bucket i calls of [2**(i-1), 2**i) µs; the last is open-ended
+    BUCKETS = 25
+    
+    def __init__(self, recent):
+        self.calls = 0
+        self.total = 0.0
+        self.items = 0
+        self.max = 0.0
+        self.buckets = [0] * self.BUCKETS
+        self.recent = deque(maxlen=recent)  # (finished at, seconds, items)
+    
+    def add(self, seconds, items, finished):
+        self.calls += 1
+        self.total += seconds
+        self.items += items
+        self.max = max(self.max, seconds)
+        self.buckets[min(int(seconds * 1e6).bit_length(), self.BUCKETS - 1)] += 1
+        self.recent.append((finished, seconds, items))
+    
+    def summary(self):
+        latencies = np.sort([seconds for _, seconds, _ in self.recent])
+        recent_time = float(latencies.sum())
+        recent_items = sum(items for _, _, items in self.recent)
+        span = self.recent[-1][0] - self.recent[0][0] + self.recent[0][1] if self.recent else 0.0
+        return {
+            "calls": self.calls,
+            "total_s": self.total,
+            "mean_ms": self.total / self.calls * 1000 if self.calls else 0.0,
+            "p50_ms": float(np.percentile(latencies, 50)) * 1000 if len(latencies) else 0.0,
+            "p95_ms": float(np.percentile(latencies, 95)) * 1000 if len(latencies) else 0.0,
+            "max_ms": self.max * 1000,
+            "last_ms": self.recent[-1][1] * 1000 if self.recent else 0.0,
+            "items": self.items,
+            # Items per second of busy time, or calls per second of wall time for item-less operations
+            "throughput": (recent_items / recent_time if recent_items and recent_time
+                           else len(self.recent) / span if span else 0.0),
+            "histogram_us": {("<1" if index == 0 else f"<{2 ** index}" if index < self.BUCKETS - 1
+                              else f">={2 ** (index - 1)}"): count
+                             for index, count in enumerate(self.buckets) if count},
+        }
+
+
+class _Timer:
+    """Context manager recording one call of a named operation; set .items before exit"""
+    __slots__ = ("profiler", "name", "items", "started")
+    
+    def __init__(self, profiler, name, items):
+        self.profiler = profiler
+        self.name = name
+        self.items = items
+    
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        finished = time.perf_counter()
+        self.profiler.record(self.name, finished - self.started, self.items, finished)
+
+
+class _NullTimer:
+    __slots__ = ("items",)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class Profiler:
+    """Timers, counters and latency histograms around hot paths; off by default
+    
+    While disabled, timed() wrappers and timer() cost one attribute check. snapshot()
+    summarizes every operation (calls, mean/p50/p95/max latency, throughput over the
+    last `recent` calls) and export_json() saves it. enable(cprofile=True) also runs
+    cProfile, on the enabling thread only, for export_pstats().
+    """
+    
+    def __init__(self, recent=256):
+        self.enabled = False
+        self.recent = recent
+        self.timings = {}  # operation name -> _Timing
+        self.counters = {}
+        self.started = None  # wall time of the last enable() or reset()
+        self._lock = threading.Lock()  # background tasks record from worker threads
+        self._cprofile = None
+        self._cprofiling = False  # whether _cprofile is collecting right now
+    
+    def enable(self, cprofile=False):
+        if cprofile:
+            if self._cprofile is None:
+                import cProfile  # deferred: only needed for offline profiles
+                self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+            self._cprofiling = True
+        self.started = self.started or datetime.now()
+        self.enabled = True
+    
+    def disable(self):
+        self.enabled = False
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofiling = False
+    
+    def reset(self):
+        with self._lock:
+            self.timings.clear()
+            self.counters.clear()
+        self.started = datetime.now() if self.enabled else None
+        if self._cprofile is not None:
+            running = self._cprofiling
+            self._cprofile.disable()
+            self._cprofile = None
+            self._cprofiling = False
+            if running:
+                self.enable(cprofile=True)
+    
+    def record(self, name, seconds, items=0, finished=None):
+        """Add one call of `seconds` handling `items` items to the named operation"""
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = _Timing(self.recent)
+            timing.add(seconds, items, time.perf_counter() if finished is None else finished)
+    
+    def count(self, name, amount=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + amount
+    
+    def timer(self, name, items=0):
+        """with profiler.timer("stage", items=n) as timer: ... (timer.items may be set inside)"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name, items)
+    
+    def snapshot(self):
+        with self._lock:
+            return {
+                "started": self.started.isoformat(timespec="seconds") if self.started else None,
+                "operations": {name: timing.summary() for name, timing in sorted(self.timings.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+    
+    def export_json(self, path):
+        import json
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(self.snapshot(), handle, indent=2)
+            handle.write("\n")
+    
+    def export_pstats(self, path):
+        """Write cProfile statistics (load with pstats.Stats or snakeviz)"""
+        if self._cprofile is None:
+            raise ValueError("cProfile is not running; enable the profiler with cprofile=True")
+        self._cprofile.disable()
+        self._cprofile.dump_stats(path)
+        if self._cprofiling:
+            self._cprofile.enable()
+
+
+profiler = Profiler()
+
+
+def timed(name=None, items=None):
+    """Decorator recording each call with `profiler`; items(result) gives the item count"""
+    def decorate(function):
+        label = name or function.__qualname__
+        
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            result = function(*args, **kwargs)
+            finished = time.perf_counter()
+            profiler.record(label, finished - started, items(result) if items else 0, finished)
+            return result
+        return wrapper
+    return decorate
+
+
+# ----------------------
+# Core Data Models
+# ----------------------
+
+DEPOT_LOCATION = (0.0, 0.0)
+PACKAGE_STATUSES = ("sorting", "processed", "in-transit", "delivered")
+_STATUS_CODES = {status: code for code, status in enumerate(PACKAGE_STATUSES)}
+_NO_TIME = np.datetime64("NaT", "us")
+
+
+class PackageStore:
+    """Struct-of-arrays package storage: one NumPy column per field, one row per package"""
+    
+    # Column name -> dtype; timestamps are naive datetime64 with NaT for "not set"
+    COLUMNS = {
+        "x": np.float64,
+        "y": np.float64,
+        "priority": np.int8,
+        "weight": np.float64,
+        "status": np.int8,  # code into PACKAGE_STATUSES
+        "vehicle": np.int32,  # code into vehicle_ids, -1 when unassigned
+        "depot": np.int32,  # code into depot_ids, -1 until routed through a depot
+        "pickup_time": "datetime64[us]",
+        "estimated_delivery": "datetime64[us]",
+        "actual_delivery": "datetime64[us]",
+        "eta": "datetime64[us]",  # latest projected arrival on the vehicle's route
+        "version": np.int64,  # store revision of the row's last change
+    }
+    
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.revision = 0  # bumped by every append or touch
+        self.ids = []
+        self.vehicle_ids = []  # categories for the vehicle column
+        self._vehicle_codes = {}
+        self.depot_ids = []  # categories for the depot column
+        self._depot_codes = {}
+        for name, dtype in self.COLUMNS.items():
+            setattr(self, name, np.empty(max(capacity, 1), dtype=dtype))
+    
+    def __len__(self):
+        return self.size
+    
+    @property
+    def capacity(self):
+        return len(self.x)
+    
+    def reserve(self, capacity):
+        """Grow every column to hold at least capacity rows"""
+        if capacity <= self.capacity:
+            return
+        capacity = max(capacity, self.capacity * 2)
+        for name in self.COLUMNS:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+    
+    def append(self, id, x, y, priority, weight):
+        """Append one package in the "sorting" state and return its row"""
+        row = self.size
+        self.reserve(row + 1)
+        self.ids.append(id)
+        self.x[row] = x
+        self.y[row] = y
+        self.priority[row] = priority
+        self.weight[row] = weight
+        self.status[row] = _STATUS_CODES["sorting"]
+        self.vehicle[row] = -1
+        self.depot[row] = -1
+        self.pickup_time[row] = _NO_TIME
+        self.estimated_delivery[row] = _NO_TIME
+        self.actual_delivery[row] = _NO_TIME
+        self.eta[row] = _NO_TIME
+        self.revision += 1
+        self.version[row] = self.revision
+        self.size += 1
+        return row
+    
+    def append_many(self, ids, x, y, priority, weight, estimated_delivery=None):
+        """Append a batch of packages with vectorized column writes; returns the row range"""
+        start = self.size
+        end = start + len(ids)
+        self.reserve(end)
+        self.ids.extend(ids)
+        self.x[start:end] = x
+        self.y[start:end] = y
+        self.priority[start:end] = priority
+        self.weight[start:end] = weight
+        self.status[start:end] = _STATUS_CODES["sorting"]
+        self.vehicle[start:end] = -1
+        self.depot[start:end] = -1
+        self.pickup_time[start:end] = _NO_TIME
+        self.estimated_delivery[start:end] = _NO_TIME if estimated_delivery is None else estimated_delivery
+        self.actual_delivery[start:end] = _NO_TIME
+        self.eta[start:end] = _NO_TIME
+        self.revision += 1
+        self.version[start:end] = self.revision
+        self.size = end
+        return range(start, end)
+    
+    def append_from(self, other, row):
+        """Copy a row from another store (e.g. a standalone Package) and return the new row"""
+        new_row = self.append(other.ids[row], other.x[row], other.y[row], other.priority[row], other.weight[row])
+        for name in ("status", "pickup_time", "estimated_delivery", "actual_delivery", "eta"):
+            getattr(self, name)[new_row] = getattr(other, name)[row]
+        code = other.vehicle[row]
+        self.vehicle[new_row] = -1 if code < 0 else self.vehicle_code(other.vehicle_ids[code])
+        code = other.depot[row]
+        self.depot[new_row] = -1 if code < 0 else self.depot_code(other.depot_ids[code])
+        return new_row
+    
+    def touch(self, rows):
+        """Stamp rows as changed; writers that bypass Package views must call this"""
+        self.revision += 1
+        self.version[rows] = self.revision
+    
+    def changed_since(self, revision):
+        """Rows appended or touched after the given store revision"""
+        return np.flatnonzero(self.version[:self.size] > revision)
+    
+    def vehicle_code(self, vehicle_id):
+        """Return the categorical code for a vehicle ID, registering it if new"""
+        code = self._vehicle_codes.get(vehicle_id)
+        if code is None:
+            code = self._vehicle_codes[vehicle_id] = len(self.vehicle_ids)
+            self.vehicle_ids.append(vehicle_id)
+        return code
+    
+    def depot_code(self, depot_id):
+        """Return the categorical code for a depot ID, registering it if new"""
+        code = self._depot_codes.get(depot_id)
+        if code is None:
+            code = self._depot_codes[depot_id] = len(self.depot_ids)
+            self.depot_ids.append(depot_id)
+        return code
+    
+    def mask(self, status=None, priority=None, vehicle=None, depot=None):
+        """Vectorized boolean filter over all rows; None means "any" for that field"""
+        mask = np.ones(self.size, dtype=bool)
+        if status is not None:
+            mask &= self.status[:self.size] == _STATUS_CODES[status]
+        if priority is not None:
+            mask &= self.priority[:self.size] == priority
+        if vehicle is not None:
+            code = self._vehicle_codes.get(vehicle, -2)
+            mask &= self.vehicle[:self.size] == code
+        if depot is not None:
+            code = self._depot_codes.get(depot, -2)
+            mask &= self.depot[:self.size] == code
+        return mask
+    
+    def nbytes(self):
+        """Bytes held by the NumPy columns (excluding the ID strings)"""
+        return sum(getattr(self, name).nbytes for name in self.COLUMNS)
+
+
+def _timestamp_property(column):
+    """Property reading and writing a datetime64 column as datetime/None"""
+    def getter(self):
+        value = getattr(self._store, column)[self._row]
+        return None if np.isnat(value) else value.item()
+    
+    def setter(self, value):
+        getattr(self._store, column)[self._row] = _NO_TIME if value is None else np.datetime64(value, "us")
+        self._store.touch(self._row)
+    
+    return property(getter, setter)
+
+
+class Package:
+    """Lightweight view of one row in a PackageStore
+    
+    A package created directly gets a private one-row store; LogisticsSystem.add_package
+    copies it into the system's store and rebinds this view, so existing references keep
+    reading live data.
+    """
+    __slots__ = ("_store", "_row")
+    
+    def __init__(self, id, destination, priority, weight):
+        self._store = PackageStore(capacity=1)
+        self._row = self._store.append(id, destination[0], destination[1], priority, weight)
+    
+    @classmethod
+    def _view(cls, store, row):
+        package = cls.__new__(cls)
+        package._store = store
+        package._row = row
+        return package
+    
+    @property
+    def id(self):
+        return self._store.ids[self._row]
+    
+    @property
+    def destination(self):
+        """(x, y) coordinates"""
+        return (float(self._store.x[self._row]), float(self._store.y[self._row]))
+    
+    @destination.setter
+    def destination(self, value):
+        self._store.x[self._row], self._store.y[self._row] = value
+        self._store.touch(self._row)
+    
+    @property
+    def priority(self):
+        """1 (highest) to 3 (lowest)"""
+        return int(self._store.priority[self._row])
+    
+    @priority.setter
+    def priority(self, value):
+        self._store.priority[self._row] = value
+        self._store.touch(self._row)
+    
+    @property
+    def weight(self):
+        return float(self._store.weight[self._row])
+    
+    @weight.setter
+    def weight(self, value):
+        self._store.weight[self._row] = value
+        self._store.touch(self._row)
+    
+    @property
+    def status(self):
+        """sorting, processed, in-transit, delivered"""
+        return PACKAGE_STATUSES[self._store.status[self._row]]
+    
+    @status.setter
+    def status(self, value):
+        self._store.status[self._row] = _STATUS_CODES[value]
+        self._store.touch(self._row)
+    
+    @property
+    def assigned_vehicle(self):
+        """ID of the assigned vehicle, or None"""
+        code = self._store.vehicle[self._row]
+        return None if code < 0 else self._store.vehicle_ids[code]
+    
+    @assigned_vehicle.setter
+    def assigned_vehicle(self, value):
+        self._store.vehicle[self._row] = -1 if value is None else self._store.vehicle_code(value)
+        self._store.touch(self._row)
+    
+    @property
+    def depot(self):
+        """ID of the depot the package ships from, or None"""
+        code = self._store.depot[self._row]
+        return None if code < 0 else self._store.depot_ids[code]
+    
+    @depot.setter
+    def depot(self, value):
+        self._store.depot[self._row] = -1 if value is None else self._store.depot_code(value)
+        self._store.touch(self._row)
+    
+    pickup_time = _timestamp_property("pickup_time")
+    estimated_delivery = _timestamp_property("estimated_delivery")
+    actual_delivery = _timestamp_property("actual_delivery")
+    eta = _timestamp_property("eta")
+    
+    def __eq__(self, other):
+        if not isinstance(other, Package):
+            return NotImplemented
+        return self._store is other._store and self._row == other._row
+    
+    def __hash__(self):
+        return hash(self.id)
+    
+    def __repr__(self):
+        return f"Package({self.id}, priority={self.priority}, status={self.status})"
+
+
+class PackageList:
+    """List-like sequence of store rows that materializes Package views on access
+    
+    Keeps a row -> position map so a row can be removed in O(1) by swapping the
+    last row into its slot.
+    """
+    
+    def __init__(self, store):
+        self.store = store
+        self._rows = np.empty(1024, dtype=np.int32)
+        self._positions = np.full(1024, -1, dtype=np.int32)  # row -> position, -1 if absent
+        self._size = 0
+    
+    def __len__(self):
+        return self._size
+    
+    def __iter__(self):
+        store = self.store
+        for row in self._rows[:self._size].tolist():
+            yield Package._view(store, row)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Package._view(self.store, row) for row in self._rows[:self._size][index].tolist()]
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("package index out of range")
+        return Package._view(self.store, int(self._rows[index]))
+    
+    def __contains__(self, package):
+        return (package._store is self.store and package._row < len(self._positions)
+                and self._positions[package._row] >= 0)
+    
+    @property
+    def rows(self):
+        """Store rows in list order, as a read-only NumPy view"""
+        rows = self._rows[:self._size]
+        rows.flags.writeable = False
+        return rows
+    
+    def _reserve(self, size, max_row):
+        if size > len(self._rows):
+            self._rows = np.resize(self._rows, max(size, len(self._rows) * 2))
+        if max_row >= len(self._positions):
+            grown = np.full(max(max_row + 1, len(self._positions) * 2), -1, dtype=np.int32)
+            grown[:len(self._positions)] = self._positions
+            self._positions = grown
+    
+    def append_rows(self, rows):
+        """Append store rows (an int or an array/range of ints)"""
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int32))
+        if not len(rows):
+            return
+        start = self._size
+        end = start + len(rows)
+        self._reserve(end, int(rows.max()))
+        self._rows[start:end] = rows
+        self._positions[rows] = np.arange(start, end, dtype=np.int32)
+        self._size = end
+    
+    def remove_row(self, row):
+        """Remove a store row in O(1); list order is not preserved"""
+        position = self._positions[row]
+        if position < 0:
+            raise ValueError(f"row {row} is not in this list")
+        last = self._rows[self._size - 1]
+        self._rows[position] = last
+        self._positions[last] = position
+        self._positions[row] = -1
+        self._size -= 1
+
+
+class Vehicle:
+    def __init__(self, id, capacity=100, speed=50):
+        self.id = id
+        self.capacity = capacity  # Maximum weight capacity
+        self.speed = speed  # Movement speed
+        self.location = (0, 0)  # Start at depot
+        self.home = DEPOT_LOCATION  # Depot the vehicle returns to
+        self.depot = None  # ID of the home depot; None for the default depot at DEPOT_LOCATION
+        self.status = "available"  # available, loading, in-transit, returning
+        self.packages = []
+        self.route = []  # packages in planned stop order
+    
+    def __repr__(self):
+        return f"Vehicle({self.id}, {self.status}, packages={len(self.packages)})"
+    
+    def planned_stops(self):
+        """Packages in driving order: the planned route, then any assigned since it was planned"""
+        rows = {package._row for package in self.packages}
+        stops = [package for package in self.route if package._row in rows]
+        if len(stops) < len(rows):
+            routed = {package._row for package in stops}
+            stops += [package for package in self.packages if package._row not in routed]
+        return stops
+    
+    def calculate_travel_time(self, destination, network=None):
+        """Calculate travel time to destination in hours, on the RoadNetwork if one is given"""
+        if network is not None:
+            return network.travel_time(self.location, destination) * network.reference_speed / self.speed
+        distance = calculate_distance(self.location, destination)
+        return distance / self.speed  # Time = distance / speed
+    
+    def calculate_travel_times(self, destinations, dtype=np.float64, network=None):
+        """Vectorized calculate_travel_time for an (n, 2) array of destinations"""
+        if network is not None:
+            times = network.travel_times(self.location, destinations).astype(dtype)
+            times *= network.reference_speed / self.speed
+            return times
+        times = distances_from(self.location, destinations, dtype=dtype)
+        times /= self.speed
+        return times
+
+
+class Depot:
+    """A hub that vehicles are based at and packages ship from"""
+    
+    def __init__(self, id, location=DEPOT_LOCATION):
+        self.id = id
+        self.location = (float(location[0]), float(location[1]))
+    
+    def __repr__(self):
+        return f"Depot({self.id}, {self.location})"
+
+
+# ----------------------
+# Logistics System
+# ----------------------
+
+class LogisticsSystem:
+    def __init__(self):
+        # Package data lives column-wise in the store; the lists below hold store rows
+        self.store = PackageStore()
+        self.packages = PackageList(self.store)
+        self.vehicles = []
+        self.depots = []  # empty means the single default depot at DEPOT_LOCATION
+        self.delivered_packages = PackageList(self.store)
+        
+        # ID indexes kept in sync with the lists above
+        self._package_index = {}  # package id -> store row (active and delivered)
+        self._vehicle_index = {}  # vehicle id -> vehicle
+        self._depot_index = {}  # depot id -> index into depots
+        
+        # Sorted IDs for binary search, rebuilt lazily after inserts
+        self._sorted_ids = []
+        self._natural_ids = []
+        self._sorted_dirty = False
+        
+        # Spatial index over active destinations, built on first spatial query
+        self._spatial_index = None
+        self._spatial_revision = -1  # store revision the index last caught up with
+        
+        # Heap of sorting packages in dispatch order, built on first use
+        self._dispatch_queue = None
+        
+        # Traffic zones, and per-vehicle route rows and bounding boxes for finding affected routes
+        self.traffic = TrafficZones()
+        self.road_network = None  # a RoadNetwork to drive on instead of straight lines
+        self._route_cache = {}  # vehicle id -> (route list, length, rows, box)
+        
+        # On-time aggregates, updated by deliver_package
+        self.delivery_stats = DeliveryStats()
+    
+    def add_package(self, package):
+        if package.id in self._package_index:
+            raise ValueError(f"Duplicate package ID: {package.id}")
+        if package._store is not self.store:
+            # Adopt the package's data and point the caller's view at the system store
+            row = self.store.append_from(package._store, package._row)
+            package._store, package._row = self.store, row
+        self._package_index[package.id] = package._row
+        if package.status == "delivered":
+            self.delivered_packages.append_rows(package._row)
+            self.delivery_stats.record(self.store, package._row)
+        else:
+            self.packages.append_rows(package._row)
+            if self._spatial_index is not None:
+                self._spatial_index.insert(package._row)
+        self._sorted_dirty = True
+    
+    def add_packages(self, ids, x, y, priority, weight, estimated_delivery=None):
+        """Bulk-append packages from column arrays without building Package objects"""
+        ids = list(ids)
+        if len(set(ids)) != len(ids) or not self._package_index.keys().isdisjoint(ids):
+            raise ValueError("Duplicate package IDs in batch")
+        rows = self.store.append_many(ids, x, y, priority, weight, estimated_delivery)
+        self._package_index.update(zip(ids, rows))
+        self.packages.append_rows(rows)
+        if self._spatial_index is not None:
+            self._spatial_index.insert(np.arange(rows.start, rows.stop))
+        self._sorted_dirty = True
+        return rows
+    
+    def add_vehicle(self, vehicle, depot=None):
+        """Add a vehicle, based at the depot with the given ID if one is given"""
+        if vehicle.id in self._vehicle_index:
+            raise ValueError(f"Duplicate vehicle ID: {vehicle.id}")
+        if depot is not None:
+            location = self.depots[self._depot_index[depot]].location
+            vehicle.depot, vehicle.home, vehicle.location = depot, location, location
+        self._vehicle_index[vehicle.id] = vehicle
+        self.vehicles.append(vehicle)
+    
+    def add_depot(self, depot):
+        if depot.id in self._depot_index:
+            raise ValueError(f"Duplicate depot ID: {depot.id}")
+        self._depot_index[depot.id] = len(self.depots)
+        self.depots.append(depot)
+    
+    def deliver_package(self, package_id, delivered_at=None):
+        """Move a package from the active list to delivered_packages in O(1)"""
+        row = self._package_index[package_id]
+        self.packages.remove_row(row)
+        if self._spatial_index is not None:
+            self._spatial_index.remove(row)
+        package = Package._view(self.store, row)
+        package.status = "delivered"
+        package.actual_delivery = delivered_at or datetime.now()
+        self.delivered_packages.append_rows(row)
+        self.delivery_stats.record(self.store, row)
+        profiler.count("deliveries")
+        return package
+    
+    def package_mask(self, status=None, priority=None, vehicle=None, depot=None):
+        """Boolean mask over store rows, e.g. package_mask(status="sorting", priority=1)"""
+        return self.store.mask(status=status, priority=priority, vehicle=vehicle, depot=depot)
+    
+    def select_packages(self, status=None, priority=None, vehicle=None, depot=None):
+        """Package views matching the filter, evaluated as one vectorized mask"""
+        rows = np.flatnonzero(self.package_mask(status, priority, vehicle, depot))
+        return [Package._view(self.store, row) for row in rows.tolist()]
+    
+    # ----------------------
+    # Batch Distances
+    # ----------------------
+    
+    def destination_array(self, rows=None, dtype=np.float64):
+        """(n, 2) array of package destinations for the given store rows (default: active packages)"""
+        if rows is None:
+            rows = self.packages.rows
+        return np.column_stack((self.store.x[rows], self.store.y[rows])).astype(dtype, copy=False)
+    
+    def depot_distances(self, rows=None, dtype=np.float64):
+        """Distance from the nearest depot to every selected package destination"""
+        points = self.destination_array(rows, dtype)
+        if len(self.depots) < 2:
+            return distances_from(self.depot_locations()[0], points, dtype=dtype)
+        return nearest_origins(self.depot_locations(), points, dtype=dtype)[1]
+    
+    def depot_locations(self, dtype=np.float64):
+        """(depots, 2) array of depot locations; just DEPOT_LOCATION when none are defined"""
+        if not self.depots:
+            return np.array([DEPOT_LOCATION], dtype=dtype)
+        return np.array([depot.location for depot in self.depots], dtype=dtype)
+    
+    def vehicle_distance_matrix(self, rows=None, dtype=np.float64):
+        """(vehicles, packages) matrix of distances from each vehicle's location"""
+        return distance_matrix(vehicle_locations(self.vehicles), self.destination_array(rows, dtype), dtype=dtype)
+    
+    def vehicle_travel_time_matrix(self, rows=None, dtype=np.float64):
+        """(vehicles, packages) matrix of travel times in hours"""
+        return travel_time_matrix(self.vehicles, self.destination_array(rows, dtype), dtype=dtype,
+                                  network=self.road_network)
+    
+    # ----------------------
+    # Spatial Queries
+    # ----------------------
+    
+    @property
+    def spatial_index(self):
+        """SpatialGrid over active package destinations, kept in sync once built
+        
+        Adds and deliveries update it directly. Packages whose destination was changed are
+        found among the rows touched since the last spatial query and re-filed.
+        """
+        if self._spatial_index is None:
+            self._spatial_index = SpatialGrid(self.store)
+            self._spatial_index.build(self.packages.rows)
+        elif self.store.revision != self._spatial_revision:
+            self._spatial_index.refile(self.store.changed_since(self._spatial_revision))
+        self._spatial_revision = self.store.revision
+        return self._spatial_index
+    
+    def nearest_packages(self, point, k=1):
+        """The k active packages closest to point, nearest first"""
+        return [Package._view(self.store, row) for row in self.spatial_index.nearest(point, k).tolist()]
+    
+    def packages_within(self, point, radius):
+        """Active packages within radius of point, nearest first"""
+        return [Package._view(self.store, row) for row in self.spatial_index.within(point, radius).tolist()]
+    
+    def packages_in_box(self, x0, y0, x1, y1):
+        """Active packages whose destination lies in the rectangle [x0, x1] x [y0, y1]"""
+        return [Package._view(self.store, row) for row in self.spatial_index.in_box(x0, y0, x1, y1).tolist()]
+    
+    # ----------------------
+    # Dispatch
+    # ----------------------
+    
+    @property
+    def dispatch_queue(self):
+        """DispatchQueue of sorting packages by priority then deadline; follows store changes"""
+        if self._dispatch_queue is None:
+            self._dispatch_queue = DispatchQueue(self)
+        return self._dispatch_queue
+    
+    # ----------------------
+    # Assignment
+    # ----------------------
+    
+    @timed(items=lambda report: report.assigned)
+    def assign_packages(self, mode="greedy", time_budget=2.0):
+        """Assign "sorting" packages to vehicles within each vehicle's capacity
+        
+        Packages are taken in priority order (1 first), heaviest first within a priority,
+        so capacity shortfalls mostly leave low-priority packages behind. Packages that
+        do not fit stay in "sorting" and are listed in the report.
+        
+        mode="greedy": first-fit decreasing into vehicles in fleet order.
+        mode="compact": sweep by angle around the depot, then refine with capacitated
+        k-means moves until time_budget seconds have passed, giving geographically tight loads.
+        """
+        started = time.perf_counter()
+        rows = np.flatnonzero(self.package_mask(status="sorting"))
+        weights = self.store.weight[rows]
+        priorities = self.store.priority[rows]
+        capacities, loads, remaining = self._vehicle_capacity_state()
+        
+        points = self.destination_array(rows)
+        bins = assign_bins(points, weights, priorities, remaining, mode, started + time_budget)
+        
+        self._apply_assignment(rows, bins)
+        return self._assignment_report(mode, rows, bins, points, weights, capacities, loads, started)
+    
+    def _assignment_report(self, mode, rows, bins, points, weights, capacities, loads, started, segments=None):
+        centroids = _bin_centroids(points, bins, len(self.vehicles))
+        new_loads = np.bincount(bins[bins >= 0], weights=weights[bins >= 0], minlength=len(self.vehicles))
+        utilization = {}
+        for vehicle, capacity, load in zip(self.vehicles, capacities.tolist(), (loads + new_loads).tolist()):
+            utilization[vehicle.id] = (load, capacity, load / capacity if capacity else 0.0)
+        
+        return AssignmentReport(
+            mode,
+            assigned=int((bins >= 0).sum()),
+            unassigned=rows[bins < 0],
+            utilization=utilization,
+            compactness=_compactness(points, bins, centroids),
+            elapsed=time.perf_counter() - started,
+            segments=segments,
+        )
+    
+    def _vehicle_capacity_state(self):
+        """Capacities, current loads and free capacity per vehicle, as arrays"""
+        capacities = np.array([vehicle.capacity for vehicle in self.vehicles], dtype=np.float64)
+        loads = np.array([sum(package.weight for package in vehicle.packages) for vehicle in self.vehicles],
+                         dtype=np.float64).reshape(-1)
+        return capacities, loads, np.maximum(capacities - loads, 0.0)
+    
+    @timed(items=lambda report: report.assigned)
+    def plan_fleet(self, segment_count=None, method="bisection", workers=None, seed=0, mode="compact",
+                   construction="nearest", respect_priority=True, time_budget=None):
+        """Divide-and-conquer planning: segment the area, solve segments in parallel, merge
+        
+        Sorting packages are split into load-balanced segments (see segment_destinations),
+        vehicles are shared out by segment load, and each segment is assigned and routed in
+        its own worker process. Packages a segment could not place are then inserted, at the
+        boundary, into whichever route has room and the cheapest insertion nearby.
+        
+        By default there is one segment per SEGMENT_PACKAGES packages, whatever the number
+        of workers. With time_budget=None every stage runs to convergence, so the plan
+        depends only on the inputs and seed. A time budget (seconds per segment) bounds
+        runtime instead.
+        """
+        started = time.perf_counter()
+        workers = workers or os.cpu_count() or 1
+        rows = np.flatnonzero(self.package_mask(status="sorting"))
+        points = self.destination_array(rows)
+        weights = self.store.weight[rows]
+        priorities = self.store.priority[rows]
+        capacities, loads, remaining = self._vehicle_capacity_state()
+        if not len(self.vehicles):
+            raise ValueError("plan_fleet needs at least one vehicle")
+        
+        if segment_count is None:
+            segment_count = -(-len(rows) // SEGMENT_PACKAGES)
+        segment_count = max(1, min(segment_count, len(self.vehicles), len(rows)))
+        labels = segment_destinations(points, weights, segment_count, method=method, seed=seed)
+        owners = _allocate_vehicles(np.bincount(labels, weights=weights, minlength=segment_count), remaining)
+        
+        bins = self._solve_shards(rows, points, weights, priorities, remaining, labels, owners,
+                                  [DEPOT_LOCATION] * segment_count, workers, mode, construction,
+                                  respect_priority, time_budget)
+        return self._assignment_report(f"segmented-{method}", rows, bins, points, weights, capacities, loads,
+                                       started, segments=labels)
+    
+    @timed(items=lambda report: report.assigned)
+    def plan_depots(self, workers=None, regions=None, neighbours=2, method="bisection", seed=0, mode="compact",
+                    construction="nearest", respect_priority=True, time_budget=None):
+        """Multi-depot planning: shard sorting packages by depot and plan each shard in its own process
+        
+        Every package goes to its nearest depot. A coordinator then moves the overflow of
+        depots loaded past their fleet's free capacity to whichever of their `neighbours`
+        nearest depots has room (see _balance_depots). Each depot's packages are split into
+        `regions` load-balanced regions sharing out the depot's vehicles (by default enough
+        shards to keep every worker busy), and the shards are assigned and routed as in
+        plan_fleet. Vehicles without a depot belong to the one nearest their home. The
+        depot column records where each package ships from.
+        """
+        started = time.perf_counter()
+        if not self.depots:
+            raise ValueError("plan_depots needs at least one depot")
+        if not len(self.vehicles):
+            raise ValueError("plan_depots needs at least one vehicle")
+        workers = workers or os.cpu_count() or 1
+        rows = np.flatnonzero(self.package_mask(status="sorting"))
+        points = self.destination_array(rows)
+        weights = self.store.weight[rows]
+        priorities = self.store.priority[rows]
+        capacities, loads, remaining = self._vehicle_capacity_state()
+        depot_points = self.depot_locations()
+        homes = self._vehicle_depots()
+        
+        free = np.bincount(homes, weights=remaining, minlength=len(self.depots))
+        nearest = nearest_origins(depot_points, points)[0]
+        depots = _balance_depots(points, weights, priorities, nearest, depot_points, free, neighbours)
+        
+        # Split each depot into regions; packages of a depot without vehicles stay unlabelled (-1)
+        if regions is None:
+            regions = -(-workers // len(self.depots))
+        labels = np.full(len(rows), -1, dtype=np.int32)
+        owners = np.full(len(self.vehicles), -1, dtype=np.int32)
+        starts = []
+        for depot in range(len(self.depots)):
+            members = np.flatnonzero(depots == depot)
+            fleet = np.flatnonzero(homes == depot)
+            if not len(members) or not len(fleet):
+                continue
+            count = max(1, min(regions, len(members), len(fleet)))
+            local = segment_destinations(points[members], weights[members], count, method=method, seed=seed)
+            labels[members] = len(starts) + local
+            owners[fleet] = len(starts) + _allocate_vehicles(
+                np.bincount(local, weights=weights[members], minlength=count), remaining[fleet])
+            starts += [self.depots[depot].location] * count
+        
+        bins = self._solve_shards(rows, points, weights, priorities, remaining, labels, owners, starts, workers,
+                                  mode, construction, respect_priority, time_budget)
+        placed = bins >= 0
+        depots[placed] = homes[bins[placed]]
+        codes = np.array([self.store.depot_code(depot.id) for depot in self.depots], dtype=np.int32)
+        self.store.depot[rows] = codes[depots]
+        self.store.touch(rows)
+        return self._assignment_report("depots", rows, bins, points, weights, capacities, loads, started,
+                                       segments=labels)
+    
+    def _vehicle_depots(self):
+        """Index into depots of each vehicle's depot, or of the one nearest its home"""
+        homes = nearest_origins(self.depot_locations(), [vehicle.home for vehicle in self.vehicles])[0]
+        for index, vehicle in enumerate(self.vehicles):
+            if vehicle.depot is not None:
+                homes[index] = self._depot_index[vehicle.depot]
+        return homes
+    
+    def _solve_shards(self, rows, points, weights, priorities, remaining, labels, owners, depots, workers, mode,
+                      construction, respect_priority, time_budget):
+        """Assign and route every shard in worker processes, merge, place leftovers and apply
+        
+        Shard s holds the packages labelled s and the vehicles owned by s, and sweeps around
+        depots[s]. Returns the vehicle index per row, -1 where nothing had room.
+        """
+        shard_count = len(depots)
+        members = [np.flatnonzero(labels == shard) for shard in range(shard_count)]
+        fleets = [np.flatnonzero(owners == shard) for shard in range(shard_count)]
+        tasks = [{
+            "points": points[member],
+            "weights": weights[member],
+            "priorities": priorities[member],
+            "remaining": remaining[fleet],
+            "starts": [self.vehicles[index].location for index in fleet.tolist()],
+            "depot": depot,
+            "mode": mode,
+            "construction": construction,
+            "respect_priority": respect_priority,
+            "time_budget": math.inf if time_budget is None else time_budget,
+        } for member, fleet, depot in zip(members, fleets, depots)]
+        
+        if workers == 1 or shard_count <= 1:
+            results = [_solve_segment(task) for task in tasks]
+        else:
+            from concurrent.futures import ProcessPoolExecutor  # deferred: costly to import
+            with ProcessPoolExecutor(max_workers=min(workers, shard_count)) as executor:
+                results = list(executor.map(_solve_segment, tasks))
+        
+        # Merge shard solutions into fleet-wide bins and routes (positions into rows)
+        bins = np.full(len(rows), -1, dtype=np.int32)
+        routes = [np.empty(0, dtype=np.int64) for _ in self.vehicles]
+        for member, fleet, (segment_bins, segment_routes) in zip(members, fleets, results):
+            placed = segment_bins >= 0
+            bins[member[placed]] = fleet[segment_bins[placed]]
+            for local, route in enumerate(segment_routes):
+                routes[fleet[local]] = member[route]
+        
+        self._merge_leftovers(bins, routes, points, weights, priorities, remaining, respect_priority)
+        
+        self._apply_assignment(rows, bins)
+        for vehicle, route in zip(self.vehicles, routes):
+            vehicle.route = vehicle.route + [Package._view(self.store, row) for row in rows[route].tolist()]
+        return bins
+    
+    def _merge_leftovers(self, bins, routes, points, weights, priorities, remaining, respect_priority):
+        """Insert packages no segment could place into the nearest route with room"""
+        leftovers = np.flatnonzero(bins < 0)
+        if not len(leftovers):
+            return
+        free = remaining - np.bincount(bins[bins >= 0], weights=weights[bins >= 0], minlength=len(remaining))
+        starts = vehicle_locations(self.vehicles)
+        for index in leftovers[np.lexsort((-weights[leftovers], priorities[leftovers]))].tolist():
+            candidates = np.flatnonzero(free >= weights[index])
+            if not len(candidates):
+                continue
+            # Compare routes by their mean stop position (start location for empty routes)
+            anchors = np.array([points[routes[v]].mean(axis=0) if len(routes[v]) else starts[v]
+                                for v in candidates.tolist()])
+            vehicle = int(candidates[distances_from(points[index], anchors).argmin()])
+            position, _ = _cheapest_insertion(points, routes[vehicle], starts[vehicle], points[index],
+                                              priorities if respect_priority else None, priorities[index])
+            routes[vehicle] = np.insert(routes[vehicle], position, index)
+            bins[index] = vehicle
+            free[vehicle] -= weights[index]
+    
+    def _apply_assignment(self, rows, bins):
+        """Write vehicle codes and "processed" status column-wise, then fill Vehicle.packages"""
+        assigned = bins >= 0
+        codes = np.array([self.store.vehicle_code(vehicle.id) for vehicle in self.vehicles], dtype=np.int32)
+        assigned_rows = rows[assigned]
+        self.store.vehicle[assigned_rows] = codes[bins[assigned]]
+        self.store.status[assigned_rows] = _STATUS_CODES["processed"]
+        self.store.touch(assigned_rows)
+        
+        # Group rows by vehicle with one stable sort instead of a per-package append
+        order = np.argsort(bins[assigned], kind="stable")
+        grouped = assigned_rows[order]
+        bounds = np.searchsorted(bins[assigned][order], np.arange(len(self.vehicles) + 1))
+        for index, vehicle in enumerate(self.vehicles):
+            vehicle_rows = grouped[bounds[index]:bounds[index + 1]].tolist()
+            vehicle.packages.extend(Package._view(self.store, row) for row in vehicle_rows)
+    
+    # ----------------------
+    # Routing
+    # ----------------------
+    
+    @timed(items=len)
+    def plan_route(self, vehicle, time_budget=1.0, construction="nearest", respect_priority=True,
+                   neighbour_count=10):
+        """Order a vehicle's assigned packages into vehicle.route and return it"""
+        if not vehicle.packages:
+            vehicle.route = []
+            return vehicle.route
+        rows = np.array([package._row for package in vehicle.packages], dtype=np.int64)
+        order = optimize_route(
+            self.destination_array(rows),
+            start=vehicle.location,
+            priorities=self.store.priority[rows] if respect_priority else None,
+            construction=construction,
+            time_budget=time_budget,
+            neighbour_count=neighbour_count,
+        )
+        vehicle.route = [vehicle.packages[index] for index in order.tolist()]
+        return vehicle.route
+    
+    def route_distance(self, vehicle):
+        """Length of a vehicle's planned route, returning to where it started"""
+        rows = np.array([package._row for package in vehicle.route], dtype=np.int64)
+        return route_length(self.destination_array(rows), np.arange(len(rows)), start=vehicle.location)
+    
+    @timed()
+    def plan_routes(self, time_budget=5.0, progress=None, **options):
+        """Plan every vehicle's route, sharing time_budget in proportion to stop count
+        
+        progress, if given, is called with the fraction of stops planned after each vehicle.
+        """
+        total = sum(len(vehicle.packages) for vehicle in self.vehicles) or 1
+        planned = 0
+        for vehicle in self.vehicles:
+            self.plan_route(vehicle, time_budget=time_budget * len(vehicle.packages) / total, **options)
+            planned += len(vehicle.packages)
+            if progress:
+                progress(planned / total)
+    
+    # ----------------------
+    # Traffic
+    # ----------------------
+    
+    def update_traffic(self, zone, bounds=None, multiplier=1.0, now=None, time_budget=0.05, window=25,
+                       respect_priority=True, neighbour_count=10, loading_minutes=15, service_minutes=2):
+        """Set a traffic zone (or clear it, with bounds=None) and re-plan only the routes it touches
+        
+        Returns a ReplanReport. See replan_affected for what is re-optimized.
+        """
+        if bounds is None or multiplier == 1.0:
+            boxes = self.traffic.clear(zone)
+        else:
+            boxes = self.traffic.set(zone, bounds, multiplier)
+        return self.replan_affected(boxes, now, time_budget, window, respect_priority, neighbour_count,
+                                    loading_minutes, service_minutes)
+    
+    @timed(items=lambda report: report.stops)
+    def replan_affected(self, boxes, now=None, time_budget=0.05, window=25, respect_priority=True,
+                        neighbour_count=10, loading_minutes=15, service_minutes=2):
+        """Re-optimize the parts of routes whose legs cross any of the boxes
+        
+        Each stop at the end of a crossing leg gets a window of `window` stops either side,
+        kept within its priority tier; the window is improved from its current order (the
+        warm start) with the stops around it as fixed ends, so the rest of the route and
+        every other route stay as they are. A vehicle in transit keeps the stop it is
+        driving to. Remaining ETAs of re-planned vehicles are written to the eta column,
+        counted from `now` with estimate_deliveries' timing (loading_minutes first for a
+        vehicle not yet on the road, service_minutes at each stop); estimated_delivery, the
+        promised time, is left alone. Routes that cross no box are not revisited, even
+        where a cleared zone would now make a detour through it worthwhile.
+        
+        time_budget bounds the window improvement only; windows not reached within it keep
+        their order. Finding the affected routes and re-projecting their ETAs comes on top,
+        linear in the stops of those routes.
+        """
+        started = time.perf_counter()
+        deadline = started + time_budget
+        clock = np.datetime64(now or datetime.now(), "us")
+        delivered = _STATUS_CODES["delivered"]
+        report = ReplanReport()
+        for vehicle in self.vehicles:
+            rows, box = self._route_rows(vehicle)
+            if not len(rows) or not any(_boxes_overlap(box, changed) for changed in boxes):
+                continue
+            remaining = rows[self.store.status[rows] != delivered]
+            points = np.vstack(([vehicle.location], self.destination_array(remaining), [vehicle.home]))
+            crossed = np.zeros(len(points) - 1, dtype=bool)
+            for changed in boxes:
+                crossed |= _clip_fractions(points[:-1], points[1:], changed) >= 0
+            if not len(remaining) or not crossed.any():
+                continue
+            
+            # Stop i sits between legs i and i + 1; tiers are runs of equal priority
+            hot = crossed[:-1] | crossed[1:]
+            edges = [0, len(remaining)]
+            if respect_priority:
+                edges[1:1] = (np.flatnonzero(np.diff(self.store.priority[remaining])) + 1).tolist()
+            first = 1 if vehicle.status == "in-transit" else 0
+            windows = _hot_windows(hot, list(zip(edges[:-1], edges[1:])), first, window)
+            before = leg_hours(points[:-1], points[1:], vehicle.speed, self.traffic, self.road_network).sum()
+            cost = _leg_cost(vehicle.speed, self.traffic, self.road_network)
+            for start, stop in windows:
+                if time.perf_counter() >= deadline:
+                    break  # out of budget: the remaining windows keep their order
+                # Stops start..stop-1 are points start+1..stop; points start and stop+1 stay put
+                stretch = points[start + 1:stop + 1]
+                count = len(stretch)
+                if count > 1:
+                    xs = stretch[:, 0].tolist() + [float(points[start, 0])]
+                    ys = stretch[:, 1].tolist() + [float(points[start, 1])]
+                    neighbours = _neighbour_lists(np.column_stack((xs, ys)), neighbour_count)
+                    improver = _LegCostImprover(xs, ys, [count, *range(count)], neighbours, count, cost,
+                                                tuple(points[stop + 1].tolist()))
+                    improver.improve(deadline)
+                    order = np.array(improver.stops(), dtype=np.int64)
+                    remaining[start:stop] = remaining[start:stop][order]
+                    points[start + 1:stop + 1] = stretch[order]
+                report.windows += 1
+                report.stops += count
+            
+            hours = leg_hours(points[:-1], points[1:], vehicle.speed, self.traffic, self.road_network)
+            etas = route_arrival_hours(points[:1], points[1:-1], [len(remaining)], vehicle.speed,
+                                       service_minutes / 60, self.traffic, self.road_network)
+            if vehicle.status in ("available", "loading"):
+                etas += loading_minutes / 60
+            self._set_route(vehicle, rows, remaining, box)
+            self.store.eta[remaining] = clock + (etas * 3.6e9).astype("timedelta64[us]")
+            self.store.touch(remaining)
+            report.vehicles.append(vehicle.id)
+            report.etas[vehicle.id] = etas
+            report.hours_before += float(before)
+            report.hours_after += float(hours.sum())
+        report.elapsed = time.perf_counter() - started
+        return report
+    
+    def _route_rows(self, vehicle):
+        """Store rows of vehicle.route and a bounding box of the route, cached per route list"""
+        cached = self._route_cache.get(vehicle.id)
+        if cached is None or cached[0] is not vehicle.route or cached[1] != len(vehicle.route):
+            rows = np.array([package._row for package in vehicle.route], dtype=np.int64)
+            points = np.vstack((self.destination_array(rows), [vehicle.location], [vehicle.home]))
+            box = (*points.min(axis=0).tolist(), *points.max(axis=0).tolist())
+            cached = self._route_cache[vehicle.id] = (vehicle.route, len(vehicle.route), rows, box)
+        return cached[2], cached[3]
+    
+    def _set_route(self, vehicle, rows, remaining, box):
+        """Replace the undelivered part of vehicle.route with the stops in `remaining` order"""
+        done = rows[self.store.status[rows] == _STATUS_CODES["delivered"]]
+        by_row = {package._row: package for package in vehicle.route}
+        rows = np.concatenate((done, remaining))
+        vehicle.route = [by_row[row] for row in rows.tolist()]
+        self._route_cache[vehicle.id] = (vehicle.route, len(vehicle.route), rows, box)
+    
+    # ----------------------
+    # Delivery Estimates
+    # ----------------------
+    
+    @timed(items=lambda count: count)
+    def estimate_deliveries(self, start=None, vehicles=None, loading_minutes=15, service_minutes=2):
+        """Project eta for every undelivered routed package from its route, and promise it as
+        estimated_delivery for packages not yet picked up
+        
+        Each vehicle (all, or those with the given IDs) leaves its current location at
+        `start` (default now), after loading_minutes if it is available or loading, drives
+        its planned_stops() in order at its speed under the traffic zones, and spends
+        service_minutes at each: the Simulator's timing model. One route_arrival_hours pass
+        covers the whole fleet. Packages already on the road keep the estimated_delivery
+        DeliveryStats scores them against. Returns the number of packages projected.
+        """
+        store = self.store
+        vehicles = self.vehicles if vehicles is None else [self._vehicle_index[v] for v in vehicles]
+        delivered = _STATUS_CODES["delivered"]
+        routes = []
+        for vehicle in vehicles:
+            stops = vehicle.planned_stops()
+            rows = np.fromiter((package._row for package in stops), dtype=np.int64, count=len(stops))
+            routes.append(rows[store.status[rows] != delivered])
+        rows = np.concatenate(routes) if routes else np.empty(0, dtype=np.int64)
+        if not len(rows):
+            return 0
+        hours = route_arrival_hours(vehicle_locations(vehicles), self.destination_array(rows),
+                                    [len(route) for route in routes], [vehicle.speed for vehicle in vehicles],
+                                    service_minutes / 60, self.traffic, self.road_network)
+        loading = [loading_minutes / 60 if vehicle.status in ("available", "loading") else 0.0 for vehicle in vehicles]
+        hours += np.repeat(loading, [len(route) for route in routes])
+        times = np.datetime64(start or datetime.now(), "us") + (hours * 3.6e9).astype("timedelta64[us]")
+        waiting = store.status[rows] <= _STATUS_CODES["processed"]
+        store.estimated_delivery[rows[waiting]] = times[waiting]
+        store.eta[rows] = times
+        store.touch(rows)
+        return len(rows)
+    
+    # ----------------------
+    # Lookups
+    # ----------------------
+    
+    def find_package(self, package_id):
+        """Return the active or delivered package with this ID, or None"""
+        row = self._package_index.get(package_id)
+        return None if row is None else Package._view(self.store, row)
+    
+    def find_depot(self, depot_id):
+        """Return the depot with this ID, or None"""
+        index = self._depot_index.get(depot_id)
+        return None if index is None else self.depots[index]
+    
+    def find_vehicle(self, vehicle_id):
+        """Return the vehicle with this ID, or None"""
+        return self._vehicle_index.get(vehicle_id)
+    
+    def find_packages_by_prefix(self, prefix):
+        """Binary search the sorted IDs for every package whose ID starts with prefix"""
+        self._ensure_sorted()
+        lo = bisect_left(self._sorted_ids, prefix)
+        hi = bisect_left(self._sorted_ids, prefix + "\U0010ffff", lo)
+        return [Package._view(self.store, self._package_index[pid]) for pid in self._sorted_ids[lo:hi]]
+    
+    def find_packages_in_range(self, start_id, end_id):
+        """Binary search for packages with start_id <= ID <= end_id in natural order (P9 < P10)"""
+        self._ensure_sorted()
+        lo = bisect_left(self._natural_ids, _natural_key(start_id), key=_natural_key)
+        hi = bisect_right(self._natural_ids, _natural_key(end_id), lo, key=_natural_key)
+        return [Package._view(self.store, self._package_index[pid]) for pid in self._natural_ids[lo:hi]]
+    
+    def _ensure_sorted(self):
+        """Rebuild the sorted ID arrays if packages were added since the last search"""
+        if not self._sorted_dirty:
+            return
+        self._sorted_ids = sorted(self._package_index)
+        self._natural_ids = sorted(self._sorted_ids, key=_natural_key)
+        self._sorted_dirty = False
+
+
+# ----------------------
+# Helper Functions
+# ----------------------
+
+def calculate_distance(point1, point2):
+    """Calculate Euclidean distance between two points"""
+    dx = point2[0] - point1[0]
+    dy = point2[1] - point1[1]
+    return math.sqrt(dx*dx + dy*dy)
+
+
+def _as_points(points, dtype=np.float64):
+    """Coerce a point or a sequence of (x, y) points into an (n, 2) array"""
+    points = np.asarray(points, dtype=dtype)
+    return points.reshape(-1, 2)
+
+
+def distances_from(origin, points, dtype=np.float64):
+    """Distances from one origin to every point, as a 1-D array"""
+    points = _as_points(points, dtype)
+    # Python-float origins keep the points' dtype under NumPy's scalar promotion rules
+    dx = points[:, 0] - float(origin[0])
+    dy = points[:, 1] - float(origin[1])
+    dx *= dx
+    dy *= dy
+    dx += dy
+    return np.sqrt(dx, out=dx)
+
+
+def distance_matrix(origins, destinations, dtype=np.float64, out=None, block_rows=None):
+    """Full (m, n) Euclidean distance matrix computed with broadcasting
+    
+    Pass dtype=np.float32 to halve memory. With block_rows set, the matrix is filled
+    block_rows origins at a time so temporaries stay at block_rows x n; combine with
+    an `out` np.memmap when the full matrix does not fit in RAM.
+    """
+    origins = _as_points(origins, dtype)
+    destinations = _as_points(destinations, dtype)
+    if out is None:
+        out = np.empty((len(origins), len(destinations)), dtype=dtype)
+    if block_rows is None:
+        block_rows = max(len(origins), 1)
+    for start, block in iter_distance_blocks(origins, destinations, block_rows, dtype):
+        out[start:start + len(block)] = block
+    return out
+
+
+def iter_distance_blocks(origins, destinations, block_rows=1024, dtype=np.float64):
+    """Yield (row_start, block) pairs covering the distance matrix block_rows origins at a time"""
+    origins = _as_points(origins, dtype)
+    destinations = _as_points(destinations, dtype)
+    dest_x = destinations[:, 0]
+    dest_y = destinations[:, 1]
+    for start in range(0, len(origins), block_rows):
+        chunk = origins[start:start + block_rows]
+        dx = np.subtract.outer(chunk[:, 0], dest_x)
+        dy = np.subtract.outer(chunk[:, 1], dest_y)
+        dx *= dx
+        dy *= dy
+        dx += dy
+        yield start, np.sqrt(dx, out=dx)
+
+
+def pairwise_distances(points, dtype=np.float64, out=None, block_rows=None):
+    """Symmetric (n, n) distance matrix between all points"""
+    return distance_matrix(points, points, dtype=dtype, out=out, block_rows=block_rows)
+
+
+def nearest_origins(origins, points, dtype=np.float64, block_rows=65536):
+    """Index of the nearest origin to each point, and the distance to it
+    
+    Meant for a few origins (depots, hubs) against many points; the points are streamed
+    in blocks so temporaries stay at block_rows x origins.
+    """
+    points = _as_points(points, dtype)
+    nearest = np.empty(len(points), dtype=np.int32)
+    distances = np.empty(len(points), dtype=dtype)
+    for start, block in iter_distance_blocks(points, origins, block_rows, dtype):
+        stop = start + len(block)
+        nearest[start:stop] = block.argmin(axis=1)
+        distances[start:stop] = block[np.arange(len(block)), nearest[start:stop]]
+    return nearest, distances
+
+
+def vehicle_locations(vehicles, dtype=np.float64):
+    """(v, 2) array of current vehicle locations"""
+    return np.array([vehicle.location for vehicle in vehicles], dtype=dtype).reshape(-1, 2)
+
+
+def travel_time_matrix(vehicles, destinations, dtype=np.float64, out=None, block_rows=None, network=None):
+    """(vehicles, n) travel times in hours: each row divided by that vehicle's speed"""
+    if network is not None:
+        times = network.travel_time_matrix(vehicle_locations(vehicles), destinations).astype(dtype)
+        times *= network.reference_speed / np.array([vehicle.speed for vehicle in vehicles], dtype=dtype)[:, None]
+        return times
+    times = distance_matrix(vehicle_locations(vehicles, dtype), destinations, dtype=dtype,
+                            out=out, block_rows=block_rows)
+    speeds = np.array([vehicle.speed for vehicle in vehicles], dtype=dtype)
+    times /= speeds[:, None]
+    return times
+
+
+def _natural_key(item_id):
+    """Sort key that orders numeric runs by value, so P2 comes before P10"""
+    parts = re.split(r"(\d+)", item_id)
+    return tuple((0, int(part)) if part.isdigit() else (1, part) for part in parts) + (item_id,)
+
+
+# ----------------------
+# Spatial Index
+# ----------------------
+
+class SpatialGrid:
+    """Uniform-grid index over the rows of a coordinate source
+    
+    The source is anything with `x` and `y` arrays indexed by row (a PackageStore, or
+    a SimpleNamespace over plain arrays); coordinates are re-read on every query, so
+    the source may reallocate its columns. A bulk build sorts rows by cell into one
+    CSR array in O(n log n). Later inserts go to a per-cell overflow map and removals
+    are tombstones; both are folded back in by a rebuild once they pass a fraction of
+    the live rows, so updates stay amortized O(log n). Rows are filed by the position
+    they had when inserted; pass moved rows to refile().
+    """
+    
+    def __init__(self, source, points_per_cell=8, rebuild_fraction=0.25):
+        self.source = source
+        self.points_per_cell = points_per_cell
+        self.rebuild_fraction = rebuild_fraction
+        self.build(np.empty(0, dtype=np.int64))
+    
+    def __len__(self):
+        return self._live
+    
+    def build(self, rows, bounds=None):
+        """Rebuild from scratch over the given rows"""
+        rows = np.asarray(rows, dtype=np.int64)
+        xs, ys = self.source.x[rows], self.source.y[rows]
+        if bounds is None:
+            bounds = (xs.min(), ys.min(), xs.max(), ys.max()) if len(rows) else (-50.0, -50.0, 50.0, 50.0)
+        x0, y0, x1, y1 = (float(value) for value in bounds)
+        cells_wanted = max(len(rows) / self.points_per_cell, 1.0)
+        self.cell_size = max(math.sqrt(max(x1 - x0, 1e-9) * max(y1 - y0, 1e-9) / cells_wanted), 1e-9)
+        self.origin = (x0, y0)
+        self.dims = (int((x1 - x0) / self.cell_size) + 1, int((y1 - y0) / self.cell_size) + 1)
+        
+        cells = self._cells(xs, ys)
+        order = np.argsort(cells, kind="stable")
+        self._order = rows[order]
+        self._starts = np.searchsorted(cells[order], np.arange(self.dims[0] * self.dims[1] + 1))
+        self._overflow = {}  # cell -> list of rows inserted since the build
+        self._overflow_count = 0
+        self._dead = np.zeros(int(rows.max()) + 1 if len(rows) else 0, dtype=bool)
+        self._filed = np.zeros(len(self._dead), dtype=bool)  # in the CSR order or the overflow map
+        self._filed[rows] = True
+        self._cell = np.zeros(len(self._dead), dtype=np.int64)  # cell each filed row is under
+        self._cell[rows] = cells
+        self._dead_count = 0
+        self._live = len(rows)
+    
+    def _cells(self, xs, ys):
+        cx = np.clip(((xs - self.origin[0]) // self.cell_size).astype(np.int64), 0, self.dims[0] - 1)
+        cy = np.clip(((ys - self.origin[1]) // self.cell_size).astype(np.int64), 0, self.dims[1] - 1)
+        return cy * self.dims[0] + cx
+    
+    def _grow_flags(self, max_row):
+        if max_row >= len(self._dead):
+            size = max(max_row + 1, len(self._dead) * 2)
+            self._dead = np.concatenate((self._dead, np.zeros(size - len(self._dead), dtype=bool)))
+            self._filed = np.concatenate((self._filed, np.zeros(size - len(self._filed), dtype=bool)))
+            self._cell = np.concatenate((self._cell, np.zeros(size - len(self._cell), dtype=np.int64)))
+    
+    def live_rows(self):
+        rows = self._order[~self._dead[self._order]]
+        if self._overflow:
+            extra = np.fromiter((row for bucket in self._overflow.values() for row in bucket), dtype=np.int64)
+            rows = np.concatenate((rows, extra[~self._dead[extra]]))
+        return rows
+    
+    def insert(self, rows):
+        """Add rows (an int or array of ints) to the index; rows already live are ignored"""
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        if not len(rows):
+            return
+        self._grow_flags(int(rows.max()))
+        # A removed row is still filed under its cell, so only its tombstone is cleared
+        revived = rows[self._dead[rows]]
+        self._dead[revived] = False
+        self._dead_count -= len(revived)
+        fresh = rows[~self._filed[rows]]
+        self._filed[fresh] = True
+        cells = self._cells(self.source.x[fresh], self.source.y[fresh])
+        self._cell[fresh] = cells
+        for cell, row in zip(cells.tolist(), fresh.tolist()):
+            self._overflow.setdefault(cell, []).append(row)
+        self._overflow_count += len(fresh)
+        self._live += len(revived) + len(fresh)
+        self._maybe_rebuild()
+    
+    def remove(self, rows):
+        """Drop rows from the index (tombstoned until the next rebuild); rows not live are ignored"""
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        rows = rows[rows < len(self._filed)]
+        rows = rows[self._filed[rows] & ~self._dead[rows]]
+        self._dead[rows] = True
+        self._dead_count += len(rows)
+        self._live -= len(rows)
+        self._maybe_rebuild()
+    
+    def refile(self, rows):
+        """Re-file rows whose point has moved to another cell; returns whether any had
+        
+        Rows that were never inserted are ignored. A moved row cannot be pulled out of the
+        CSR order on its own, so any move rebuilds the index.
+        """
+        rows = np.unique(np.asarray(rows, dtype=np.int64))
+        rows = rows[rows < len(self._filed)]
+        rows = rows[self._filed[rows]]
+        if not (self._cells(self.source.x[rows], self.source.y[rows]) != self._cell[rows]).any():
+            return False
+        self.build(self.live_rows())
+        return True
+    
+    def _maybe_rebuild(self):
+        if self._overflow_count + self._dead_count > max(1024, self.rebuild_fraction * self._live):
+            self.build(self.live_rows())
+    
+    def _gather(self, cx0, cx1, cy0, cy1):
+        """Live rows in the inclusive cell rectangle"""
+        gx, gy = self.dims
+        cx0, cx1 = max(cx0, 0), min(cx1, gx - 1)
+        cy0, cy1 = max(cy0, 0), min(cy1, gy - 1)
+        if cx0 > cx1 or cy0 > cy1:
+            return np.empty(0, dtype=np.int64)
+        # Each row of cells is one contiguous slice of the CSR order
+        chunks = [self._order[self._starts[cy * gx + cx0]:self._starts[cy * gx + cx1 + 1]]
+                  for cy in range(cy0, cy1 + 1)]
+        if self._overflow:
+            span = (cx1 - cx0 + 1) * (cy1 - cy0 + 1)
+            if span < len(self._overflow):
+                cells = (cy * gx + cx for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1))
+                extra = [row for cell in cells for row in self._overflow.get(cell, ())]
+            else:
+                extra = [row for cell, bucket in self._overflow.items()
+                         if cx0 <= cell % gx <= cx1 and cy0 <= cell // gx <= cy1 for row in bucket]
+            chunks.append(np.array(extra, dtype=np.int64))
+        rows = np.concatenate(chunks) if chunks else np.empty(0, dtype=np.int64)
+        return rows[~self._dead[rows]] if self._dead_count else rows
+    
+    def _cell_of(self, x, y):
+        cx = min(max(int((x - self.origin[0]) // self.cell_size), 0), self.dims[0] - 1)
+        cy = min(max(int((y - self.origin[1]) // self.cell_size), 0), self.dims[1] - 1)
+        return cx, cy
+    
+    @timed(items=len)
+    def in_box(self, x0, y0, x1, y1):
+        """Rows whose point lies in the rectangle [x0, x1] x [y0, y1]"""
+        cx0, cy0 = self._cell_of(x0, y0)
+        cx1, cy1 = self._cell_of(x1, y1)
+        rows = self._gather(cx0, cx1, cy0, cy1)
+        xs, ys = self.source.x[rows], self.source.y[rows]
+        return rows[(xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)]
+    
+    @timed(items=len)
+    def within(self, point, radius):
+        """Rows within radius of point, nearest first"""
+        rows = self.in_box(point[0] - radius, point[1] - radius, point[0] + radius, point[1] + radius)
+        gaps = np.hypot(self.source.x[rows] - point[0], self.source.y[rows] - point[1])
+        keep = gaps <= radius
+        rows, gaps = rows[keep], gaps[keep]
+        return rows[np.argsort(gaps, kind="stable")]
+    
+    @timed(items=len)
+    def nearest(self, point, k=1):
+        """The k rows nearest to point, nearest first"""
+        if k <= 0 or not self._live:
+            return np.empty(0, dtype=np.int64)
+        qx, qy = float(point[0]), float(point[1])
+        cx, cy = self._cell_of(qx, qy)
+        gx, gy = self.dims
+        radius = 1
+        while True:
+            rows = self._gather(cx - radius, cx + radius, cy - radius, cy + radius)
+            gaps = np.hypot(self.source.x[rows] - qx, self.source.y[rows] - qy)
+            covers_all = cx - radius <= 0 and cy - radius <= 0 and cx + radius >= gx - 1 and cy + radius >= gy - 1
+            if len(rows) >= k or covers_all:
+                # Any unsearched point is at least this far from the query
+                edges = []
+                if cx - radius > 0:
+                    edges.append(qx - (self.origin[0] + (cx - radius) * self.cell_size))
+                if cx + radius < gx - 1:
+                    edges.append(self.origin[0] + (cx + radius + 1) * self.cell_size - qx)
+                if cy - radius > 0:
+                    edges.append(qy - (self.origin[1] + (cy - radius) * self.cell_size))
+                if cy + radius < gy - 1:
+                    edges.append(self.origin[1] + (cy + radius + 1) * self.cell_size - qy)
+                bound = min(edges) if edges else math.inf
+                take = min(k, len(rows))
+                nearest = np.argpartition(gaps, take - 1)[:take] if take < len(rows) else np.arange(len(rows))
+                if covers_all or gaps[nearest].max() <= bound:
+                    nearest = nearest[np.argsort(gaps[nearest], kind="stable")]
+                    return rows[nearest]
+            radius *= 2
+
+
+def grid_clusters(points, bounds, cell_size):
+    """Bin the points inside bounds (x0, y0, x1, y1) into square cells of cell_size
+    
+    Returns (centroids, counts) for the non-empty cells, for drawing a zoomed-out map
+    as one marker per cell instead of one per point. Counting uses a dense array of
+    cells, so keep bounds within a few thousand cells across.
+    """
+    points = _as_points(points)
+    x0, y0, x1, y1 = bounds
+    columns = max(1, math.ceil((x1 - x0) / cell_size))
+    rows = max(1, math.ceil((y1 - y0) / cell_size))
+    cx = np.floor((points[:, 0] - x0) / cell_size)
+    cy = np.floor((points[:, 1] - y0) / cell_size)
+    inside = (cx >= 0) & (cx < columns) & (cy >= 0) & (cy < rows)
+    cells = (cy[inside] * columns + cx[inside]).astype(np.int64)
+    counts = np.bincount(cells, minlength=columns * rows)
+    occupied = np.flatnonzero(counts)
+    counts = counts[occupied]
+    centroids = np.column_stack((np.bincount(cells, weights=points[inside, 0], minlength=columns * rows)[occupied],
+                                 np.bincount(cells, weights=points[inside, 1], minlength=columns * rows)[occupied]))
+    return centroids / counts[:, None], counts
+
+
+# ----------------------
+# Road Network
+# ----------------------
+
+class RoadNetwork:
+    """Road graph answering point-to-point travel-time queries, as a drop-in for straight lines
+    
+    Nodes have coordinates in the same units as package destinations (km); undirected
+    edges have a speed (km/h) and a length (Euclidean unless given). Preprocessing runs
+    a contraction hierarchy (nodes contracted cheapest-first, with witness searches to
+    skip needless shortcuts) and then stores each node's pruned upward search space as
+    a hub label, so a query is the best meeting hub of two small dicts. Points snap to
+    their nearest node through a raster of candidate nodes per cell, and node-pair
+    results are kept in an LRU cache.
+    
+    travel_time() and distance() take two (x, y) points like calculate_distance; the
+    legs between a point and its node are driven straight at access_speed. Set a
+    LogisticsSystem's road_network to drive its fleet on the network: a vehicle whose
+    speed equals reference_speed drives at the posted speeds, faster vehicles
+    proportionally faster. One-way streets and turn costs are not modelled.
+    """
+    
+    def __init__(self, x, y, sources, targets, speeds, lengths=None, reference_speed=50.0, access_speed=None,
+                 cache_size=1 << 18, witness_settle_limit=60):
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        speeds = np.broadcast_to(np.asarray(speeds, dtype=np.float64), sources.shape)
+        if lengths is None:
+            lengths = np.hypot(self.x[sources] - self.x[targets], self.y[sources] - self.y[targets])
+        lengths = np.asarray(lengths, dtype=np.float64)
+        if len(sources) and ((speeds <= 0).any() or (lengths < 0).any()):
+            raise ValueError("Road speeds must be positive and lengths non-negative")
+        self.node_count = len(self.x)
+        self.edge_count = len(sources)
+        self.reference_speed = reference_speed
+        self.access_speed = access_speed or (float(speeds.min()) if len(speeds) else reference_speed)
+        self.witness_settle_limit = witness_settle_limit
+        
+        # Adjacency as node -> {neighbour: (hours, km)}, keeping the fastest parallel edge
+        self._adjacency = [{} for _ in range(self.node_count)]
+        for u, v, hours, km in zip(sources.tolist(), targets.tolist(), (lengths / speeds).tolist(), lengths.tolist()):
+            if u != v and hours < self._adjacency[u].get(v, (math.inf,))[0]:
+                self._adjacency[u][v] = self._adjacency[v][u] = (hours, km)
+        
+        started = time.perf_counter()
+        self._contract()
+        self._build_labels()
+        self._build_snapper()
+        self.preprocess_seconds = time.perf_counter() - started
+        self._adjacency = None
+        self._cached_route = functools.lru_cache(maxsize=cache_size)(self._node_route)
+    
+    @classmethod
+    def grid(cls, extent=50.0, spacing=2.0, arterial_every=5, local_speed=30.0, arterial_speed=60.0,
+             congestion=0.3, seed=0, **options):
+        """Square street grid over [-extent, extent]^2 with faster arterials every few blocks
+        
+        Each edge is slowed by a random factor of up to `congestion`, so fastest paths
+        are not simply Manhattan paths.
+        """
+        count = int(round(2 * extent / spacing)) + 1
+        coords = np.linspace(-extent, extent, count)
+        gx, gy = np.meshgrid(coords, coords, indexing="ij")
+        node = np.arange(count * count).reshape(count, count)
+        sources = np.concatenate((node[:-1, :].ravel(), node[:, :-1].ravel()))
+        targets = np.concatenate((node[1:, :].ravel(), node[:, 1:].ravel()))
+        # A horizontal edge runs along row j, a vertical one along column i
+        lines = np.concatenate((np.broadcast_to(np.arange(count), (count - 1, count)).ravel(),
+                                np.broadcast_to(np.arange(count)[:, None], (count, count - 1)).ravel()))
+        speeds = np.where(lines % arterial_every == 0, arterial_speed, local_speed)
+        rng = np.random.default_rng(seed)
+        speeds = speeds * (1 - congestion * rng.random(len(speeds)))
+        return cls(gx.ravel(), gy.ravel(), sources, targets, speeds, access_speed=local_speed, **options)
+    
+    @classmethod
+    def from_csv(cls, nodes_path, edges_path, default_speed=40.0, **options):
+        """Load a graph from node (id,x,y) and edge (from,to[,speed][,length]) CSV files"""
+        import csv
+        with open(nodes_path, newline="", encoding="utf-8") as handle:
+            nodes = list(csv.DictReader(handle))
+        index = {record["id"]: position for position, record in enumerate(nodes)}
+        x = [float(record["x"]) for record in nodes]
+        y = [float(record["y"]) for record in nodes]
+        sources, targets, speeds, lengths = [], [], [], []
+        with open(edges_path, newline="", encoding="utf-8") as handle:
+            for record in csv.DictReader(handle):
+                sources.append(index[record["from"]])
+                targets.append(index[record["to"]])
+                speeds.append(float(record.get("speed") or default_speed))
+                lengths.append(float(record["length"]) if record.get("length") else math.nan)
+        lengths = np.array(lengths, dtype=np.float64)
+        missing = np.isnan(lengths)
+        if missing.any():
+            xs, ys = np.array(x), np.array(y)
+            ends = np.array(sources)[missing], np.array(targets)[missing]
+            lengths[missing] = np.hypot(xs[ends[0]] - xs[ends[1]], ys[ends[0]] - ys[ends[1]])
+        return cls(x, y, sources, targets, speeds, lengths, **options)
+    
+    # ----------------------
+    # Preprocessing
+    # ----------------------
+    
+    def _contract(self):
+        """Contract nodes in order of importance, recording each node's upward edges"""
+        adjacency = self._adjacency
+        self.rank = np.zeros(self.node_count, dtype=np.int64)
+        self._upward = [None] * self.node_count  # node -> [(higher node, hours, km)]
+        contracted_neighbours = [0] * self.node_count
+        
+        def importance(node):
+            return len(self._shortcuts(node)) - len(adjacency[node]) + contracted_neighbours[node]
+        
+        queue = [(importance(node), node) for node in range(self.node_count)]
+        heapq.heapify(queue)
+        order = 0
+        while queue:
+            _, node = heapq.heappop(queue)
+            # Lazy update: re-check the priority, and defer if it is no longer the cheapest
+            current = importance(node)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, node))
+                continue
+            shortcuts = self._shortcuts(node)
+            neighbours = adjacency[node]
+            self._upward[node] = [(other, hours, km) for other, (hours, km) in neighbours.items()]
+            for other in neighbours:
+                del adjacency[other][node]
+                contracted_neighbours[other] += 1
+            for u, w, hours, km in shortcuts:
+                if hours < adjacency[u].get(w, (math.inf,))[0]:
+                    adjacency[u][w] = adjacency[w][u] = (hours, km)
+            adjacency[node] = {}
+            self.rank[node] = order
+            order += 1
+    
+    def _shortcuts(self, node):
+        """Shortcuts needed between node's neighbours if it were contracted now"""
+        neighbours = list(self._adjacency[node].items())
+        needed = []
+        for index, (u, (hours_u, km_u)) in enumerate(neighbours[:-1]):
+            targets = {w: hours_u + hours_w for w, (hours_w, _) in neighbours[index + 1:]}
+            witness = self._witness_search(u, node, targets, max(targets.values()))
+            for w, (hours_w, km_w) in neighbours[index + 1:]:
+                if witness.get(w, math.inf) > hours_u + hours_w:
+                    needed.append((u, w, hours_u + hours_w, km_u + km_w))
+        return needed
+    
+    def _witness_search(self, source, avoid, targets, limit):
+        """Bounded Dijkstra from source around `avoid`; distances found to the targets"""
+        adjacency = self._adjacency
+        best = {source: 0.0}
+        heap = [(0.0, source)]
+        found = {}
+        settled = 0
+        while heap and settled < self.witness_settle_limit:
+            hours, node = heapq.heappop(heap)
+            if hours > best.get(node, math.inf) or hours > limit:
+                continue
+            settled += 1
+            if node in targets:
+                found[node] = hours
+                if len(found) == len(targets):
+                    break
+            for other, (edge_hours, _) in adjacency[node].items():
+                if other == avoid:
+                    continue
+                total = hours + edge_hours
+                if total < best.get(other, math.inf):
+                    best[other] = total
+                    heapq.heappush(heap, (total, other))
+        return found
+    
+    def _build_labels(self):
+        """Hub labels: each node's upward search space, pruned of entries that are not shortest"""
+        self._label_hours = [None] * self.node_count
+        self._label_km = [None] * self.node_count
+        # Highest rank first: a node's upward search space is the union of its upward
+        # neighbours' labels, which are final by then
+        for node in np.argsort(-self.rank).tolist():
+            best = {}
+            for other, edge_hours, edge_km in self._upward[node]:
+                other_km = self._label_km[other]
+                for hub, hours in self._label_hours[other].items():
+                    hours += edge_hours
+                    if hours < best.get(hub, (math.inf,))[0]:
+                        best[hub] = (hours, edge_km + other_km[hub])
+            hours_label = {node: 0.0}
+            km_label = {node: 0.0}
+            for hub, (hours, km) in sorted(best.items(), key=lambda item: item[1][0]):
+                if self._meet(hours_label, self._label_hours[hub])[0] <= hours:
+                    continue  # a higher hub already gives this distance
+                hours_label[hub] = hours
+                km_label[hub] = km
+            self._label_hours[node] = hours_label
+            self._label_km[node] = km_label
+    
+    @staticmethod
+    def _meet(first, second):
+        """Best (hours, hub) over hubs the two labels share"""
+        if len(first) > len(second):
+            first, second = second, first
+        best, best_hub = math.inf, -1
+        for hub, hours in first.items():
+            other = second.get(hub)
+            if other is not None and hours + other < best:
+                best, best_hub = hours + other, hub
+        return best, best_hub
+    
+    def _build_snapper(self, max_cells=1 << 18):
+        """Raster over the nodes whose cells list every node that can be nearest within them"""
+        x0, x1 = float(self.x.min()), float(self.x.max())
+        y0, y1 = float(self.y.min()), float(self.y.max())
+        area = max(x1 - x0, 1e-9) * max(y1 - y0, 1e-9)
+        self._cell = max(math.sqrt(area / self.node_count) / 2, math.sqrt(area / max_cells), 1e-9)
+        self._origin = (x0, y0)
+        self._dims = (int((x1 - x0) / self._cell) + 1, int((y1 - y0) / self._cell) + 1)
+        self._bounds = (x0, y0, x1, y1)
+        self._node_grid = SpatialGrid(SimpleNamespace(x=self.x, y=self.y))
+        self._node_grid.build(np.arange(self.node_count))
+        
+        reach = self._cell * math.sqrt(2)  # a point is within half a diagonal of its cell centre
+        candidates = []
+        for cx in range(self._dims[0]):
+            for cy in range(self._dims[1]):
+                centre = (x0 + (cx + 0.5) * self._cell, y0 + (cy + 0.5) * self._cell)
+                nearest = self._node_grid.nearest(centre, 1)[0]
+                radius = math.hypot(self.x[nearest] - centre[0], self.y[nearest] - centre[1]) + reach
+                candidates.append(tuple(self._node_grid.within(centre, radius).tolist()))
+        self._candidates = candidates
+    
+    # ----------------------
+    # Queries
+    # ----------------------
+    
+    def snap(self, point):
+        """(nearest node, straight distance to it) for an (x, y) point"""
+        px, py = float(point[0]), float(point[1])
+        x0, y0, x1, y1 = self._bounds
+        if x0 <= px <= x1 and y0 <= py <= y1:
+            cell = int((px - x0) / self._cell) * self._dims[1] + int((py - y0) / self._cell)
+            nodes = self._candidates[cell]
+        else:
+            nodes = self._node_grid.nearest((px, py), 1).tolist()
+        xs, ys = self.x, self.y
+        best, best_node = math.inf, -1
+        for node in nodes:
+            gap = (xs[node] - px) ** 2 + (ys[node] - py) ** 2
+            if gap < best:
+                best, best_node = gap, node
+        return best_node, math.sqrt(best)
+    
+    def _node_route(self, u, v):
+        hours, hub = self._meet(self._label_hours[u], self._label_hours[v])
+        if hub < 0:
+            return math.inf, math.inf
+        return hours, self._label_km[u][hub] + self._label_km[v][hub]
+    
+    def node_route(self, u, v):
+        """(hours, km) of the fastest path between two nodes, cached; inf if unreachable"""
+        return self._cached_route(u, v) if u <= v else self._cached_route(v, u)
+    
+    def route(self, point1, point2):
+        """(hours, km) between two points, including the straight legs to and from the network"""
+        u, off_u = self.snap(point1)
+        v, off_v = self.snap(point2)
+        if u == v:
+            km = calculate_distance(point1, point2)
+            return km / self.access_speed, km
+        hours, km = self.node_route(u, v)
+        return hours + (off_u + off_v) / self.access_speed, km + off_u + off_v
+    
+    def travel_time(self, point1, point2):
+        """Hours between two points at posted road speeds"""
+        return self.route(point1, point2)[0]
+    
+    def distance(self, point1, point2):
+        """Driven km along the fastest road path; same call shape as calculate_distance"""
+        return self.route(point1, point2)[1]
+    
+    def travel_times(self, origin, destinations):
+        """Hours from one point to each of an (n, 2) array of points"""
+        return np.array([self.route(origin, point)[0] for point in _as_points(destinations).tolist()])
+    
+    def travel_time_matrix(self, origins, destinations):
+        """(origins, destinations) matrix of travel hours"""
+        destinations = _as_points(destinations).tolist()
+        return np.array([[self.route(origin, point)[0] for point in destinations]
+                         for origin in _as_points(origins).tolist()]).reshape(-1, len(destinations))
+    
+    def cache_info(self):
+        return self._cached_route.cache_info()
+    
+    def label_sizes(self):
+        """Hub label size per node; the mean sets query cost"""
+        return np.array([len(label) for label in self._label_hours])
+
+
+# ----------------------
+# Dispatch Queue
+# ----------------------
+
+class DispatchQueue:
+    """Indexed binary min-heap of the packages waiting in "sorting", next to dispatch first
+    
+    Packages are ordered by priority (1 first), then estimated delivery (earliest first,
+    missing last), then arrival. A row -> heap position map makes update and remove by
+    ID O(log n) alongside push, pop and peek.
+    
+    The queue follows the store rather than being told about every change: whenever the
+    store revision has moved since the last operation, the changed rows are re-keyed,
+    inserted (new or back in "sorting") or dropped (assigned, delivered). A popped or
+    removed package stays out until it is changed again. Changes made through update()
+    keep the queue in step without that rescan.
+    """
+    
+    _SORTING = _STATUS_CODES["sorting"]
+    _NEVER = np.iinfo(np.int64).max  # deadline key for a missing estimated delivery
+    
+    def __init__(self, system):
+        self.system = system
+        self.store = system.store
+        self._heap = []  # (priority, deadline, row) keys
+        self._position = {}  # row -> index in _heap
+        self._revision = -1
+        self.sync()
+    
+    def __len__(self):
+        self.sync()
+        return len(self._heap)
+    
+    def __contains__(self, package_id):
+        self.sync()
+        return self.system._package_index.get(package_id) in self._position
+    
+    def _key(self, row):
+        deadline = int(self.store.estimated_delivery[row].view(np.int64))
+        return (int(self.store.priority[row]), self._NEVER if deadline == _NO_TIME.view(np.int64) else deadline, row)
+    
+    # ----------------------
+    # Queue Operations
+    # ----------------------
+    
+    def push(self, package_id):
+        """Queue a package (or re-key it if already queued)"""
+        self.sync()
+        self._place(self.system._package_index[package_id])
+    
+    def peek(self):
+        """The next package to dispatch, or None"""
+        self.sync()
+        return Package._view(self.store, self._heap[0][2]) if self._heap else None
+    
+    def pop(self):
+        """Remove and return the next package to dispatch, or None"""
+        self.sync()
+        if not self._heap:
+            return None
+        row = self._heap[0][2]
+        self._remove_at(0)
+        return Package._view(self.store, row)
+    
+    @timed(items=len)
+    def pop_many(self, count):
+        """Remove and return up to count packages in dispatch order"""
+        self.sync()
+        rows = []
+        while self._heap and len(rows) < count:
+            rows.append(self._heap[0][2])
+            self._remove_at(0)
+        return [Package._view(self.store, row) for row in rows]
+    
+    def remove(self, package_id):
+        """Drop a package from the queue; returns whether it was queued"""
+        self.sync()
+        index = self._position.get(self.system._package_index.get(package_id))
+        if index is None:
+            return False
+        self._remove_at(index)
+        return True
+    
+    def update(self, package_id, priority=None, estimated_delivery=None):
+        """Change a package's priority and/or estimated delivery and re-key it in O(log n)"""
+        self.sync()
+        row = self.system._package_index[package_id]
+        package = Package._view(self.store, row)
+        if priority is not None:
+            package.priority = priority
+        if estimated_delivery is not None:
+            package.estimated_delivery = estimated_delivery
+        # Our own write needs no rescan, so treat it as sync() would: a package in
+        # "sorting" is (re-)queued even if it had been popped
+        self._revision = self.store.revision
+        if self.store.status[row] == self._SORTING:
+            self._place(row)
+    
+    def sync(self):
+        """Bring the queue in line with store changes since the last operation"""
+        store = self.store
+        if store.revision == self._revision:
+            return
+        if self._revision < 0:
+            rows = np.flatnonzero(store.status[:store.size] == self._SORTING)
+            self._rebuild(rows)
+        else:
+            rows = store.changed_since(self._revision)
+            waiting = store.status[rows] == self._SORTING
+            if len(rows) > len(self._heap) // 4 + 64:
+                # Many changes: one sort beats many sifts
+                kept = np.fromiter(self._position, dtype=np.int64, count=len(self._position))
+                kept = kept[store.status[kept] == self._SORTING]
+                self._rebuild(np.union1d(kept, rows[waiting]))
+            else:
+                for row, is_waiting in zip(rows.tolist(), waiting.tolist()):
+                    if is_waiting:
+                        self._place(row)
+                    elif row in self._position:
+                        self._remove_at(self._position[row])
+        self._revision = store.revision
+    
+    def _rebuild(self, rows):
+        rows = np.asarray(rows, dtype=np.int64)
+        deadlines = self.store.estimated_delivery[rows].view(np.int64).copy()
+        deadlines[deadlines == _NO_TIME.view(np.int64)] = self._NEVER
+        priorities = self.store.priority[rows]
+        order = np.lexsort((rows, deadlines, priorities))  # a sorted list is a valid heap
+        self._heap = list(zip(priorities[order].tolist(), deadlines[order].tolist(), rows[order].tolist()))
+        self._position = {key[2]: index for index, key in enumerate(self._heap)}
+    
+    # ----------------------
+    # Heap Maintenance
+    # ----------------------
+    
+    def _place(self, row):
+        key = self._key(row)
+        index = self._position.get(row)
+        if index is None:
+            self._heap.append(key)
+            index = len(self._heap) - 1
+            self._position[row] = index
+            self._sift_up(index)
+            return
+        old = self._heap[index]
+        self._heap[index] = key
+        if key < old:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+    
+    def _remove_at(self, index):
+        heap = self._heap
+        removed = heap[index]
+        del self._position[removed[2]]
+        last = heap.pop()
+        if index < len(heap):
+            heap[index] = last
+            self._position[last[2]] = index
+            if last < removed:
+                self._sift_up(index)
+            else:
+                self._sift_down(index)
+    
+    def _sift_up(self, index):
+        heap, position = self._heap, self._position
+        key = heap[index]
+        while index:
+            parent = (index - 1) >> 1
+            if heap[parent] <= key:
+                break
+            heap[index] = heap[parent]
+            position[heap[index][2]] = index
+            index = parent
+        heap[index] = key
+        position[key[2]] = index
+    
+    def _sift_down(self, index):
+        heap, position = self._heap, self._position
+        size = len(heap)
+        key = heap[index]
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+            if child + 1 < size and heap[child + 1] < heap[child]:
+                child += 1
+            if key <= heap[child]:
+                break
+            heap[index] = heap[child]
+            position[heap[index][2]] = index
+            index = child
+        heap[index] = key
+        position[key[2]] = index
+
+
+# ----------------------
+# Package Assignment
+# ----------------------
+
+class AssignmentReport:
+    """Outcome of LogisticsSystem.assign_packages"""
+    
+    def __init__(self, mode, assigned, unassigned, utilization, compactness, elapsed, segments=None):
+        self.mode = mode
+        self.assigned = assigned  # number of packages assigned in this run
+        self.unassigned = unassigned  # store rows left in "sorting" for lack of capacity
+        self.utilization = utilization  # vehicle id -> (load, capacity, fraction)
+        self.compactness = compactness  # mean distance from a package to its vehicle's centroid
+        self.elapsed = elapsed  # seconds
+        self.segments = segments  # segment label per considered package, for plan_fleet
+    
+    def __repr__(self):
+        return (f"AssignmentReport({self.mode}, assigned={self.assigned}, "
+                f"unassigned={len(self.unassigned)}, compactness={self.compactness:.2f})")
+
+
+def assign_bins(points, weights, priorities, remaining, mode="greedy", deadline=math.inf, depot=DEPOT_LOCATION):
+    """Array core of LogisticsSystem.assign_packages: vehicle index per package, -1 if unplaced"""
+    # Priority first, then decreasing weight
+    order = np.lexsort((-weights, priorities))
+    
+    if mode == "greedy":
+        return _first_fit_decreasing(weights, order, remaining)
+    if mode != "compact":
+        raise ValueError(f"Unknown assignment mode: {mode}")
+    
+    # Keep the highest-priority prefix that fits the fleet's total free capacity
+    fits = np.cumsum(weights[order]) <= remaining.sum()
+    bins = _sweep_assign(points, weights, order[fits], remaining, depot)
+    # Anything the sweep could not place, or that was cut, gets a first-fit attempt
+    missing = order[bins[order] < 0]
+    if len(missing):
+        used = np.bincount(bins[bins >= 0], weights=weights[bins >= 0], minlength=len(remaining))
+        placed = _first_fit_decreasing(weights, missing, remaining - used)
+        bins[missing] = placed[missing]
+    return _improve_compactness(points, weights, bins, remaining, deadline)
+
+
+class _FirstFitTree:
+    """Max segment tree over remaining capacities: leftmost bin that fits in O(log n)"""
+    
+    def __init__(self, remaining):
+        self.size = 1
+        while self.size < len(remaining):
+            self.size *= 2
+        self.tree = [-math.inf] * (2 * self.size)
+        self.tree[self.size:self.size + len(remaining)] = [float(r) for r in remaining]
+        for node in range(self.size - 1, 0, -1):
+            self.tree[node] = max(self.tree[2 * node], self.tree[2 * node + 1])
+    
+    def find(self, weight):
+        """Index of the leftmost bin with remaining >= weight, or -1"""
+        tree = self.tree
+        if tree[1] < weight:
+            return -1
+        node = 1
+        while node < self.size:
+            node *= 2
+            if tree[node] < weight:
+                node += 1
+        return node - self.size
+    
+    def consume(self, index, weight):
+        tree = self.tree
+        node = index + self.size
+        tree[node] -= weight
+        node //= 2
+        while node:
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+            node //= 2
+
+
+def _first_fit_decreasing(weights, order, remaining):
+    """Place items in the given order into the leftmost bin with room; -1 if none fits"""
+    bins = np.full(len(weights), -1, dtype=np.int32)
+    if not len(remaining):
+        return bins
+    tree = _FirstFitTree(remaining)
+    weight_list = weights.tolist()
+    for item in order.tolist():
+        weight = weight_list[item]
+        index = tree.find(weight)
+        if index >= 0:
+            tree.consume(index, weight)
+            bins[item] = index
+    return bins
+
+
+def _sweep_assign(points, weights, order, remaining, depot):
+    """Gillett-Miller sweep: fill vehicles in turn with packages sorted by angle around the depot"""
+    bins = np.full(len(weights), -1, dtype=np.int32)
+    if not len(remaining):
+        return bins
+    angles = np.arctan2(points[order, 1] - depot[1], points[order, 0] - depot[0])
+    sweep = order[np.argsort(angles, kind="stable")]
+    
+    left = remaining.tolist()
+    weight_list = weights.tolist()
+    vehicle = 0
+    for item in sweep.tolist():
+        weight = weight_list[item]
+        # Move on to the next vehicle once the current one cannot take this package
+        if left[vehicle] < weight and vehicle + 1 < len(left):
+            vehicle += 1
+        if left[vehicle] >= weight:
+            left[vehicle] -= weight
+            bins[item] = vehicle
+    return bins
+
+
+def _bin_centroids(points, bins, bin_count):
+    """Per-bin centroid of assigned points; inf for empty bins so they are never nearest"""
+    assigned = bins >= 0
+    counts = np.bincount(bins[assigned], minlength=bin_count)
+    sum_x = np.bincount(bins[assigned], weights=points[assigned, 0], minlength=bin_count)
+    sum_y = np.bincount(bins[assigned], weights=points[assigned, 1], minlength=bin_count)
+    centroids = np.full((bin_count, 2), np.inf)
+    used = counts > 0
+    centroids[used, 0] = sum_x[used] / counts[used]
+    centroids[used, 1] = sum_y[used] / counts[used]
+    return centroids
+
+
+def _compactness(points, bins, centroids):
+    assigned = bins >= 0
+    if not assigned.any():
+        return 0.0
+    offsets = points[assigned] - centroids[bins[assigned]]
+    return float(np.hypot(offsets[:, 0], offsets[:, 1]).mean())
+
+
+def _improve_compactness(points, weights, bins, remaining, deadline, max_rounds=10, block_rows=8192):
+    """Capacitated k-means refinement: move packages to a nearer vehicle centroid while room allows"""
+    bin_count = len(remaining)
+    loads = np.bincount(bins[bins >= 0], weights=weights[bins >= 0], minlength=bin_count)
+    free = (remaining - loads).tolist()
+    weight_list = weights.tolist()
+    
+    for _ in range(max_rounds):
+        if time.perf_counter() >= deadline:
+            break
+        centroids = _bin_centroids(points, bins, bin_count)
+        items = np.flatnonzero(bins >= 0)
+        nearest = np.empty(len(items), dtype=np.int32)
+        gain = np.empty(len(items))
+        for start, block in iter_distance_blocks(points[items], centroids, block_rows):
+            stop = start + len(block)
+            nearest[start:stop] = block.argmin(axis=1)
+            current = block[np.arange(len(block)), bins[items[start:stop]]]
+            gain[start:stop] = current - block[np.arange(len(block)), nearest[start:stop]]
+        
+        movers = np.flatnonzero(gain > 1e-9)
+        movers = movers[np.argsort(-gain[movers], kind="stable")]
+        moved = 0
+        for index, target in zip(items[movers].tolist(), nearest[movers].tolist()):
+            weight = weight_list[index]
+            if free[target] >= weight:
+                free[target] -= weight
+                free[bins[index]] += weight
+                bins[index] = target
+                moved += 1
+        if not moved:
+            break
+    return bins
+
+
+# ----------------------
+# Route Optimization
+# ----------------------
+
+def route_length(points, order, start=DEPOT_LOCATION, return_to_start=True):
+    """Length of the route start -> points[order] (-> start)"""
+    points = _as_points(points)[np.asarray(order, dtype=np.int64)]
+    if not len(points):
+        return 0.0
+    path = np.vstack(([start], points, [start])) if return_to_start else np.vstack(([start], points))
+    steps = np.diff(path, axis=0)
+    return float(np.hypot(steps[:, 0], steps[:, 1]).sum())
+
+
+def optimize_route(points, start=DEPOT_LOCATION, priorities=None, construction="nearest",
+                   time_budget=1.0, neighbour_count=10, return_to_start=True):
+    """Order delivery stops to shorten the route; returns indices into points
+    
+    A nearest-neighbour or Clarke-Wright savings tour is improved with 2-opt and
+    Or-opt moves drawn only from each stop's neighbour_count nearest stops, so work
+    per pass grows near-linearly with the number of stops. With priorities given,
+    stops are visited tier by tier (all priority 1 before priority 2, ...), each tier
+    continuing from where the previous one ended.
+    """
+    points = _as_points(points)
+    deadline = time.perf_counter() + time_budget
+    if priorities is None:
+        tiers = [np.arange(len(points))]
+    else:
+        priorities = np.asarray(priorities)
+        tiers = [np.flatnonzero(priorities == level) for level in np.unique(priorities)]
+    
+    order = []
+    position = (float(start[0]), float(start[1]))
+    remaining_stops = len(points)
+    for index, tier in enumerate(tiers):
+        if not len(tier):
+            continue
+        # Split the remaining time between tiers by size
+        now = time.perf_counter()
+        tier_deadline = now + max(deadline - now, 0.0) * len(tier) / remaining_stops
+        remaining_stops -= len(tier)
+        closed = return_to_start and index == len(tiers) - 1
+        tier_order = _optimize_path(points[tier], position, construction, tier_deadline, neighbour_count, closed)
+        order.extend(tier[tier_order].tolist())
+        position = tuple(points[order[-1]].tolist())
+    return np.array(order, dtype=np.int64)
+
+
+def _optimize_path(points, start, construction, deadline, neighbour_count, closed):
+    """Order one tier of stops as a path from start (returning to start if closed)"""
+    count = len(points)
+    if count <= 1:
+        return np.arange(count)
+    
+    # Node `count` is the start; for open paths node `count + 1` is a dummy end
+    xs = np.append(points[:, 0], start[0]).tolist()
+    ys = np.append(points[:, 1], start[1]).tolist()
+    neighbours = _neighbour_lists(np.column_stack((xs, ys)), neighbour_count)
+    
+    if construction == "nearest":
+        tour = _nearest_neighbour_tour(xs, ys, count, neighbours)
+    elif construction == "savings":
+        tour = _savings_tour(xs, ys, count, neighbours)
+    else:
+        raise ValueError(f"Unknown route construction: {construction}")
+    
+    improver = _RouteImprover(xs, ys, tour, neighbours, depot=count, closed=closed)
+    improver.improve(deadline)
+    return np.array(improver.stops(), dtype=np.int64)
+
+
+def _neighbour_lists(points, count, block_rows=1024, grid_threshold=4096):
+    """For each point, the indices of its `count` nearest other points, nearest first"""
+    total = len(points)
+    k = min(count, total - 1)
+    if k <= 0:
+        return [[] for _ in range(total)]
+    if total > grid_threshold:
+        # Large routes: grid queries keep this O(n k) instead of a blocked n x n scan
+        grid = SpatialGrid(SimpleNamespace(x=points[:, 0], y=points[:, 1]))
+        grid.build(np.arange(total))
+        return [[other for other in grid.nearest(point, k + 1).tolist() if other != index][:k]
+                for index, point in enumerate(points.tolist())]
+    neighbours = np.empty((total, k), dtype=np.int64)
+    for start, block in iter_distance_blocks(points, points, block_rows):
+        rows = np.arange(len(block))
+        block[rows, start + rows] = np.inf
+        nearest = np.argpartition(block, k - 1, axis=1)[:, :k]
+        ranked = np.argsort(np.take_along_axis(block, nearest, axis=1), axis=1)
+        neighbours[start:start + len(block)] = np.take_along_axis(nearest, ranked, axis=1)
+    return neighbours.tolist()
+
+
+def _nearest_neighbour_tour(xs, ys, depot, neighbours):
+    """Greedy tour from the depot, checking neighbour lists before a full vectorized scan"""
+    visited = np.zeros(len(xs), dtype=bool)
+    visited[depot] = True
+    all_x = np.array(xs)
+    all_y = np.array(ys)
+    tour = [depot]
+    current = depot
+    for _ in range(len(xs) - 1):
+        nearest = next((node for node in neighbours[current] if not visited[node]), -1)
+        if nearest < 0:
+            candidates = np.flatnonzero(~visited)
+            gaps = np.hypot(all_x[candidates] - xs[current], all_y[candidates] - ys[current])
+            nearest = int(candidates[gaps.argmin()])
+        visited[nearest] = True
+        tour.append(nearest)
+        current = nearest
+    return tour
+
+
+def _savings_tour(xs, ys, depot, neighbours):
+    """Clarke-Wright savings restricted to neighbour pairs, fragments chained nearest-first"""
+    depot_x, depot_y = xs[depot], ys[depot]
+    to_depot = [math.hypot(x - depot_x, y - depot_y) for x, y in zip(xs, ys)]
+    savings = []
+    for i in range(depot):
+        for j in neighbours[i]:
+            if i < j < depot:
+                saving = to_depot[i] + to_depot[j] - math.hypot(xs[i] - xs[j], ys[i] - ys[j])
+                savings.append((saving, i, j))
+    savings.sort(reverse=True)
+    
+    # Link stops into paths; union-find stops a link from closing a cycle
+    links = [[] for _ in range(depot)]
+    parent = list(range(depot))
+    
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+    
+    for _, i, j in savings:
+        if len(links[i]) < 2 and len(links[j]) < 2:
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[root_i] = root_j
+                links[i].append(j)
+                links[j].append(i)
+    
+    # Walk each path from one end to get the fragments
+    fragments = []
+    seen = [False] * depot
+    for node in range(depot):
+        if seen[node] or len(links[node]) == 2:
+            continue
+        fragment = [node]
+        seen[node] = True
+        previous, current = -1, node
+        while True:
+            following = [other for other in links[current] if other != previous]
+            if not following:
+                break
+            previous, current = current, following[0]
+            fragment.append(current)
+            seen[current] = True
+        fragments.append(fragment)
+    
+    # Chain fragments: always continue with the fragment whose nearer end is closest
+    tour = [depot]
+    heads = np.array([[xs[f[0]], ys[f[0]]] for f in fragments])
+    tails = np.array([[xs[f[-1]], ys[f[-1]]] for f in fragments])
+    used = np.zeros(len(fragments), dtype=bool)
+    current = (depot_x, depot_y)
+    for _ in range(len(fragments)):
+        to_head = np.hypot(heads[:, 0] - current[0], heads[:, 1] - current[1])
+        to_tail = np.hypot(tails[:, 0] - current[0], tails[:, 1] - current[1])
+        to_head[used] = np.inf
+        to_tail[used] = np.inf
+        best_head, best_tail = int(to_head.argmin()), int(to_tail.argmin())
+        if to_head[best_head] <= to_tail[best_tail]:
+            chosen, fragment = best_head, fragments[best_head]
+        else:
+            chosen, fragment = best_tail, fragments[best_tail][::-1]
+        used[chosen] = True
+        tour.extend(fragment)
+        current = (xs[fragment[-1]], ys[fragment[-1]])
+    return tour
+
+
+class _RouteImprover:
+    """2-opt and Or-opt local search over a cyclic tour using neighbour-list candidates
+    
+    Open paths get a dummy end node that costs nothing to reach and is pinned next
+    to the depot, so the same cyclic moves optimize a path with a free end.
+    """
+    
+    _PINNED = -1e9  # cost of the depot-dummy edge; never worth removing
+    
+    def __init__(self, xs, ys, tour, neighbours, depot, closed):
+        self.xs = xs
+        self.ys = ys
+        self.depot = depot
+        self.dummy = -1 if closed else len(xs)
+        self.neighbours = neighbours if closed else neighbours + [[]]
+        self.tour = list(tour) if closed else list(tour) + [self.dummy]
+        self.pos = [0] * (len(xs) + 1)
+        self._reindex(0, len(self.tour))
+    
+    def _reindex(self, start, stop):
+        for index in range(start, stop):
+            self.pos[self.tour[index]] = index
+    
+    def dist(self, a, b):
+        if a == self.dummy or b == self.dummy:
+            return self._PINNED if self.depot in (a, b) else 0.0
+        return math.hypot(self.xs[a] - self.xs[b], self.ys[a] - self.ys[b])
+    
+    def succ(self, node):
+        return self.tour[(self.pos[node] + 1) % len(self.tour)]
+    
+    def pred(self, node):
+        return self.tour[self.pos[node] - 1]
+    
+    def stops(self):
+        """Stop order starting after the depot, oriented away from the dummy end"""
+        index = self.pos[self.depot]
+        rotated = self.tour[index + 1:] + self.tour[:index]
+        if self.dummy >= 0 and rotated and rotated[0] == self.dummy:
+            rotated.reverse()
+        return [node for node in rotated if node != self.dummy]
+    
+    def improve(self, deadline):
+        while time.perf_counter() < deadline:
+            improved = self.two_opt(deadline)
+            improved = self.or_opt(deadline) or improved
+            if not improved:
+                break
+    
+    def two_opt(self, deadline):
+        """Apply improving 2-opt moves until none remain or time runs out"""
+        improved = False
+        active = set(range(len(self.xs)))  # don't-look bits: only revisit nodes near a change
+        while active and time.perf_counter() < deadline:
+            a = active.pop()
+            b = self.succ(a)
+            d_ab = self.dist(a, b)
+            for c in self.neighbours[a]:
+                gain_first = d_ab - self.dist(a, c)
+                if gain_first <= 1e-12:
+                    break  # neighbours are sorted, so no later c can help
+                d = self.succ(c)
+                if c == b or d == a:
+                    continue
+                if gain_first + self.dist(c, d) - self.dist(b, d) > 1e-9:
+                    self._reverse(b, c)
+                    active.update((a, b, c, d))
+                    improved = True
+                    break
+        return improved
+    
+    def _reverse(self, b, c):
+        """Reverse the tour segment b..c (cyclic), flipping the shorter equivalent side"""
+        i, j = self.pos[b], self.pos[c]
+        if i > j:
+            i, j = self.pos[self.succ(c)], self.pos[self.pred(b)]
+        self.tour[i:j + 1] = self.tour[i:j + 1][::-1]
+        self._reindex(i, j + 1)
+    
+    def or_opt(self, deadline, max_segment=3):
+        """Relocate segments of 1-3 stops next to a neighbour of either segment end"""
+        improved = False
+        for length in range(1, max_segment + 1):
+            index = 0
+            while index < len(self.tour) and time.perf_counter() < deadline:
+                if self._try_move_segment(index, length):
+                    improved = True
+                else:
+                    index += 1
+        return improved
+    
+    def _try_move_segment(self, index, length):
+        tour = self.tour
+        if index + length > len(tour) or length >= len(tour) - 2:
+            return False
+        segment = tour[index:index + length]
+        if self.depot in segment or self.dummy in segment:
+            return False
+        first, last = segment[0], segment[-1]
+        before, after = self.pred(first), self.succ(last)
+        removal_gain = self.dist(before, first) + self.dist(last, after) - self.dist(before, after)
+        if removal_gain <= 1e-9:
+            return False
+        
+        best = None
+        for end in (first, last):
+            for c in self.neighbours[end]:
+                if c in segment:
+                    continue
+                for left, right in ((c, self.succ(c)), (self.pred(c), c)):
+                    if left in segment or right in segment:
+                        continue
+                    base = self.dist(left, right)
+                    forward = self.dist(left, first) + self.dist(last, right) - base
+                    backward = self.dist(left, last) + self.dist(first, right) - base
+                    cost, reverse = (forward, False) if forward <= backward else (backward, True)
+                    if removal_gain - cost > 1e-9 and (best is None or cost < best[0]):
+                        best = (cost, left, reverse)
+        if best is None:
+            return False
+        
+        # Splice in place and reindex only the span between the old and new positions
+        _, left, reverse = best
+        moved = segment[::-1] if reverse else segment
+        target = self.pos[left]
+        if target < index:
+            lo, hi = target + 1, index + length
+            tour[lo:hi] = moved + tour[target + 1:index]
+        else:
+            lo, hi = index, target + 1
+            tour[lo:hi] = tour[index + length:target + 1] + moved
+        self._reindex(lo, hi)
+        return True
+
+
+# ----------------------
+# Route Segmentation
+# ----------------------
+
+SEGMENT_PACKAGES = 5000  # packages per plan_fleet segment unless segment_count is given
+
+
+def segment_destinations(points, weights, segment_count, method="bisection", seed=0, iterations=25):
+    """Split destinations into segment_count regions of similar total weight
+    
+    method="bisection" cuts the longer axis at the weighted quantile, recursively.
+    method="kmeans" runs k-means with per-segment penalties that push load toward
+    the mean, giving rounder sectors. Returns a segment label per point; results
+    depend only on the inputs and seed.
+    """
+    points = _as_points(points)
+    weights = np.asarray(weights, dtype=np.float64)
+    segment_count = max(1, min(segment_count, len(points)))
+    if method == "bisection":
+        return _recursive_bisection(points, weights, segment_count)
+    if method == "kmeans":
+        return _balanced_kmeans(points, weights, segment_count, np.random.default_rng(seed), iterations)
+    raise ValueError(f"Unknown segmentation method: {method}")
+
+
+def _recursive_bisection(points, weights, segment_count):
+    labels = np.zeros(len(points), dtype=np.int32)
+    stack = [(np.arange(len(points)), segment_count, 0)]
+    while stack:
+        indices, count, first_label = stack.pop()
+        if count == 1 or len(indices) <= 1:
+            labels[indices] = first_label
+            continue
+        # Cut across the longer side so segments stay roughly square
+        extent = points[indices].max(axis=0) - points[indices].min(axis=0)
+        axis = int(extent[1] > extent[0])
+        ordered = indices[np.argsort(points[indices, axis], kind="stable")]
+        left_count = count // 2
+        cumulative = np.cumsum(weights[ordered])
+        cut = int(np.searchsorted(cumulative, cumulative[-1] * left_count / count))
+        cut = min(max(cut, 1), len(ordered) - 1)
+        stack.append((ordered[cut:], count - left_count, first_label + left_count))
+        stack.append((ordered[:cut], left_count, first_label))
+    return labels
+
+
+def _kmeans_plus_plus(points, count, rng, sample_size=20000):
+    """k-means++ seeding on a sample of the points"""
+    if len(points) > sample_size:
+        points = points[rng.choice(len(points), sample_size, replace=False)]
+    centers = [points[rng.integers(len(points))]]
+    nearest = np.full(len(points), np.inf)
+    for _ in range(count - 1):
+        nearest = np.minimum(nearest, distances_from(centers[-1], points) ** 2)
+        total = nearest.sum()
+        index = rng.choice(len(points), p=nearest / total) if total > 0 else rng.integers(len(points))
+        centers.append(points[index])
+    return np.array(centers)
+
+
+def _balanced_kmeans(points, weights, count, rng, iterations, block_rows=65536):
+    centers = _kmeans_plus_plus(points, count, rng)
+    target = weights.sum() / count
+    spread = float(np.ptp(points, axis=0).max()) or 1.0
+    penalty = np.zeros(count)
+    labels = np.zeros(len(points), dtype=np.int32)
+    for iteration in range(iterations):
+        for start, block in iter_distance_blocks(points, centers, block_rows):
+            block += penalty
+            labels[start:start + len(block)] = block.argmin(axis=1)
+        loads = np.bincount(labels, weights=weights, minlength=count)
+        # Overloaded segments become "farther away", underloaded ones "closer"
+        step = 0.5 * spread / (iteration + 2)
+        penalty += step * (loads - target) / max(target, 1e-12)
+        sizes = np.bincount(labels, minlength=count)
+        filled = sizes > 0
+        for axis in (0, 1):
+            sums = np.bincount(labels, weights=points[:, axis], minlength=count)
+            centers[filled, axis] = sums[filled] / sizes[filled]
+    return labels
+
+
+def _allocate_vehicles(segment_loads, capacities):
+    """Give each vehicle, largest first, to the segment with the most unmet load"""
+    unmet = np.asarray(segment_loads, dtype=np.float64).copy()
+    owners = np.empty(len(capacities), dtype=np.int32)
+    for vehicle in np.argsort(-np.asarray(capacities), kind="stable").tolist():
+        segment = int(unmet.argmax())
+        owners[vehicle] = segment
+        unmet[segment] -= capacities[vehicle]
+    return owners
+
+
+def _balance_depots(points, weights, priorities, depots, locations, free, neighbours=2):
+    """Coordinator step of plan_depots: move overflow between neighbouring depots
+    
+    depots holds the depot index per package and free the free fleet capacity per depot.
+    Depots are visited most overloaded first; each sheds packages, lowest priority and
+    smallest detour first, to the nearest of its `neighbours` nearest depots that still
+    has room for them, until its load fits. Returns the new depot index per package.
+    """
+    depots = depots.copy()
+    spare = free - np.bincount(depots, weights=weights, minlength=len(locations))
+    neighbours = min(neighbours, len(locations) - 1)
+    if neighbours < 1:
+        return depots
+    near = np.argsort(pairwise_distances(locations), axis=1, kind="stable")[:, 1:neighbours + 1]
+    for depot in np.argsort(spare, kind="stable").tolist():
+        if spare[depot] >= 0:
+            break
+        members = np.flatnonzero(depots == depot)
+        targets = near[depot]
+        detours = distance_matrix(points[members], locations[targets])
+        detours -= distances_from(locations[depot], points[members])[:, None]
+        choices = np.argsort(detours, axis=1, kind="stable")
+        for index in np.lexsort((detours.min(axis=1), -priorities[members])).tolist():
+            weight = weights[members[index]]
+            for target in targets[choices[index]].tolist():
+                if spare[target] >= weight:
+                    depots[members[index]] = target
+                    spare[target] -= weight
+                    spare[depot] += weight
+                    break
+            if spare[depot] >= 0 or spare[targets].max() <= 0:
+                break
+    return depots
+
+
+def _solve_segment(task):
+    """Assign and route one segment's packages; runs in a worker process"""
+    points = task["points"]
+    priorities = task["priorities"]
+    deadline = time.perf_counter() + task["time_budget"]
+    bins = assign_bins(points, task["weights"], priorities, task["remaining"], task["mode"], deadline, task["depot"])
+    routes = []
+    for vehicle, start in enumerate(task["starts"]):
+        members = np.flatnonzero(bins == vehicle)
+        order = optimize_route(
+            points[members],
+            start=start,
+            priorities=priorities[members] if task["respect_priority"] else None,
+            construction=task["construction"],
+            time_budget=max(deadline - time.perf_counter(), 0.0) if math.isfinite(deadline) else math.inf,
+        )
+        routes.append(members[order])
+    return bins, routes
+
+
+def _cheapest_insertion(points, route, start, point, priorities=None, priority=None):
+    """Position in route where inserting point adds the least distance (closed at start)"""
+    path = np.vstack(([start], points[route], [start]))
+    before, after = path[:-1], path[1:]
+    added = (np.hypot(*(before - point).T) + np.hypot(*(after - point).T)
+             - np.hypot(*(after - before).T))
+    if priorities is not None and len(route):
+        # Stay inside this priority's tier of the route
+        tiers = priorities[route]
+        lo = int(np.searchsorted(tiers, priority, side="left"))
+        hi = int(np.searchsorted(tiers, priority, side="right"))
+        position = lo + int(added[lo:hi + 1].argmin())
+    else:
+        position = int(added.argmin())
+    return position, float(added[position])
+
+
+# ----------------------
+# Traffic
+# ----------------------
+
+class TrafficZones:
+    """Speed multipliers over rectangular zones (x0, y0, x1, y1)
+    
+    A multiplier of 0.5 halves speed inside its zone. A leg's travel time is scaled by
+    1 + sum over zones of (fraction of the straight leg inside the zone) * (1 / multiplier - 1),
+    which is exact for disjoint zones; overlapping zones add their delays. On a road
+    network the same factor is taken along the chord between the leg's end points.
+    """
+    
+    def __init__(self):
+        self.zones = {}  # zone id -> (x0, y0, x1, y1, multiplier)
+        self.version = 0
+    
+    def __len__(self):
+        return len(self.zones)
+    
+    def set(self, zone, bounds, multiplier):
+        """Add or replace a zone; returns the boxes whose legs change travel time"""
+        if multiplier <= 0:
+            raise ValueError("Traffic multiplier must be positive")
+        x0, y0, x1, y1 = (float(value) for value in bounds)
+        changed = [(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))]
+        if self.zones.get(zone) == changed[0] + (float(multiplier),):
+            return []
+        if zone in self.zones:
+            changed.append(self.zones[zone][:4])
+        self.zones[zone] = changed[0] + (float(multiplier),)
+        self.version += 1
+        return changed
+    
+    def clear(self, zone=None):
+        """Remove one zone, or all of them; returns the boxes whose legs change travel time"""
+        removed = list(self.zones) if zone is None else [zone] if zone in self.zones else []
+        changed = [self.zones.pop(name)[:4] for name in removed]
+        if changed:
+            self.version += 1
+        return changed
+    
+    def factor(self, point1, point2):
+        """Travel-time multiplier for the leg point1 -> point2"""
+        factor = 1.0
+        for x0, y0, x1, y1, multiplier in self.zones.values():
+            inside = _clip_fraction(point1[0], point1[1], point2[0], point2[1], x0, y0, x1, y1)
+            factor += inside * (1.0 / multiplier - 1.0)
+        return factor
+    
+    def factors(self, starts, ends):
+        """Vectorized factor for (n, 2) arrays of leg starts and ends"""
+        factors = np.ones(len(starts))
+        for zone in self.zones.values():
+            factors += np.maximum(_clip_fractions(starts, ends, zone[:4]), 0.0) * (1.0 / zone[4] - 1.0)
+        return factors
+
+
+def _clip_fraction(ax, ay, bx, by, x0, y0, x1, y1):
+    """Fraction of segment a -> b inside the box (Liang-Barsky)"""
+    lo, hi = 0.0, 1.0
+    for start, delta, low, high in ((ax, bx - ax, x0, x1), (ay, by - ay, y0, y1)):
+        if delta == 0:
+            if start < low or start > high:
+                return 0.0
+            continue
+        enter, leave = (low - start) / delta, (high - start) / delta
+        if enter > leave:
+            enter, leave = leave, enter
+        lo, hi = max(lo, enter), min(hi, leave)
+    return max(hi - lo, 0.0)
+
+
+def _clip_fractions(starts, ends, box):
+    """Vectorized _clip_fraction; negative where a segment misses the box entirely"""
+    starts, ends = _as_points(starts), _as_points(ends)
+    lo = np.zeros(len(starts))
+    hi = np.ones(len(starts))
+    for axis, (low, high) in enumerate(((box[0], box[2]), (box[1], box[3]))):
+        start = starts[:, axis]
+        delta = ends[:, axis] - start
+        flat = delta == 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            enter = (low - start) / delta
+            leave = (high - start) / delta
+        enter, leave = np.minimum(enter, leave), np.maximum(enter, leave)
+        outside = flat & ((start < low) | (start > high))
+        enter[flat] = np.where(outside[flat], np.inf, -np.inf)
+        leave[flat] = np.where(outside[flat], -np.inf, np.inf)
+        np.maximum(lo, enter, out=lo)
+        np.minimum(hi, leave, out=hi)
+    return hi - lo
+
+
+def leg_hours(starts, ends, speed, traffic=None, network=None):
+    """Driving hours for each leg at speed, on the road network if one is given, under traffic"""
+    starts, ends = _as_points(starts), _as_points(ends)
+    if network is not None:
+        hours = np.array([network.travel_time(start, end) for start, end in zip(starts.tolist(), ends.tolist())])
+        hours *= network.reference_speed / speed
+    else:
+        hours = np.hypot(ends[:, 0] - starts[:, 0], ends[:, 1] - starts[:, 1]) / speed
+    if traffic:
+        hours *= traffic.factors(starts, ends)
+    return hours
+
+
+def _leg_cost(speed, traffic=None, network=None):
+    """Scalar leg_hours as a function of two points, for route improvers"""
+    if network is not None:
+        scale = network.reference_speed / speed
+        base = lambda point1, point2: network.travel_time(point1, point2) * scale
+    else:
+        base = lambda point1, point2: calculate_distance(point1, point2) / speed
+    if not traffic:
+        return base
+    return lambda point1, point2: base(point1, point2) * traffic.factor(point1, point2)
+
+
+def _boxes_overlap(first, second):
+    return first[0] <= second[2] and second[0] <= first[2] and first[1] <= second[3] and second[1] <= first[3]
+
+
+class ReplanReport:
+    """Outcome of LogisticsSystem.update_traffic"""
+    
+    def __init__(self):
+        self.vehicles = []  # ids of vehicles whose routes were re-optimized
+        self.windows = 0  # route windows re-optimized
+        self.stops = 0  # stops inside those windows
+        self.hours_before = 0.0  # remaining driving hours of those vehicles under the new traffic
+        self.hours_after = 0.0
+        self.etas = {}  # vehicle id -> hours from now to each remaining stop
+        self.elapsed = 0.0
+    
+    def __repr__(self):
+        return (f"ReplanReport(vehicles={len(self.vehicles)}, windows={self.windows}, stops={self.stops}, "
+                f"hours {self.hours_before:.3f} -> {self.hours_after:.3f}, {self.elapsed * 1000:.1f} ms)")
+
+
+class _LegCostImprover(_RouteImprover):
+    """_RouteImprover on leg travel costs, with the dummy end pinned to a fixed end point
+    
+    Pairwise costs are memoized, since a window re-optimization revisits the same few legs.
+    """
+    
+    def __init__(self, xs, ys, tour, neighbours, depot, cost, end):
+        self.cost = cost
+        self.end = end
+        self._memo = {}
+        super().__init__(xs, ys, tour, neighbours, depot, closed=False)
+    
+    def dist(self, a, b):
+        if a == self.dummy or b == self.dummy:
+            if self.depot in (a, b):
+                return self._PINNED
+            a = b if a == self.dummy else a
+            b = self.dummy
+        elif a > b:
+            a, b = b, a
+        key = (a, b)
+        cost = self._memo.get(key)
+        if cost is None:
+            end = self.end if b == self.dummy else (self.xs[b], self.ys[b])
+            cost = self._memo[key] = self.cost((self.xs[a], self.ys[a]), end)
+        return cost
+
+
+def _hot_windows(hot, tiers, first, margin):
+    """Contiguous [start, stop) stop windows around the hot stops, each inside one tier"""
+    windows = []
+    for tier_start, tier_stop in tiers:
+        tier_start = max(tier_start, first)
+        positions = np.flatnonzero(hot[tier_start:tier_stop]) + tier_start
+        if not len(positions):
+            continue
+        lo = np.maximum(positions - margin, tier_start)
+        hi = np.minimum(positions + margin + 1, tier_stop)
+        # Merge overlapping windows
+        start, stop = int(lo[0]), int(hi[0])
+        for low, high in zip(lo[1:].tolist(), hi[1:].tolist()):
+            if low <= stop:
+                stop = max(stop, high)
+            else:
+                windows.append((start, stop))
+                start, stop = low, high
+        windows.append((start, stop))
+    return windows
+
+
+# ----------------------
+# Delivery Estimates
+# ----------------------
+
+ON_TIME_GRACE_MINUTES = 1.0  # a delivery this close past its estimate still counts as on time
+_MINUTE = np.timedelta64(60_000_000, "us")
+
+
+def route_arrival_hours(starts, points, counts, speeds, service_hours=0.0, traffic=None, network=None):
+    """Hours from departure to every stop of several routes, in one vectorized pass
+    
+    The routes' stops are concatenated in `points`, counts[i] of them for route i, which
+    leaves starts[i] and drives at speeds[i] (see leg_hours); service_hours are spent at
+    each stop before the next leg. This is the Simulator's timing, so an undisturbed run
+    arrives at every stop exactly when projected.
+    """
+    points, starts = _as_points(points), _as_points(starts)
+    counts = np.asarray(counts, dtype=np.int64)
+    if not len(points):
+        return np.empty(0)
+    used = counts > 0
+    firsts = (np.cumsum(counts) - counts)[used]
+    previous = np.empty_like(points)
+    previous[1:] = points[:-1]
+    previous[firsts] = starts[used]
+    speeds = np.repeat(np.broadcast_to(np.asarray(speeds, dtype=np.float64), counts.shape), counts)
+    legs = leg_hours(previous, points, speeds, traffic, network)
+    totals = np.cumsum(legs)
+    # Restart the running sum at each route's first stop, then add the service stops passed
+    hours = totals - np.repeat(totals[firsts] - legs[firsts], counts[used])
+    hours += service_hours * (np.arange(len(points)) - np.repeat(firsts, counts[used]))
+    return hours
+
+
+class _OnTimeTally:
+    """Delivery counts and lateness for one group of packages"""
+    __slots__ = ("delivered", "scheduled", "late", "late_minutes")
+    
+    def __init__(self, delivered=0, scheduled=0, late=0, late_minutes=0.0):
+        self.delivered = delivered
+        self.scheduled = scheduled  # deliveries with an estimate to judge against
+        self.late = late
+        self.late_minutes = late_minutes  # summed over the late deliveries
+    
+    @property
+    def on_time(self):
+        return self.scheduled - self.late
+    
+    @property
+    def on_time_rate(self):
+        """Share of judged deliveries that were on time, or None before the first"""
+        return self.on_time / self.scheduled if self.scheduled else None
+    
+    @property
+    def mean_lateness(self):
+        """Mean minutes late over the late deliveries"""
+        return self.late_minutes / self.late if self.late else 0.0
+    
+    def summary(self):
+        return {"delivered": self.delivered, "scheduled": self.scheduled, "on_time": self.on_time,
+                "late": self.late, "on_time_rate": self.on_time_rate, "mean_lateness_minutes": self.mean_lateness}
+
+
+def _tallies(keys, scheduled, late, late_minutes):
+    """{key: _OnTimeTally} for non-negative integer group keys, summed with bincount"""
+    delivered, *sums = (np.bincount(keys, weights) for weights in (None, scheduled, late, late_minutes))
+    return {key: _OnTimeTally(int(delivered[key]), int(sums[0][key]), int(sums[1][key]), float(sums[2][key]))
+            for key in np.flatnonzero(delivered).tolist()}
+
+
+class DeliveryStats:
+    """Running on-time aggregates over delivered packages: overall, per priority and per vehicle
+    
+    LogisticsSystem.deliver_package records each delivery in O(1), comparing its
+    actual_delivery with estimated_delivery, so the on-time rate, late counts and mean
+    lateness are always current without rescanning delivered_packages. A delivery more
+    than grace_minutes past its estimate is late; one without an estimate is counted but
+    not judged. rebuild() recomputes everything in one vectorized pass.
+    """
+    
+    def __init__(self, grace_minutes=ON_TIME_GRACE_MINUTES):
+        self.grace_minutes = grace_minutes
+        self.reset()
+    
+    def reset(self):
+        self.total = _OnTimeTally()
+        self.by_priority = {}  # priority -> _OnTimeTally
+        self.by_vehicle = {}  # vehicle id -> _OnTimeTally
+    
+    def record(self, store, row):
+        """Add the delivery in a store row"""
+        # item() reads plain Python values (datetime, or None for NaT): far cheaper than NumPy scalars here
+        estimated, actual = store.estimated_delivery.item(row), store.actual_delivery.item(row)
+        minutes = None if estimated is None or actual is None else (actual - estimated).total_seconds() / 60
+        tallies = [self.total]
+        priority = store.priority.item(row)
+        tally = self.by_priority.get(priority)
+        if tally is None:
+            tally = self.by_priority[priority] = _OnTimeTally()
+        tallies.append(tally)
+        code = store.vehicle.item(row)
+        if code >= 0:
+            vehicle_id = store.vehicle_ids[code]
+            tally = self.by_vehicle.get(vehicle_id)
+            if tally is None:
+                tally = self.by_vehicle[vehicle_id] = _OnTimeTally()
+            tallies.append(tally)
+        late = minutes is not None and minutes > self.grace_minutes
+        for tally in tallies:
+            tally.delivered += 1
+            if minutes is not None:
+                tally.scheduled += 1
+                if late:
+                    tally.late += 1
+                    tally.late_minutes += minutes
+    
+    def rebuild(self, store, rows):
+        """Recompute every aggregate from the given delivered rows"""
+        self.reset()
+        rows = np.asarray(rows, dtype=np.int64)
+        estimated, actual = store.estimated_delivery[rows], store.actual_delivery[rows]
+        scheduled = ~(np.isnat(estimated) | np.isnat(actual))
+        minutes = np.zeros(len(rows))
+        minutes[scheduled] = (actual[scheduled] - estimated[scheduled]) / _MINUTE
+        late = scheduled & (minutes > self.grace_minutes)
+        late_minutes = np.where(late, minutes, 0.0)
+        columns = (scheduled, late, late_minutes)
+        self.total = _tallies(np.zeros(len(rows), dtype=np.int64), *columns).get(0, _OnTimeTally())
+        self.by_priority = _tallies(store.priority[rows].astype(np.int64), *columns)
+        codes = store.vehicle[rows].astype(np.int64)
+        assigned = codes >= 0
+        self.by_vehicle = {store.vehicle_ids[code]: tally for code, tally in
+                           _tallies(codes[assigned], *(column[assigned] for column in columns)).items()}
+    
+    @property
+    def on_time_rate(self):
+        return self.total.on_time_rate
+    
+    def summary(self, vehicles=True):
+        """JSON-ready aggregates; per-vehicle ones only if `vehicles`"""
+        result = self.total.summary()
+        result["by_priority"] = {priority: tally.summary() for priority, tally in sorted(self.by_priority.items())}
+        if vehicles:
+            result["by_vehicle"] = {vehicle_id: tally.summary() for vehicle_id, tally in self.by_vehicle.items()}
+        return result
+
+
+# ----------------------
+# Simulation
+# ----------------------
+
+class SimulationEvent:
+    """One state change emitted by the Simulator to its observers"""
+    __slots__ = ("time", "kind", "vehicle", "package")
+    
+    def __init__(self, time, kind, vehicle, package=None):
+        self.time = time  # datetime on the virtual clock
+        self.kind = kind  # load, depart, deliver, return, arrive-depot
+        self.vehicle = vehicle  # vehicle id
+        self.package = package  # package id for deliveries
+    
+    def __repr__(self):
+        target = f", {self.package}" if self.package else ""
+        return f"SimulationEvent({self.time:%H:%M:%S}, {self.kind}, {self.vehicle}{target})"
+
+
+class Simulator:
+    """Discrete-event simulation of the fleet on a virtual clock
+    
+    Events sit in a heap keyed by virtual time (hours since start). Each vehicle with
+    packages loads, departs, drives its planned_stops() one by one using
+    calculate_travel_time (on the system's road network, slowed by its traffic zones), and returns to its
+    home depot. Deliveries go through LogisticsSystem so the indexes stay in sync.
+    Nothing waits on real time, so run() fast-forwards.
+    
+    On departure the trip's arrivals are projected into the eta column in one pass. At
+    each delivery that arrives off its projection, only the stops still ahead are shifted,
+    so keeping ETAs current costs nothing while the vehicle runs to plan.
+    """
+    
+    # Heap entry kinds
+    _LOAD, _DEPART, _DELIVER, _RETURN, _ARRIVE = range(5)
+    _KIND_NAMES = ("load", "depart", "deliver", "return", "arrive-depot")
+    _ETA_TOLERANCE = 1 / 3600  # hours an arrival may drift before the stops ahead are re-projected
+    
+    def __init__(self, system, start=None, loading_minutes=15, service_minutes=2):
+        self.system = system
+        self.start = start or datetime.now()
+        self.loading_hours = loading_minutes / 60
+        self.service_hours = service_minutes / 60
+        self.now = 0.0  # hours since start
+        self.processed = 0
+        self.observers = []
+        self._queue = []
+        self._sequence = 0  # tie-breaker so equal times pop in scheduling order
+        self._trips = {}  # vehicle index -> (stops, home location)
+        self._etas = {}  # vehicle index -> projected arrival hours per trip stop, once departed
+    
+    @property
+    def clock(self):
+        """Current virtual time as a datetime"""
+        return self.start + timedelta(hours=self.now)
+    
+    def subscribe(self, observer):
+        """Call observer(event) for every SimulationEvent"""
+        self.observers.append(observer)
+    
+    def schedule(self, hours, kind, vehicle_index, stop=0):
+        heapq.heappush(self._queue, (hours, self._sequence, kind, vehicle_index, stop))
+        self._sequence += 1
+    
+    def dispatch_all(self):
+        """Queue a trip for every vehicle holding packages and not already on the road"""
+        for index, vehicle in enumerate(self.system.vehicles):
+            if index not in self._trips and vehicle.packages:
+                self.schedule(self.now, self._LOAD, index)
+    
+    @timed(items=lambda handled: handled)
+    def run(self, until=None, max_events=None):
+        """Process events up to `until` hours after start (or a datetime); returns events handled"""
+        if isinstance(until, datetime):
+            until = (until - self.start).total_seconds() / 3600
+        handled = 0
+        queue = self._queue
+        while queue and (until is None or queue[0][0] <= until) and (max_events is None or handled < max_events):
+            hours, _, kind, vehicle_index, stop = heapq.heappop(queue)
+            self.now = hours
+            self._handle(kind, vehicle_index, stop)
+            handled += 1
+        if until is not None and until > self.now:
+            self.now = until
+        self.processed += handled
+        return handled
+    
+    def step(self):
+        """Process the next event only"""
+        return self.run(max_events=1)
+    
+    @property
+    def pending(self):
+        """Number of events still queued"""
+        return len(self._queue)
+    
+    def _emit(self, kind, vehicle, package=None):
+        event = SimulationEvent(self.clock, self._KIND_NAMES[kind], vehicle.id, package)
+        for observer in self.observers:
+            observer(event)
+    
+    def _handle(self, kind, vehicle_index, stop):
+        system = self.system
+        vehicle = system.vehicles[vehicle_index]
+        package_id = None
+        
+        if kind == self._LOAD:
+            if vehicle_index in self._trips:
+                return  # queued twice (dispatch_all while a re-dispatch was pending); already loading
+            # Packages delivered already (e.g. on a trip before a restore) are dropped, not loaded again
+            status = system.store.status
+            delivered = _STATUS_CODES["delivered"]
+            vehicle.packages = [package for package in vehicle.packages if status[package._row] != delivered]
+            vehicle.route = [package for package in vehicle.route if status[package._row] != delivered]
+            if not vehicle.packages:
+                vehicle.status = "available"
+                return
+            self._trips[vehicle_index] = (vehicle.planned_stops(), vehicle.home)
+            vehicle.status = "loading"
+            self.schedule(self.now + self.loading_hours, self._DEPART, vehicle_index)
+        
+        elif kind == self._DEPART:
+            stops, _ = self._trips[vehicle_index]
+            rows = np.array([package._row for package in stops], dtype=np.int64)
+            system.store.status[rows] = _STATUS_CODES["in-transit"]
+            system.store.pickup_time[rows] = np.datetime64(self.clock, "us")
+            etas = self._etas[vehicle_index] = self.now + route_arrival_hours(
+                [vehicle.location], system.destination_array(rows), [len(rows)], vehicle.speed,
+                self.service_hours, system.traffic, system.road_network)
+            system.store.eta[rows] = self._times(etas)
+            system.store.touch(rows)
+            vehicle.status = "in-transit"
+            self._schedule_leg(vehicle_index, 0)
+        
+        elif kind == self._DELIVER:
+            stops, _ = self._trips[vehicle_index]
+            package = stops[stop]
+            vehicle.location = package.destination
+            package_id = package.id
+            etas = self._etas[vehicle_index]
+            drift = self.now - etas[stop]
+            if abs(drift) > self._ETA_TOLERANCE and stop + 1 < len(stops):
+                etas[stop + 1:] += drift
+                self._write_etas(stops[stop + 1:], etas[stop + 1:])
+            system.deliver_package(package_id, delivered_at=self.clock)
+            self._schedule_leg(vehicle_index, stop + 1, self.service_hours)
+        
+        elif kind == self._RETURN:
+            _, home = self._trips[vehicle_index]
+            vehicle.status = "returning"
+            self.schedule(self.now + self._travel_time(vehicle, home), self._ARRIVE, vehicle_index)
+        
+        else:
+            stops, home = self._trips.pop(vehicle_index)
+            self._etas.pop(vehicle_index, None)
+            vehicle.location = home
+            vehicle.status = "available"
+            # The trip's load has been delivered, so its capacity is free for the next assignment;
+            # packages assigned while the vehicle was out go on a new trip straight away
+            trip = {package._row for package in stops}
+            vehicle.packages = [package for package in vehicle.packages if package._row not in trip]
+            vehicle.route = [package for package in vehicle.route if package._row not in trip]
+            if vehicle.packages:
+                self.schedule(self.now, self._LOAD, vehicle_index)
+        
+        if self.observers:
+            self._emit(kind, vehicle, package_id)
+    
+    def _schedule_leg(self, vehicle_index, stop, delay=0.0):
+        """Drive to the given stop, or head home after the last one"""
+        stops, _ = self._trips[vehicle_index]
+        if stop < len(stops):
+            vehicle = self.system.vehicles[vehicle_index]
+            travel = self._travel_time(vehicle, stops[stop].destination)
+            self.schedule(self.now + delay + travel, self._DELIVER, vehicle_index, stop)
+        else:
+            self.schedule(self.now + delay, self._RETURN, vehicle_index)
+    
+    def _times(self, hours):
+        """Virtual-clock datetime64 values for hours since start"""
+        return np.datetime64(self.start, "us") + (hours * 3.6e9).astype("timedelta64[us]")
+    
+    def _write_etas(self, packages, hours):
+        rows = np.fromiter((package._row for package in packages), dtype=np.int64, count=len(packages))
+        self.system.store.eta[rows] = self._times(hours)
+        self.system.store.touch(rows)
+    
+    def _travel_time(self, vehicle, destination):
+        travel = vehicle.calculate_travel_time(destination, self.system.road_network)
+        if self.system.traffic:
+            travel *= self.system.traffic.factor(vehicle.location, destination)
+        return travel
+    
+    def reroute(self, vehicle_ids=None):
+        """Adopt re-planned routes (see LogisticsSystem.update_traffic) for trips under way
+        
+        The stop a vehicle is already driving to keeps its scheduled arrival; the ETAs of
+        the stops after it are re-projected along the new order.
+        """
+        delivered = _STATUS_CODES["delivered"]
+        status = self.system.store.status
+        for index, (stops, home) in list(self._trips.items()):
+            vehicle = self.system.vehicles[index]
+            if (vehicle_ids is not None and vehicle.id not in vehicle_ids) or len(vehicle.route) != len(stops):
+                continue
+            done = sum(1 for package in stops if status[package._row] == delivered)
+            remaining = [package for package in vehicle.route if status[package._row] != delivered]
+            self._trips[index] = (stops[:done] + remaining, home)
+            etas = self._etas.get(index)
+            if etas is not None and len(remaining) > 1:
+                ahead = remaining[1:]
+                etas[done + 1:] = etas[done] + self.service_hours + route_arrival_hours(
+                    [remaining[0].destination], [package.destination for package in ahead], [len(ahead)],
+                    vehicle.speed, self.service_hours, self.system.traffic, self.system.road_network)
+                self._write_etas(ahead, etas[done + 1:])
+
+
+# ----------------------
+# Workload Generation
+# ----------------------
+
+SPATIAL_DISTRIBUTIONS = ("uniform", "clustered", "ring")
+WEIGHT_DISTRIBUTIONS = ("uniform", "lognormal", "bimodal")
+
+
+class WorkloadGenerator:
+    """Seeded, vectorized synthetic packages and vehicles for load-testing the planners
+    
+    Destinations are drawn over the square [-extent, extent]^2:
+      uniform    evenly spread
+      clustered  urban hotspots: `hotspots` Gaussian clusters of uneven popularity,
+                 plus a `background` fraction spread uniformly between them
+      ring       a suburban ring at ~0.6 * extent around the depot
+    priority_mix gives the share of priority 1, 2 and 3 packages. Weights are uniform
+    0.5-10 (the original demo), lognormal (mostly small parcels, long tail) or bimodal
+    (80% parcels, 20% bulky items). Each column draws from its own child stream of the
+    seed, so a seed and chunk size always reproduce the same workload.
+    """
+    
+    def __init__(self, seed=0, distribution="uniform", extent=50.0, hotspots=8, hotspot_spread=0.06,
+                 background=0.1, priority_mix=(1/3, 1/3, 1/3), weights="uniform", start=None,
+                 eta_hours=(1, 5)):
+        if distribution not in SPATIAL_DISTRIBUTIONS:
+            raise ValueError(f"Unknown distribution: {distribution}")
+        if weights not in WEIGHT_DISTRIBUTIONS:
+            raise ValueError(f"Unknown weight distribution: {weights}")
+        mix = np.asarray(priority_mix, dtype=np.float64)
+        if mix.shape != (3,) or (mix < 0).any() or mix.sum() <= 0:
+            raise ValueError("priority_mix needs three non-negative shares")
+        self.distribution = distribution
+        self.extent = float(extent)
+        self.background = background
+        self.weight_distribution = weights
+        self.start = np.datetime64(start or datetime.now(), "us")
+        self.eta_hours = eta_hours
+        self._priority_edges = np.cumsum(mix / mix.sum())[:-1]
+        
+        streams = np.random.SeedSequence(seed).spawn(6)
+        self._layout, self._points, self._priority, self._weight, self._eta, self._fleet = (
+            np.random.default_rng(stream) for stream in streams)
+        self._generated = 0
+        
+        # Hotspot centres and popularity are fixed per generator so every chunk shares them
+        self.hotspot_centres = self._layout.uniform(-0.8, 0.8, (hotspots, 2)) * self.extent
+        self.hotspot_shares = self._layout.dirichlet(np.full(hotspots, 1.5))
+        self.hotspot_sigma = hotspot_spread * self.extent
+    
+    def points(self, count):
+        """(count, 2) destinations from the configured spatial distribution"""
+        rng, extent = self._points, self.extent
+        if self.distribution == "uniform":
+            return rng.uniform(-extent, extent, (count, 2))
+        if self.distribution == "ring":
+            radius = rng.normal(0.6 * extent, 0.08 * extent, count)
+            angle = rng.uniform(0, 2 * np.pi, count)
+            points = np.column_stack((radius * np.cos(angle), radius * np.sin(angle)))
+        else:
+            cluster = np.searchsorted(np.cumsum(self.hotspot_shares)[:-1], rng.random(count), side="right")
+            points = self.hotspot_centres[cluster] + rng.normal(0, self.hotspot_sigma, (count, 2))
+            scattered = rng.random(count) < self.background
+            points[scattered] = rng.uniform(-extent, extent, (int(scattered.sum()), 2))
+        return np.clip(points, -extent, extent, out=points)
+    
+    def priorities(self, count):
+        """int8 priorities (1 = highest) following priority_mix"""
+        return (np.searchsorted(self._priority_edges, self._priority.random(count), side="right") + 1).astype(np.int8)
+    
+    def weights(self, count):
+        """Package weights from the configured weight distribution"""
+        rng = self._weight
+        if self.weight_distribution == "uniform":
+            return rng.uniform(0.5, 10, count)
+        if self.weight_distribution == "lognormal":
+            return np.clip(rng.lognormal(np.log(2.0), 0.8, count), 0.1, 40.0)
+        bulky = rng.random(count) < 0.2
+        return np.where(bulky, rng.uniform(12, 30, count), np.clip(rng.lognormal(np.log(1.5), 0.5, count), 0.1, 12))
+    
+    def estimated_deliveries(self, count):
+        low, high = self.eta_hours
+        offsets = (self._eta.uniform(low, high, count) * 3600e6).astype("timedelta64[us]")
+        return self.start + offsets
+    
+    def packages(self, count):
+        """Column dict for the next `count` packages, ready for LogisticsSystem.add_packages"""
+        first = self._generated
+        self._generated += count
+        points = self.points(count)
+        return {
+            "ids": [f"P{i}" for i in range(first + 1, first + count + 1)],
+            "x": points[:, 0],
+            "y": points[:, 1],
+            "priority": self.priorities(count),
+            "weight": self.weights(count),
+            "estimated_delivery": self.estimated_deliveries(count),
+        }
+    
+    def vehicles(self, count, capacity=100, speed=50, first=1):
+        """Vehicles V<first>...; capacity and speed are numbers or (low, high) ranges"""
+        def draw(value):
+            if isinstance(value, (int, float)):
+                return np.full(count, float(value))
+            return self._fleet.uniform(value[0], value[1], count)
+        capacities, speeds = draw(capacity), draw(speed)
+        return [Vehicle(f"V{first + i}", capacity=capacities[i].item(), speed=speeds[i].item())
+                for i in range(count)]
+    
+    def populate(self, system, package_count, chunk_size=100000, progress=None):
+        """Append package_count packages to system in chunks; progress(fraction) after each"""
+        for start in range(0, package_count, chunk_size):
+            count = min(chunk_size, package_count - start)
+            columns = self.packages(count)
+            system.add_packages(columns["ids"], columns["x"], columns["y"], columns["priority"],
+                                columns["weight"], columns["estimated_delivery"])
+            if progress:
+                progress((start + count) / package_count)
+        return system
+
+
+# ----------------------
+# Manifest Ingestion
+# ----------------------
+
+MANIFEST_COLUMNS = ("id", "x", "y", "priority", "weight")
+MANIFEST_FIELDS = MANIFEST_COLUMNS + ("estimated_delivery",)
+
+
+class ManifestReport:
+    """Outcome of load_manifest"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0  # data records read
+        self.loaded = 0  # packages appended to the system
+        self.rejected = 0  # records skipped as invalid
+        self.errors = []  # (line, message) for the first rejected records
+        self.batches = 0
+        self.elapsed = 0.0  # seconds
+    
+    @property
+    def throughput(self):
+        """Records read per second"""
+        return self.rows / self.elapsed if self.elapsed else 0.0
+    
+    def __repr__(self):
+        return (f"ManifestReport({self.path}, loaded={self.loaded}, rejected={self.rejected}, "
+                f"{self.throughput:,.0f} rows/s)")
+
+
+def _open_manifest(path):
+    """Open a manifest for text reading; returns (text handle, raw handle for progress)"""
+    raw = open(path, "rb")
+    if path.endswith(".gz"):
+        import gzip
+        binary = gzip.GzipFile(fileobj=raw)
+    else:
+        binary = raw
+    import io
+    return io.TextIOWrapper(binary, encoding="utf-8", newline=""), raw
+
+
+def iter_manifest_batches(handle, path, batch_size=10000):
+    """Yield (lines, columns, unreadable) batches from an open CSV or JSON Lines manifest
+    
+    columns is a tuple of per-field sequences in MANIFEST_FIELDS order, with None for
+    absent values; lines gives each record's line number (for CSV, assuming no quoted
+    newlines) and unreadable maps the batch positions of records that could not be read
+    (lines that are not JSON objects, CSV rows with more fields than the header) to why.
+    """
+    from itertools import islice
+    if path.endswith((".jsonl", ".ndjson", ".jsonl.gz", ".ndjson.gz")):
+        import json
+        numbered = enumerate(handle, 1)
+        while True:
+            chunk = list(islice(numbered, batch_size))
+            if not chunk:
+                return
+            lines, records, unreadable = [], [], {}
+            for number, line in chunk:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                if not isinstance(record, dict):
+                    unreadable[len(records)] = "not a JSON object"
+                    record = {}
+                lines.append(number)
+                records.append(record)
+            if records:
+                columns = tuple([record.get(name) for record in records] for name in MANIFEST_FIELDS)
+                yield lines, columns, unreadable
+    else:
+        import csv
+        reader = csv.reader(handle)
+        header = [name.strip() for name in next(reader, ())]
+        missing = [name for name in MANIFEST_COLUMNS if name not in header]
+        if missing:
+            raise ValueError(f"Manifest {path} is missing columns: {', '.join(missing)}")
+        # Absent optional columns read from an all-None column appended after the real ones
+        width = len(header)
+        indices = [header.index(name) if name in header else width for name in MANIFEST_FIELDS]
+        line = 1
+        while True:
+            rows = list(islice(reader, batch_size))
+            if not rows:
+                return
+            lines = range(line + 1, line + len(rows) + 1)
+            line += len(rows)
+            if min(map(len, rows)) < width:
+                kept = [(number, row) for number, row in zip(lines, rows) if row]
+                lines = [number for number, _ in kept]
+                rows = [row + [None] * (width - len(row)) for _, row in kept]
+                if not rows:
+                    continue
+            unreadable = {}
+            if max(map(len, rows)) > width:
+                unreadable = {index: f"{len(row)} fields, header has {width}"
+                              for index, row in enumerate(rows) if len(row) > width}
+            fields = list(zip(*rows))[:width]
+            fields.append((None,) * len(rows))
+            yield lines, tuple(fields[index] for index in indices), unreadable
+
+
+def _parse_column(values, dtype, name, problems):
+    """Convert a batch column in one NumPy call, falling back per value to find the bad ones
+    
+    JSON booleans are rejected rather than read as 0 and 1.
+    """
+    if None not in values and "" not in values and bool not in set(map(type, values)):
+        try:
+            return np.array(values, dtype=dtype)
+        except (TypeError, ValueError, OverflowError):
+            pass
+    column = np.full(len(values), np.nan if dtype is np.float64 else np.datetime64("NaT"), dtype=dtype)
+    for index, value in enumerate(values):
+        if value is None or value == "":
+            problems.setdefault(index, f"missing {name}")
+            continue
+        if isinstance(value, bool):
+            problems.setdefault(index, f"invalid {name}: {value!r}")
+            continue
+        try:
+            column[index] = value
+        except (TypeError, ValueError, OverflowError):
+            problems.setdefault(index, f"invalid {name}: {value!r}")
+    return column
+
+
+def coerce_manifest_batch(lines, columns, unreadable=None, known_ids=()):
+    """Validate one batch from iter_manifest_batches into package columns
+    
+    Returns (columns, bad) where columns holds ids/x/y/priority/weight/estimated_delivery
+    for the valid records and bad lists (line, message) for the rest. An ID is rejected if
+    it is blank, in known_ids, or repeated earlier in the batch.
+    """
+    problems = dict(unreadable or {})  # batch position -> first problem
+    ids, xs, ys, priorities, weights, etas = columns
+    
+    x = _parse_column(xs, np.float64, "x", problems)
+    y = _parse_column(ys, np.float64, "y", problems)
+    priority = _parse_column(priorities, np.float64, "priority", problems)
+    weight = _parse_column(weights, np.float64, "weight", problems)
+    estimated = _parse_column(["NaT" if eta is None or eta == "" else eta for eta in etas], "datetime64[us]",
+                              "estimated_delivery", problems)
+    
+    checks = (
+        (~np.isfinite(x) | ~np.isfinite(y), "coordinates must be finite numbers"),
+        (~np.isin(priority, (1, 2, 3)), "priority must be 1, 2 or 3"),
+        (~(weight > 0) | ~np.isfinite(weight), "weight must be a positive number"),
+    )
+    for failed, message in checks:
+        for index in np.flatnonzero(failed).tolist():
+            problems.setdefault(index, message)
+    
+    ids = ["" if package_id is None else str(package_id).strip() for package_id in ids]
+    seen = set()
+    for index, package_id in enumerate(ids):
+        if index in problems:
+            continue
+        if not package_id:
+            problems[index] = "blank id"
+        elif package_id in known_ids or package_id in seen:
+            problems[index] = f"duplicate id {package_id}"
+        else:
+            seen.add(package_id)
+    
+    if problems:
+        keep = np.ones(len(ids), dtype=bool)
+        keep[list(problems)] = False
+        keep = np.flatnonzero(keep)
+        ids = [ids[index] for index in keep.tolist()]
+        x, y, priority, weight, estimated = x[keep], y[keep], priority[keep], weight[keep], estimated[keep]
+    columns = {"ids": ids, "x": x, "y": y, "priority": priority.astype(np.int8), "weight": weight,
+               "estimated_delivery": estimated}
+    bad = [(lines[index], message) for index, message in sorted(problems.items())]
+    return columns, bad
+
+
+@timed(items=lambda report: report.rows)
+def load_manifest(path, system, batch_size=10000, on_batch=None, on_error=None, progress=None, max_errors=100):
+    """Stream a CSV or JSON Lines manifest (optionally .gz) into system in batches
+    
+    Records need id, x, y, priority and weight; estimated_delivery (ISO 8601) is optional.
+    At most batch_size records are held in memory at once. Each batch is validated as a
+    whole, its good records appended with add_packages, and on_batch(rows) called with the
+    new store rows so planning can start before the load finishes. Bad records are skipped:
+    on_error(line, message) is called for each, and the first max_errors are kept in the
+    report. progress(fraction) follows the bytes read from disk.
+    """
+    report = ManifestReport(path)
+    started = time.perf_counter()
+    size = os.path.getsize(path) or 1
+    handle, raw = _open_manifest(path)
+    
+    with handle:
+        for lines, columns, unreadable in iter_manifest_batches(handle, path, batch_size):
+            report.rows += len(lines)
+            report.batches += 1
+            columns, bad = coerce_manifest_batch(lines, columns, unreadable, system._package_index)
+            for line, message in bad:
+                if len(report.errors) < max_errors:
+                    report.errors.append((line, message))
+                if on_error:
+                    on_error(line, message)
+            report.rejected += len(bad)
+            if columns["ids"]:
+                rows = system.add_packages(columns["ids"], columns["x"], columns["y"], columns["priority"],
+                                           columns["weight"], columns["estimated_delivery"])
+                report.loaded += len(rows)
+                if on_batch:
+                    on_batch(rows)
+            if progress:
+                progress(min(raw.tell() / size, 1.0))
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+# ----------------------
+# External Sort
+# ----------------------
+
+SORT_KEYS = ("priority", "estimated_delivery", "curve", "weight", "x", "y")
+CURVE_BOUNDS = (-50.0, -50.0, 50.0, 50.0)  # area mapped onto the space-filling curve
+
+
+def hilbert_keys(x, y, bounds=CURVE_BOUNDS, order=16):
+    """Hilbert curve index of each point on a 2^order grid over bounds, as uint64
+    
+    Points close along the curve are close in space, so sorting by this key groups
+    nearby destinations. Points outside bounds are clamped to the edge cells.
+    """
+    x0, y0, x1, y1 = bounds
+    side = (1 << order) - 1
+    xi = (np.clip((np.asarray(x, dtype=np.float64) - x0) / (x1 - x0), 0, 1) * side).astype(np.int64)
+    yi = (np.clip((np.asarray(y, dtype=np.float64) - y0) / (y1 - y0), 0, 1) * side).astype(np.int64)
+    keys = np.zeros(len(xi), dtype=np.uint64)
+    s = 1 << (order - 1)
+    while s:
+        rx = (xi & s) > 0
+        ry = (yi & s) > 0
+        keys += np.uint64(s * s) * ((3 * rx) ^ ry).astype(np.uint64)
+        # Rotate the quadrant so the sub-curve is in standard orientation
+        flip = rx & ~ry
+        xi[flip] = side - xi[flip]
+        yi[flip] = side - yi[flip]
+        swap = ~ry
+        xi[swap], yi[swap] = yi[swap], xi[swap].copy()
+        s >>= 1
+    return keys
+
+
+class ExternalSorter:
+    """External k-way merge sort of package records that may not fit in memory
+    
+    add() takes column batches (the dicts produced by coerce_manifest_batch or
+    WorkloadGenerator.packages) and buffers them until memory_limit bytes' worth, then
+    sorts the buffer with np.lexsort and spills it to a run in a temporary directory:
+    the numeric columns as raw records plus a blob of UTF-8 IDs. sorted_batches()
+    merges the runs with a heap (heapq.merge), reading each run sequentially in
+    blocks, and yields column batches in key order.
+    
+    keys name the sort columns in precedence order (see SORT_KEYS; "curve" is the
+    Hilbert key of the destination); prefix one with "-" to sort it descending.
+    Missing estimated deliveries sort last. Ties keep input order, so the sort is stable.
+    """
+    
+    RECORD_BYTES = 300  # rough peak cost of one buffered record: ID, sort copies, input batch share
+    _RUN_DTYPE = np.dtype([("x", "f8"), ("y", "f8"), ("priority", "i1"), ("weight", "f8"),
+                           ("estimated_delivery", "i8"), ("curve", "u8"), ("sequence", "i8"), ("id_bytes", "u4")])
+    
+    def __init__(self, keys=("priority", "estimated_delivery", "curve"), memory_limit=64 * 2**20,
+                 tmpdir=None, bounds=CURVE_BOUNDS):
+        self.keys = []
+        for key in keys:
+            name = key.lstrip("-")
+            if name not in SORT_KEYS:
+                raise ValueError(f"Unknown sort key: {key}")
+            self.keys.append((name, key.startswith("-")))
+        self.memory_limit = memory_limit
+        self.run_records = max(1000, memory_limit // self.RECORD_BYTES)
+        self.bounds = bounds
+        self.records = 0
+        self.runs = []  # (numbers path, ids path, length)
+        self._buffer = []
+        self._buffered = 0
+        import tempfile
+        self._tmpdir = tempfile.TemporaryDirectory(prefix="logistics-sort-", dir=tmpdir)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        """Delete the run files"""
+        self._tmpdir.cleanup()
+    
+    def add(self, columns):
+        """Buffer a batch of package columns, spilling a sorted run when the buffer is full"""
+        count = len(columns["ids"])
+        if not count:
+            return
+        eta = columns.get("estimated_delivery")
+        eta = (np.full(count, _NO_TIME) if eta is None else np.asarray(eta, dtype="datetime64[us]")).view(np.int64)
+        encoded = [package_id.encode("utf-8") for package_id in columns["ids"]]
+        block = np.empty(count, dtype=self._RUN_DTYPE)
+        block["x"] = columns["x"]
+        block["y"] = columns["y"]
+        block["priority"] = columns["priority"]
+        block["weight"] = columns["weight"]
+        # NaT is the smallest int64; lift it to the largest so unknown deliveries sort last
+        block["estimated_delivery"] = np.where(eta == _NO_TIME.view(np.int64), np.iinfo(np.int64).max, eta)
+        block["curve"] = hilbert_keys(block["x"], block["y"], self.bounds) if self._uses("curve") else 0
+        block["sequence"] = np.arange(self.records, self.records + count)
+        block["id_bytes"] = [len(package_id) for package_id in encoded]
+        self.records += count
+        self._buffer.append((block, encoded))
+        self._buffered += count
+        if self._buffered >= self.run_records:
+            self._spill()
+    
+    def _uses(self, name):
+        return any(key == name for key, _ in self.keys)
+    
+    def _sort_columns(self, block):
+        """Key columns in precedence order, negated where descending, sequence last"""
+        columns = []
+        for name, descending in self.keys:
+            column = block[name]
+            if name == "curve":
+                column = column.astype(np.int64)  # Hilbert keys use at most 32 bits
+            columns.append(-column if descending else column)
+        columns.append(block["sequence"])
+        return columns
+    
+    def _spill(self):
+        """Sort the buffer and write it out as one run"""
+        if not self._buffer:
+            return
+        block = np.concatenate([part for part, _ in self._buffer])
+        encoded = [package_id for _, part in self._buffer for package_id in part]
+        self._buffer, self._buffered = [], 0
+        order = np.lexsort(self._sort_columns(block)[::-1])
+        base = os.path.join(self._tmpdir.name, f"run{len(self.runs)}")
+        block[order].tofile(base + ".bin")
+        with open(base + ".ids", "wb") as handle:
+            handle.write(b"".join([encoded[index] for index in order.tolist()]))
+        self.runs.append((base + ".bin", base + ".ids", len(block)))
+    
+    def _read_run(self, numbers_path, ids_path, block_records):
+        """Yield (key tuple, record tuple) from a run, block_records at a time"""
+        with open(numbers_path, "rb") as numbers, open(ids_path, "rb") as handle:
+            while True:
+                block = np.fromfile(numbers, dtype=self._RUN_DTYPE, count=block_records)
+                if not len(block):
+                    return
+                ends = np.cumsum(block["id_bytes"]).tolist()
+                blob = handle.read(ends[-1])
+                ids = [blob[begin:end].decode("utf-8") for begin, end in zip([0] + ends[:-1], ends)]
+                keys = zip(*[column.tolist() for column in self._sort_columns(block)])
+                records = zip(ids, block["x"].tolist(), block["y"].tolist(), block["priority"].tolist(),
+                              block["weight"].tolist(), block["estimated_delivery"].tolist())
+                yield from zip(keys, records)
+    
+    def sorted_batches(self, batch_size=10000):
+        """Yield column batches of every added record in key order"""
+        self._spill()
+        if not self.runs:
+            return
+        # Share the memory budget between the runs' read-ahead blocks, which are expanded
+        # into Python tuples at several times the size of a buffered record
+        block_records = max(100, self.run_records // (4 * len(self.runs)))
+        streams = [self._read_run(numbers, ids, block_records) for numbers, ids, _ in self.runs]
+        merged = streams[0] if len(streams) == 1 else heapq.merge(*streams, key=lambda item: item[0])
+        never = np.iinfo(np.int64).max
+        while True:
+            chunk = [record for _, record in _take(merged, batch_size)]
+            if not chunk:
+                return
+            ids, x, y, priority, weight, eta = zip(*chunk)
+            eta = np.array(eta, dtype=np.int64)
+            eta[eta == never] = _NO_TIME.view(np.int64)
+            yield {
+                "ids": list(ids),
+                "x": np.array(x, dtype=np.float64),
+                "y": np.array(y, dtype=np.float64),
+                "priority": np.array(priority, dtype=np.int8),
+                "weight": np.array(weight, dtype=np.float64),
+                "estimated_delivery": eta.view("datetime64[us]"),
+            }
+
+
+def _take(iterator, count):
+    from itertools import islice
+    return list(islice(iterator, count))
+
+
+def write_manifest(path, batches):
+    """Write package column batches as a CSV or JSON Lines manifest, gzipped for a .gz path;
+    returns the record count"""
+    written = 0
+    if path.endswith(".gz"):
+        import gzip
+        handle = gzip.open(path, "wt", newline="", encoding="utf-8")
+    else:
+        handle = open(path, "w", newline="", encoding="utf-8")
+    with handle:
+        if path.endswith((".jsonl", ".ndjson", ".jsonl.gz", ".ndjson.gz")):
+            import json
+            for columns in batches:
+                for package_id, x, y, priority, weight, eta in _manifest_rows(columns):
+                    handle.write(json.dumps({"id": package_id, "x": x, "y": y, "priority": priority,
+                                             "weight": weight, "estimated_delivery": eta}) + "\n")
+                written += len(columns["ids"])
+        else:
+            import csv
+            writer = csv.writer(handle)
+            writer.writerow(MANIFEST_FIELDS)
+            for columns in batches:
+                writer.writerows(_manifest_rows(columns))
+                written += len(columns["ids"])
+    return written
+
+
+def _manifest_rows(columns):
+    eta = np.datetime_as_string(columns["estimated_delivery"], unit="us")
+    eta[np.isnat(columns["estimated_delivery"])] = ""
+    return zip(columns["ids"], columns["x"].tolist(), columns["y"].tolist(), columns["priority"].tolist(),
+               columns["weight"].tolist(), eta.tolist())
+
+
+@timed(items=lambda count: count)
+def sort_manifest(path, output=None, system=None, keys=("priority", "estimated_delivery", "curve"),
+                  memory_limit=64 * 2**20, tmpdir=None, bounds=CURVE_BOUNDS, batch_size=10000, on_error=None):
+    """Externally sort a manifest into a new manifest file and/or a LogisticsSystem
+    
+    Records are validated as in load_manifest (bad ones go to on_error and are dropped),
+    sorted by keys within memory_limit bytes, then streamed in order to output and/or
+    appended to system. Duplicate IDs in different batches are only rejected when loading
+    into a system, which holds every ID anyway. Returns the number of sorted records.
+    """
+    if output is None and system is None:
+        raise ValueError("sort_manifest needs an output path or a system")
+    handle, _ = _open_manifest(path)
+    with ExternalSorter(keys, memory_limit, tmpdir, bounds) as sorter:
+        with handle:
+            # A system needs unique IDs, so track every ID read; a file only gets in-batch checks
+            seen = set()
+            known = () if system is None else _Either(seen, system._package_index)
+            for lines, columns, unreadable in iter_manifest_batches(handle, path, batch_size):
+                columns, bad = coerce_manifest_batch(lines, columns, unreadable, known)
+                for line, message in bad:
+                    if on_error:
+                        on_error(line, message)
+                if system is not None:
+                    seen.update(columns["ids"])
+                sorter.add(columns)
+        
+        batches = sorter.sorted_batches(batch_size)
+        if system is not None:
+            batches = _appending(system, batches)
+        if output is not None:
+            write_manifest(output, batches)
+        else:
+            for _ in batches:
+                pass
+        return sorter.records
+
+
+class _Either:
+    """Membership in either of two containers"""
+    
+    def __init__(self, first, second):
+        self.first, self.second = first, second
+    
+    def __contains__(self, item):
+        return item in self.first or item in self.second
+
+
+def _appending(system, batches):
+    for columns in batches:
+        system.add_packages(columns["ids"], columns["x"], columns["y"], columns["priority"],
+                            columns["weight"], columns["estimated_delivery"])
+        yield columns
+
+
+# ----------------------
+# Persistence
+# ----------------------
+
+JOURNAL_FORMAT = 2  # 2 added the eta column
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _encode_column(values):
+    """Base64 of an array's little-endian bytes: far cheaper to write and parse than a JSON list"""
+    import base64
+    return base64.b64encode(values.astype(values.dtype.newbyteorder("<"), copy=False).tobytes()).decode("ascii")
+
+
+def _decode_column(text, dtype):
+    import base64
+    return np.frombuffer(base64.b64decode(text), dtype=np.dtype(dtype).newbyteorder("<"))
+
+
+def _journal_sequences(directory):
+    """Sequence numbers of the snapshots and log segments in a journal directory"""
+    sequences = set()
+    for name in os.listdir(directory):
+        match = re.fullmatch(r"(?:snapshot|log)-(\d+)(?:\.jsonl)?", name)
+        if match:
+            sequences.add(int(match.group(1)))
+    return sorted(sequences)
+
+
+def _snapshot_path(directory, sequence):
+    return os.path.join(directory, f"snapshot-{sequence:06d}")
+
+
+def _log_path(directory, sequence):
+    return os.path.join(directory, f"log-{sequence:06d}.jsonl")
+
+
+def _vehicle_state(vehicle):
+    """What a journal compares to spot a changed vehicle; the lists are compared by identity"""
+    return (vehicle.status, vehicle.location, vehicle.home, vehicle.depot, vehicle.capacity, vehicle.speed,
+            vehicle.packages, len(vehicle.packages), vehicle.route, len(vehicle.route))
+
+
+def _vehicle_record(vehicle, previous=None):
+    """JSON-ready vehicle state, or None if unchanged since `previous` (a _vehicle_state)
+    
+    The package and route rows are left out when those lists are unchanged, so a vehicle
+    moving between stops logs a few fields rather than its whole load.
+    """
+    state = _vehicle_state(vehicle)
+    if previous is not None and state[:6] == previous[:6] and state[6] is previous[6] and \
+            state[7] == previous[7] and state[8] is previous[8] and state[9] == previous[9]:
+        return None
+    record = {
+        "id": vehicle.id,
+        "capacity": vehicle.capacity,
+        "speed": vehicle.speed,
+        "location": list(vehicle.location),
+        "home": list(vehicle.home),
+        "depot": vehicle.depot,
+        "status": vehicle.status,
+    }
+    if previous is None or state[6] is not previous[6] or state[7] != previous[7]:
+        record["packages"] = [package._row for package in vehicle.packages]
+    if previous is None or state[8] is not previous[8] or state[9] != previous[9]:
+        record["route"] = [package._row for package in vehicle.route]
+    return record
+
+
+def _apply_vehicle_record(system, record):
+    vehicle = system.find_vehicle(record["id"])
+    if vehicle is None:
+        vehicle = Vehicle(record["id"])
+        system.add_vehicle(vehicle)
+    vehicle.capacity = record["capacity"]
+    vehicle.speed = record["speed"]
+    vehicle.location = tuple(record["location"])
+    vehicle.home = tuple(record["home"])
+    vehicle.depot = record["depot"]
+    vehicle.status = record["status"]
+    if "packages" in record:
+        vehicle.packages = [Package._view(system.store, row) for row in record["packages"]]
+    if "route" in record:
+        vehicle.route = [Package._view(system.store, row) for row in record["route"]]
+
+
+class StateJournal:
+    """Append-only JSON Lines log of package and vehicle changes, with columnar snapshots
+    
+    The directory holds numbered snapshots (snapshot-000001/: one .npy file per store
+    column, plus meta.json with the IDs, list membership, vehicles, depots and traffic
+    zones) and, per snapshot, a log segment (log-000001.jsonl) of the changes since.
+    flush() appends one batch of events: the store rows touched since the last flush
+    (see PackageStore.touch), with each column base64-encoded, and the vehicles, depots
+    and traffic zones that changed.
+    Nothing is written between flushes, so a running simulation pays for logging once
+    per flush_interval (pass observe to Simulator.subscribe), not once per event.
+    
+    Starting a journal snapshots the system straight away. Once a log segment grows past
+    snapshot_bytes, flush() takes a fresh snapshot and starts a new segment, and only the
+    newest `keep` snapshots are kept. restore_system() loads the latest snapshot and
+    replays its segment. Events queued in a Simulator are not journaled; restored vehicles
+    are available, and a new Simulator sends them out with their undelivered packages.
+    """
+    
+    def __init__(self, system, directory, flush_interval=1.0, snapshot_bytes=64 * 2**20, keep=2,
+                 batch_rows=10000):
+        self.system = system
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.snapshot_bytes = snapshot_bytes
+        self.keep = max(keep, 1)
+        self.batch_rows = batch_rows
+        os.makedirs(directory, exist_ok=True)
+        self.sequence = max(_journal_sequences(directory), default=0)
+        self.log_bytes = 0
+        self._log = None
+        self.snapshot()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        """Flush pending changes and close the log"""
+        if self._log is not None:
+            self.flush()
+            self._log.close()
+            self._log = None
+    
+    def _mark(self):
+        """Remember the state just written, so the next flush logs only what changes after it"""
+        system = self.system
+        store = system.store
+        self._revision = store.revision
+        self._size = store.size
+        self._vehicle_codes = len(store.vehicle_ids)
+        self._depot_codes = len(store.depot_ids)
+        self._depots = len(system.depots)
+        self._traffic = system.traffic.version
+        self._vehicles = {vehicle.id: _vehicle_state(vehicle) for vehicle in system.vehicles}
+        self._last_flush = time.monotonic()
+    
+    def snapshot(self):
+        """Write the whole system as a new snapshot and start a new log segment"""
+        import json
+        import shutil
+        system = self.system
+        store = system.store
+        sequence = self.sequence + 1
+        path = _snapshot_path(self.directory, sequence)
+        staging = path + ".tmp"
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        for name in PackageStore.COLUMNS:
+            np.save(os.path.join(staging, f"{name}.npy"), getattr(store, name)[:store.size])
+        np.save(os.path.join(staging, "packages.npy"), system.packages.rows)
+        np.save(os.path.join(staging, "delivered.npy"), system.delivered_packages.rows)
+        meta = {
+            "format": JOURNAL_FORMAT,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "size": store.size,
+            "revision": store.revision,
+            "ids": store.ids,
+            "vehicle_ids": store.vehicle_ids,
+            "depot_ids": store.depot_ids,
+            "depots": [{"id": depot.id, "location": list(depot.location)} for depot in system.depots],
+            "vehicles": [_vehicle_record(vehicle) for vehicle in system.vehicles],
+            "traffic": [[zone, *bounds] for zone, bounds in system.traffic.zones.items()],
+        }
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as handle:
+            json.dump(meta, handle, default=_json_default)
+        
+        # The empty segment exists before the snapshot appears, so a snapshot always has its log
+        if self._log is not None:
+            self._log.close()
+        self._log = open(_log_path(self.directory, sequence), "w", encoding="utf-8")
+        os.replace(staging, path)
+        self.sequence = sequence
+        self.log_bytes = 0
+        self._mark()
+        
+        for old in _journal_sequences(self.directory):
+            if old <= sequence - self.keep:
+                shutil.rmtree(_snapshot_path(self.directory, old), ignore_errors=True)
+                if os.path.exists(_log_path(self.directory, old)):
+                    os.remove(_log_path(self.directory, old))
+        return path
+    
+    def flush(self):
+        """Append one batch of events for everything changed since the last flush; returns the event count"""
+        import json
+        system = self.system
+        store = system.store
+        events = []
+        if len(system.depots) > self._depots:
+            events.append({"event": "depots", "depots": [{"id": depot.id, "location": list(depot.location)}
+                                                         for depot in system.depots[self._depots:]]})
+        
+        rows = store.changed_since(self._revision)
+        for start in range(0, len(rows), self.batch_rows):
+            chunk = rows[start:start + self.batch_rows]
+            event = {"event": "rows", "rows": _encode_column(chunk.astype(np.int64)),
+                     "ids": [store.ids[row] for row in chunk[chunk >= self._size].tolist()]}
+            if not start:
+                event["vehicle_ids"] = store.vehicle_ids[self._vehicle_codes:]
+                event["depot_ids"] = store.depot_ids[self._depot_codes:]
+            for name in PackageStore.COLUMNS:
+                event[name] = _encode_column(getattr(store, name)[chunk])
+            events.append(event)
+        
+        changed = [record for record in (_vehicle_record(vehicle, self._vehicles.get(vehicle.id))
+                                         for vehicle in system.vehicles) if record is not None]
+        if changed:
+            events.append({"event": "vehicles", "vehicles": changed})
+        if system.traffic.version != self._traffic:
+            events.append({"event": "traffic",
+                           "zones": [[zone, *bounds] for zone, bounds in system.traffic.zones.items()]})
+        
+        if events:
+            text = "".join(json.dumps(event, default=_json_default, separators=(",", ":")) + "\n"
+                           for event in events)
+            self._log.write(text)
+            self._log.flush()
+            self.log_bytes += len(text)
+        self._mark()
+        if self.log_bytes >= self.snapshot_bytes:
+            self.snapshot()
+        return len(events)
+    
+    def maybe_flush(self):
+        """flush() if flush_interval seconds have passed since the last one"""
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            return self.flush()
+        return 0
+    
+    def observe(self, event):
+        """Simulator observer: flush at most once per flush_interval while the simulation runs"""
+        self.maybe_flush()
+
+
+def restore_system(directory):
+    """Rebuild a LogisticsSystem from a StateJournal directory: latest snapshot plus its log"""
+    import json
+    sequences = [sequence for sequence in _journal_sequences(directory)
+                 if os.path.isdir(_snapshot_path(directory, sequence))]
+    if not sequences:
+        raise FileNotFoundError(f"No snapshot in {directory}")
+    path = _snapshot_path(directory, sequences[-1])
+    with open(os.path.join(path, "meta.json"), encoding="utf-8") as handle:
+        meta = json.load(handle)
+    if meta["format"] != JOURNAL_FORMAT:
+        raise ValueError(f"Unsupported journal format: {meta['format']}")
+    
+    system = LogisticsSystem()
+    store = system.store
+    size = meta["size"]
+    store.reserve(size)
+    for name in PackageStore.COLUMNS:
+        getattr(store, name)[:size] = np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+    store.size = size
+    store.ids = meta["ids"]
+    for vehicle_id in meta["vehicle_ids"]:
+        store.vehicle_code(vehicle_id)
+    for depot_id in meta["depot_ids"]:
+        store.depot_code(depot_id)
+    system.packages.append_rows(np.load(os.path.join(path, "packages.npy")))
+    system.delivered_packages.append_rows(np.load(os.path.join(path, "delivered.npy")))
+    for depot in meta["depots"]:
+        system.add_depot(Depot(depot["id"], depot["location"]))
+    for record in meta["vehicles"]:
+        _apply_vehicle_record(system, record)
+    for zone, *bounds in meta["traffic"]:
+        system.traffic.zones[zone] = tuple(bounds)
+    
+    log = _log_path(directory, sequences[-1])
+    if os.path.exists(log):
+        _replay_log(system, log)
+    
+    store.revision = max(meta["revision"], int(store.version[:store.size].max()) if store.size else 0)
+    system._package_index = dict(zip(store.ids, range(store.size)))
+    # Trips in progress are not journaled: a vehicle caught on the road is available again where
+    # it stood, and a new Simulator sends it out with its undelivered packages
+    for vehicle in system.vehicles:
+        vehicle.status = "available"
+    system.delivery_stats.rebuild(store, system.delivered_packages.rows)
+    system._sorted_dirty = True
+    return system
+
+
+def _replay_log(system, path):
+    """Apply a log segment's events in order, stopping at a torn final line"""
+    import json
+    store = system.store
+    delivered = _STATUS_CODES["delivered"]
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                break  # the write a crash interrupted
+            kind = event["event"]
+            
+            if kind == "rows":
+                for vehicle_id in event.get("vehicle_ids", ()):
+                    store.vehicle_code(vehicle_id)
+                for depot_id in event.get("depot_ids", ()):
+                    store.depot_code(depot_id)
+                if event["ids"]:
+                    store.reserve(store.size + len(event["ids"]))
+                    store.ids.extend(event["ids"])
+                    store.size = len(store.ids)
+                rows = _decode_column(event["rows"], np.int64)
+                for name in PackageStore.COLUMNS:
+                    column = getattr(store, name)
+                    column[rows] = _decode_column(event[name], column.dtype)
+                # List membership follows status
+                for row, done in zip(rows.tolist(), (store.status[rows] == delivered).tolist()):
+                    source, target = ((system.packages, system.delivered_packages) if done
+                                      else (system.delivered_packages, system.packages))
+                    if row < len(source._positions) and source._positions[row] >= 0:
+                        source.remove_row(row)
+                    if not (row < len(target._positions) and target._positions[row] >= 0):
+                        target.append_rows(row)
+            
+            elif kind == "vehicles":
+                for record in event["vehicles"]:
+                    _apply_vehicle_record(system, record)
+            elif kind == "depots":
+                for depot in event["depots"]:
+                    system.add_depot(Depot(depot["id"], depot["location"]))
+            elif kind == "traffic":
+                system.traffic.zones = {zone: tuple(bounds) for zone, *bounds in event["zones"]}
+                system.traffic.version += 1
+
+
+# ----------------------
+# Tracking Service
+# ----------------------
+
+_HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                 413: "Payload Too Large"}
+
+
+def _time_strings(values):
+    """ISO strings (None for NaT) for a datetime64 column slice, converted in one call"""
+    text = np.datetime_as_string(values, unit="s").tolist()
+    return [None if value == "NaT" else value for value in text]
+
+
+def package_documents(store, rows):
+    """One serialized JSON object (bytes) per store row, built from whole-column gathers"""
+    import json
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    rows = np.asarray(rows, dtype=np.intp)
+    vehicles = store.vehicle[rows].tolist()
+    depots = store.depot[rows].tolist()
+    columns = zip(rows.tolist(), store.status[rows].tolist(), store.x[rows].tolist(), store.y[rows].tolist(),
+                  store.priority[rows].tolist(), store.weight[rows].tolist(), vehicles, depots,
+                  _time_strings(store.pickup_time[rows]), _time_strings(store.estimated_delivery[rows]),
+                  _time_strings(store.actual_delivery[rows]), _time_strings(store.eta[rows]))
+    return [encode({
+        "id": store.ids[row],
+        "status": PACKAGE_STATUSES[status],
+        "destination": [x, y],
+        "priority": priority,
+        "weight": weight,
+        "vehicle": store.vehicle_ids[vehicle] if vehicle >= 0 else None,
+        "depot": store.depot_ids[depot] if depot >= 0 else None,
+        "pickup_time": pickup,
+        "estimated_delivery": estimated,
+        "actual_delivery": actual,
+        "eta": eta,
+    }).encode() for row, status, x, y, priority, weight, vehicle, depot, pickup, estimated, actual, eta in columns]
+
+
+class TrackingService:
+    """Local HTTP/JSON tracking API over a LogisticsSystem, served with asyncio
+    
+    Routes (all GET unless noted):
+    
+        /packages/<id>              one package
+        /packages?ids=P1,P2,...     several packages: {"packages": [...], "missing": [...]}
+        POST /packages              the same, for a body of {"ids": [...]}
+        /vehicles/<id>              a vehicle's manifest: its packages, route order and on-time record
+        /status                     package and vehicle counts by status, on-time aggregates
+                                    (DeliveryStats) per priority, service counters
+    
+    Package lookups that miss the cache wait up to batch_window seconds so concurrent
+    requests are answered by one batched index lookup and one columnar serialization
+    (package_documents), rather than one each. Serialized packages stay in an LRU of
+    cache_size entries, each stamped with its row's store version, so a hit costs a dict
+    lookup and a version check, and a package whose status (or any field) changed since is
+    serialized afresh. `system` may also be a zero-argument callable returning the
+    current system, for callers that replace it; the cache is dropped when the store changes.
+    
+    Reads are not locked: a server thread (start_thread) sees the system as the owning
+    thread leaves it between writes.
+    """
+    
+    def __init__(self, system, batch_window=0.002, cache_size=100000, max_batch=4096, max_ids=10000):
+        self._get_system = system if callable(system) else (lambda: system)
+        self.batch_window = batch_window
+        self.cache_size = cache_size
+        self.max_batch = max_batch
+        self.max_ids = max_ids
+        self.requests = 0
+        self.batches = 0
+        self.batched_ids = 0
+        self.cache_hits = 0
+        self._cache = None  # package id -> (row, version, body); an OrderedDict once in use
+        self._store = None
+        self._pending = []  # (ids, future) waiting for the next batch
+        self._pending_count = 0
+        self._flush_handle = None
+        self._status = (None, None, None)  # (store, revision, package counts) for /status
+        self._loop = None
+        self._server = None
+        self._stopped = None  # asyncio.Event that ends run()
+        self._thread = None
+    
+    # Lookups
+    
+    def _checked_cache(self):
+        """The LRU for the current system's store, emptied if the system was replaced"""
+        store = self._get_system().store
+        if store is not self._store:
+            self._store, self._cache = store, OrderedDict()
+        return store, self._cache
+    
+    def _cached(self, package_ids):
+        """{id: body} for the IDs cached and unchanged, plus the list of the others"""
+        store, cache = self._checked_cache()
+        version = store.version
+        found, missing = {}, []
+        for package_id in package_ids:
+            entry = cache.get(package_id)
+            if entry is not None and version[entry[0]] == entry[1]:
+                cache.move_to_end(package_id)
+                found[package_id] = entry[2]
+            else:
+                missing.append(package_id)
+        self.cache_hits += len(found)
+        return found, missing
+    
+    def _remember(self, store, rows, bodies):
+        cache = self._cache
+        ids, versions = store.ids, store.version[rows].tolist()
+        for row, version, body in zip(rows.tolist(), versions, bodies):
+            cache[ids[row]] = (row, version, body)
+            cache.move_to_end(ids[row])
+        while len(cache) > self.cache_size:
+            cache.popitem(last=False)
+    
+    def documents(self, package_ids):
+        """Synchronous lookup: {id: serialized package} for the IDs that exist, using the cache"""
+        found, missing = self._cached(package_ids)
+        if missing:
+            found.update(self._lookup_batch(missing))
+        return found
+    
+    def _lookup_batch(self, package_ids):
+        """One index lookup and one columnar serialization for every uncached ID"""
+        system = self._get_system()
+        store, _ = self._checked_cache()
+        with profiler.timer("TrackingService.lookup_batch", items=len(package_ids)):
+            index = system._package_index
+            rows = np.fromiter((index.get(package_id, -1) for package_id in package_ids), dtype=np.intp,
+                               count=len(package_ids))
+            rows = np.unique(rows[rows >= 0])
+            bodies = package_documents(store, rows)
+            self._remember(store, rows, bodies)
+        self.batches += 1
+        self.batched_ids += len(package_ids)
+        return dict(zip((store.ids[row] for row in rows.tolist()), bodies))
+    
+    async def lookup(self, package_ids):
+        """{id: serialized package} for the IDs that exist; misses join the next coalesced batch"""
+        found, missing = self._cached(package_ids)
+        if not missing:
+            return found
+        import asyncio
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((missing, future))
+        self._pending_count += len(missing)
+        if self._pending_count >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+        found.update(await future)
+        return found
+    
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending, self._pending_count = self._pending, [], 0
+        if not pending:
+            return
+        try:
+            result = self._lookup_batch(list(dict.fromkeys(package_id for ids, _ in pending for package_id in ids)))
+        except Exception as error:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        for _, future in pending:
+            if not future.done():
+                future.set_result(result)
+    
+    # Responses
+    
+    async def _package(self, package_id):
+        body = (await self.lookup((package_id,))).get(package_id)
+        if body is None:
+            return 404, _error_body(f"Package {package_id} not found")
+        return 200, body
+    
+    async def _packages(self, package_ids):
+        if len(package_ids) > self.max_ids:
+            return 413, _error_body(f"At most {self.max_ids} IDs per request")
+        found = await self.lookup(package_ids)
+        bodies = [found[package_id] for package_id in package_ids if package_id in found]
+        missing = [package_id for package_id in package_ids if package_id not in found]
+        return 200, b'{"packages":[' + b",".join(bodies) + b'],"missing":' + _json_bytes(missing) + b"}"
+    
+    def _manifest(self, vehicle_id):
+        system = self._get_system()
+        vehicle = system.find_vehicle(vehicle_id)
+        if vehicle is None:
+            return 404, _error_body(f"Vehicle {vehicle_id} not found")
+        ids = [package.id for package in vehicle.packages]
+        found = self.documents(ids)
+        rows = [package._row for package in vehicle.packages]
+        header = _json_bytes({
+            "id": vehicle.id,
+            "status": vehicle.status,
+            "depot": vehicle.depot,
+            "location": list(vehicle.location),
+            "capacity": vehicle.capacity,
+            "load": float(system.store.weight[rows].sum()) if rows else 0.0,
+            "route": [package.id for package in vehicle.route],
+            "deliveries": system.delivery_stats.by_vehicle.get(vehicle.id, _OnTimeTally()).summary(),
+        })
+        return 200, header[:-1] + b',"packages":[' + b",".join(found[package_id] for package_id in ids
+                                                                 if package_id in found) + b"]}"
+    
+    def _status_counts(self):
+        system = self._get_system()
+        store = system.store
+        cached_store, revision, packages = self._status
+        if cached_store is not store or revision != store.revision:
+            counts = np.bincount(store.status[:store.size], minlength=len(PACKAGE_STATUSES)).tolist()
+            packages = dict(zip(PACKAGE_STATUSES, counts))
+            self._status = (store, store.revision, packages)
+        vehicles = {}
+        for vehicle in system.vehicles:
+            vehicles[vehicle.status] = vehicles.get(vehicle.status, 0) + 1
+        return 200, _json_bytes({
+            "packages": packages,
+            "vehicles": vehicles,
+            "deliveries": system.delivery_stats.summary(vehicles=False),
+            "service": {"requests": self.requests, "batches": self.batches, "batched_ids": self.batched_ids,
+                        "cache_hits": self.cache_hits, "cached": len(self._cache or ())},
+        })
+    
+    async def respond(self, method, target, body=b""):
+        """(HTTP status, JSON body) for one request; the routing behind the HTTP handler"""
+        from urllib.parse import parse_qs, unquote
+        self.requests += 1
+        profiler.count("tracking.requests")
+        path, _, query = target.partition("?")
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if parts[0] == "packages" and len(parts) <= 2:
+            if len(parts) == 2 and parts[1]:
+                if method != "GET":
+                    return 405, _error_body("Use GET")
+                return await self._package(parts[1])
+            if method == "POST":
+                import json
+                try:
+                    request = json.loads(body or b"{}")
+                    package_ids = request["ids"] if isinstance(request, dict) else request
+                    if not all(isinstance(package_id, str) for package_id in package_ids):
+                        raise TypeError
+                except (ValueError, KeyError, TypeError):
+                    return 400, _error_body('Expected a JSON body of {"ids": ["P1", ...]}')
+                return await self._packages(list(package_ids))
+            if method != "GET":
+                return 405, _error_body("Use GET or POST")
+            values = parse_qs(query).get("ids", [])
+            return await self._packages([package_id for value in values for package_id in value.split(",")
+                                         if package_id])
+        if method != "GET":
+            return 405, _error_body("Use GET")
+        if parts[0] == "vehicles" and len(parts) == 2:
+            return self._manifest(parts[1])
+        if parts == ["status"]:
+            return self._status_counts()
+        return 404, _error_body(f"No route for {path}")
+    
+    # Serving
+    
+    async def _connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one keep-alive connection, in order"""
+        import asyncio
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                keep_alive = True
+                try:
+                    method, target, version = lines[0].split(" ")
+                    length = 0
+                    for line in lines[1:]:
+                        name, _, value = line.partition(":")
+                        name = name.lower()
+                        if name == "content-length":
+                            length = int(value)
+                        elif name == "connection":
+                            keep_alive = value.strip().lower() != "close"
+                    keep_alive = keep_alive and version == "HTTP/1.1"
+                    body = await reader.readexactly(length) if length else b""
+                    status, payload = await self.respond(method, target, body)
+                except ValueError:
+                    status, payload, keep_alive = 400, _error_body("Malformed request"), False
+                writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n%s\r\n"
+                             % (status, _HTTP_REASONS[status].encode(), len(payload),
+                                b"" if keep_alive else b"Connection: close\r\n") + payload)
+                if not keep_alive:
+                    break
+                if writer.transport.get_write_buffer_size() > 1 << 16:
+                    await writer.drain()
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+    
+    async def serve(self, host="127.0.0.1", port=8080):
+        """Start listening on the running loop; returns the asyncio Server (port 0 picks a free port)"""
+        import asyncio
+        self._loop = asyncio.get_running_loop()
+        self._server = await asyncio.start_server(self._connection, host, port)
+        return self._server
+    
+    @property
+    def port(self):
+        return self._server.sockets[0].getsockname()[1] if self._server else None
+    
+    def run(self, host="127.0.0.1", port=8080, ready=None):
+        """Serve until interrupted (blocking); ready(service) is called once listening"""
+        import asyncio
+        
+        async def main():
+            self._stopped = asyncio.Event()
+            async with await self.serve(host, port):
+                if ready:
+                    ready(self)
+                await self._stopped.wait()
+        
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            pass
+    
+    def start_thread(self, host="127.0.0.1", port=8080):
+        """Serve from a daemon thread; returns once listening (raises if the port can't be bound)"""
+        started = threading.Event()
+        failure = []
+        
+        def target():
+            try:
+                self.run(host, port, ready=lambda service: started.set())
+            except OSError as error:
+                failure.append(error)
+            finally:
+                started.set()
+        
+        self._thread = threading.Thread(target=target, name="tracking-service", daemon=True)
+        self._thread.start()
+        started.wait()
+        if failure:
+            raise failure[0]
+        return self.port
+    
+    def stop(self):
+        """Stop a server started with start_thread"""
+        if self._thread is None:
+            return
+        if self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+        self._thread.join(5)
+        self._thread = self._server = self._loop = self._stopped = None
+
+
+def _json_bytes(value):
+    import json
+    return json.dumps(value, separators=(",", ":"), default=_json_default).encode()
+
+
+def _error_body(message):
+    return _json_bytes({"error": message})
+
+
+# ----------------------
+# Batch Command Line
+# ----------------------
+
+@timed()
+def write_results(system, path, stops):
+    """Write one record per package (depot, vehicle, stop number, status, times) as CSV or JSON Lines"""
+    store = system.store
+    fields = ("id", "depot", "vehicle", "stop", "status", "estimated_delivery", "eta", "pickup_time",
+              "actual_delivery")
+    
+    def records():
+        for row in range(store.size):
+            code = store.vehicle[row]
+            depot = store.depot[row]
+            yield {
+                "id": store.ids[row],
+                "depot": store.depot_ids[depot] if depot >= 0 else "",
+                "vehicle": store.vehicle_ids[code] if code >= 0 else "",
+                "stop": int(stops[row]) if stops[row] >= 0 else "",
+                "status": PACKAGE_STATUSES[store.status[row]],
+                "estimated_delivery": _iso_time(store.estimated_delivery[row]),
+                "eta": _iso_time(store.eta[row]),
+                "pickup_time": _iso_time(store.pickup_time[row]),
+                "actual_delivery": _iso_time(store.actual_delivery[row]),
+            }
+    
+    if path.endswith((".jsonl", ".ndjson")):
+        import json
+        with open(path, "w", encoding="utf-8") as handle:
+            for record in records():
+                handle.write(json.dumps(record) + "\n")
+    else:
+        import csv
+        with open(path, "w", newline="", encoding="utf-8") as handle:
+            writer = csv.DictWriter(handle, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(records())
+
+
+def _iso_time(value):
+    return "" if np.isnat(value) else str(value)
+
+
+def run_batch(system, mode="greedy", route_budget=5.0, simulate=False, log=print, journal=None, estimate=False):
+    """Assign, route and optionally simulate; returns (route stop number per store row, timings)
+    
+    A system with depots is planned per depot with plan_depots, which assigns and routes
+    in one pass. With `estimate`, estimated_delivery is derived from the planned routes
+    (estimate_deliveries), replacing the manifest's, for a simulation starting now. A
+    StateJournal, if given, is flushed after each stage and during the simulation.
+    """
+    timings = {}
+    
+    started = time.perf_counter()
+    if system.depots:
+        report = system.plan_depots(mode=mode, time_budget=route_budget)
+        timings["plan"] = time.perf_counter() - started
+    else:
+        report = system.assign_packages(mode=mode)
+        timings["assign"] = time.perf_counter() - started
+    loads = [load for load, _, _ in report.utilization.values()]
+    capacity = sum(capacity for _, capacity, _ in report.utilization.values()) or 1
+    log(f"Assigned {report.assigned} packages ({len(report.unassigned)} left in sorting), "
+        f"fleet utilization {sum(loads) / capacity:.1%}")
+    
+    if not system.depots:
+        started = time.perf_counter()
+        system.plan_routes(time_budget=route_budget)
+        timings["route"] = time.perf_counter() - started
+    start = datetime.now()
+    if estimate:
+        started = time.perf_counter()
+        count = system.estimate_deliveries(start)
+        timings["estimate"] = time.perf_counter() - started
+        log(f"Estimated delivery times for {count} packages")
+    if journal:
+        journal.flush()
+    stops = np.full(system.store.size, -1, dtype=np.int32)
+    total_distance = 0.0
+    for vehicle in system.vehicles:
+        stops[[package._row for package in vehicle.route]] = np.arange(1, len(vehicle.route) + 1)
+        total_distance += system.route_distance(vehicle) if vehicle.route else 0.0
+    log(f"Planned {sum(1 for vehicle in system.vehicles if vehicle.route)} routes, "
+        f"total distance {total_distance:.1f}")
+    
+    if simulate:
+        started = time.perf_counter()
+        simulator = Simulator(system, start=start)
+        if journal:
+            simulator.subscribe(journal.observe)
+        simulator.dispatch_all()
+        simulator.run(until=None if simulate is True else simulate)
+        timings["simulate"] = time.perf_counter() - started
+        log(f"Simulated {simulator.processed} events over {simulator.now:.1f} h, "
+            f"{len(system.delivered_packages)} delivered")
+        stats = system.delivery_stats.total
+        if stats.scheduled:
+            log(f"On time {stats.on_time_rate:.1%}" +
+                (f", {stats.late} late by {stats.mean_lateness:.0f} min on average" if stats.late else ""))
+    return stops, timings
+
+
+def _point(text):
+    """argparse type for an "x,y" pair"""
+    x, y = text.split(",")
+    return float(x), float(y)
+
+
+def _address(text):
+    """argparse type for "[host:]port", host defaulting to localhost"""
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def main(argv=None):
+    """Batch entry point: manifest in, assignment/routing/simulation, results out"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(prog="logistics", description="Plan deliveries for a package manifest")
+    parser.add_argument("manifest", nargs="?",
+                        help="CSV or JSON Lines file with id,x,y,priority,weight[,estimated_delivery]")
+    parser.add_argument("--generate", type=int, metavar="COUNT", help="plan COUNT synthetic packages instead")
+    parser.add_argument("--distribution", choices=SPATIAL_DISTRIBUTIONS, default="uniform",
+                        help="spatial distribution for --generate (default uniform)")
+    parser.add_argument("--weights", choices=WEIGHT_DISTRIBUTIONS, default="uniform",
+                        help="weight distribution for --generate (default uniform)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for --generate (default 0)")
+    parser.add_argument("-o", "--output", help="write per-package results to this .csv or .jsonl file")
+    parser.add_argument("--vehicles", type=int, default=5, help="number of vehicles (default 5)")
+    parser.add_argument("--capacity", type=float, default=100, help="vehicle weight capacity (default 100)")
+    parser.add_argument("--speed", type=float, default=50, help="vehicle speed (default 50)")
+    parser.add_argument("--depot", action="append", type=_point, metavar="X,Y",
+                        help="a depot location (write --depot=-5,3 for negative x); repeat for several depots, "
+                             "which share the vehicles round-robin")
+    parser.add_argument("--mode", choices=("greedy", "compact"), default="greedy", help="assignment mode")
+    parser.add_argument("--route-budget", type=float, default=5.0, help="seconds for route planning (default 5)")
+    parser.add_argument("--estimate", action="store_true",
+                        help="derive estimated delivery times from the planned routes instead of the manifest")
+    parser.add_argument("--simulate", nargs="?", type=float, const=True, default=False, metavar="HOURS",
+                        help="simulate the deliveries, to completion or for HOURS of virtual time")
+    parser.add_argument("--road-grid", type=float, metavar="SPACING",
+                        help="simulate on a synthetic street grid with this block spacing instead of straight lines")
+    parser.add_argument("--batch-size", type=int, default=10000, help="manifest records per batch (default 10000)")
+    parser.add_argument("--assign-as-loaded", action="store_true",
+                        help="assign each manifest batch as soon as it is loaded")
+    parser.add_argument("--rejects", metavar="FILE", help="write line numbers and reasons for rejected records")
+    parser.add_argument("--sort", metavar="KEYS",
+                        help="load the manifest in sorted order via an external merge sort; comma-separated "
+                             f"keys from {', '.join(SORT_KEYS)} (prefix - for descending)")
+    parser.add_argument("--sort-memory", type=float, default=64, metavar="MB",
+                        help="memory budget for --sort in MB (default 64)")
+    parser.add_argument("--sorted-output", metavar="FILE", help="also write the sorted manifest to FILE")
+    parser.add_argument("--journal", metavar="DIR",
+                        help="journal the system's state to DIR (snapshot plus change log) for restore_system")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="write per-stage timings as JSON, or cProfile stats if FILE ends in .prof")
+    parser.add_argument("--serve", type=_address, metavar="[HOST:]PORT",
+                        help="after planning, serve the tracking API (TrackingService) until interrupted")
+    parser.add_argument("-q", "--quiet", action="store_true", help="only print errors")
+    args = parser.parse_args(argv)
+    if (args.manifest is None) == (args.generate is None):
+        parser.error("give either a manifest or --generate COUNT")
+    if args.generate is not None:
+        manifest_only = [option for option in ("batch_size", "assign_as_loaded", "rejects", "sort", "sort_memory",
+                                               "sorted_output")
+                         if getattr(args, option) != parser.get_default(option)]
+        if manifest_only:
+            parser.error(f"--{manifest_only[0].replace('_', '-')} only applies to a manifest, not --generate")
+    if args.sorted_output and not args.sort:
+        parser.error("--sorted-output needs --sort")
+    log = (lambda message: None) if args.quiet else print
+    if args.profile:
+        profiler.enable(cprofile=args.profile.endswith(".prof"))
+    
+    started = time.perf_counter()
+    system = LogisticsSystem()
+    for i, location in enumerate(args.depot or []):
+        system.add_depot(Depot(f"D{i+1}", location))
+    for i in range(args.vehicles):
+        depot = system.depots[i % len(system.depots)].id if system.depots else None
+        system.add_vehicle(Vehicle(f"V{i+1}", capacity=args.capacity, speed=args.speed), depot)
+    if args.generate is not None:
+        generator = WorkloadGenerator(seed=args.seed, distribution=args.distribution, weights=args.weights)
+        generator.populate(system, args.generate)
+    else:
+        on_batch = (lambda rows: system.assign_packages(mode=args.mode)) if args.assign_as_loaded else None
+        rejects = open(args.rejects, "w", encoding="utf-8") if args.rejects else None
+        on_error = (lambda line, message: rejects.write(f"{line}\t{message}\n")) if rejects else None
+        try:
+            if args.sort:
+                count = sort_manifest(args.manifest, args.sorted_output, system, args.sort.split(","),
+                                      int(args.sort_memory * 2**20), batch_size=args.batch_size, on_error=on_error)
+                log(f"Sorted {count} records by {args.sort}")
+            else:
+                report = load_manifest(args.manifest, system, args.batch_size, on_batch, on_error)
+                log(f"Read {report.rows} records at {report.throughput:,.0f} rows/s, rejected {report.rejected}")
+                for line, message in report.errors[:5]:
+                    log(f"  line {line}: {message}")
+        except (OSError, ValueError) as error:
+            parser.error(f"could not load manifest: {error}")
+        finally:
+            if rejects:
+                rejects.close()
+    load_time = time.perf_counter() - started
+    log(f"Loaded {len(system.packages)} packages and {args.vehicles} vehicles")
+    
+    if args.road_grid:
+        started = time.perf_counter()
+        system.road_network = RoadNetwork.grid(spacing=args.road_grid)
+        load_time += time.perf_counter() - started
+        log(f"Built a {system.road_network.node_count}-node road grid in "
+            f"{system.road_network.preprocess_seconds:.2f}s")
+    journal = StateJournal(system, args.journal) if args.journal else None
+    try:
+        stops, timings = run_batch(system, args.mode, args.route_budget, args.simulate, log, journal, args.estimate)
+    finally:
+        if journal:
+            journal.close()
+    timings = {"load": load_time, **timings}
+    if args.output:
+        started = time.perf_counter()
+        write_results(system, args.output, stops)
+        timings["write"] = time.perf_counter() - started
+        log(f"Wrote {args.output}")
+    log("Timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    if args.profile:
+        profiler.disable()
+        if args.profile.endswith(".prof"):
+            profiler.export_pstats(args.profile)
+        else:
+            profiler.export_json(args.profile)
+        log(f"Wrote profile {args.profile}")
+    if args.serve:
+        host, port = args.serve
+        TrackingService(system).run(host, port, ready=lambda service: log(
+            f"Serving tracking API on http://{host}:{service.port}/ (Ctrl+C to stop)"))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
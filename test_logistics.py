@@ -0,0 +1,591 @@
+"""Regression tests for the headless core; run with python -m pytest"""
+
+import asyncio
+import contextlib
+import heapq
+import io
+import json
+import math
+import os
+import pstats
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+
+from logistics import (LogisticsSystem, Profiler, RoadNetwork, Simulator, SpatialGrid, StateJournal, TrackingService,
+                       Vehicle, WorkloadGenerator, load_manifest, main, optimize_route, restore_system, route_length,
+                       sort_manifest)
+
+START = datetime(2026, 1, 1, 8)
+
+
+def make_system(packages, vehicles, capacity=1000, seed=0):
+    """A system of seeded uniform packages and vehicles at the default depot, plus its generator"""
+    system = LogisticsSystem()
+    for i in range(vehicles):
+        system.add_vehicle(Vehicle(f"V{i+1}", capacity=capacity, speed=50))
+    generator = WorkloadGenerator(seed=seed, start=START)
+    generator.populate(system, packages)
+    return system, generator
+
+
+class AssignmentTest(unittest.TestCase):
+    def assert_consistent(self, system):
+        assigned = 0
+        for vehicle in system.vehicles:
+            self.assertLessEqual(sum(package.weight for package in vehicle.packages), vehicle.capacity + 1e-9)
+            for package in vehicle.packages:
+                self.assertEqual(package.assigned_vehicle, vehicle.id)
+                self.assertEqual(package.status, "processed")
+            assigned += len(vehicle.packages)
+        self.assertEqual(assigned, len(system.select_packages(status="processed")))
+        for package in system.select_packages(status="sorting"):
+            self.assertIsNone(package.assigned_vehicle)
+    
+    def test_assignment_respects_capacity(self):
+        for mode in ("greedy", "compact"):
+            with self.subTest(mode=mode):
+                system, generator = make_system(600, 6, capacity=150)
+                report = system.assign_packages(mode=mode, time_budget=0.2)
+                self.assertGreater(report.assigned, 0)
+                self.assertGreater(len(report.unassigned), 0)  # the fleet is too small for everything
+                self.assertEqual(sorted(report.unassigned.tolist()),
+                                 [package._row for package in system.select_packages(status="sorting")])
+                self.assert_consistent(system)
+                
+                # A second run only fills the capacity left over
+                generator.populate(system, 100)
+                system.assign_packages(mode=mode, time_budget=0.2)
+                self.assert_consistent(system)
+
+
+class SpatialIndexTest(unittest.TestCase):
+    def test_grid_matches_brute_force_under_churn(self):
+        rng = np.random.default_rng(3)
+        xs, ys = rng.uniform(-50, 50, (2, 3000))
+        grid = SpatialGrid(SimpleNamespace(x=xs, y=ys), rebuild_fraction=0.5)
+        grid.build(np.arange(1000))
+        live = set(range(1000))
+        for _ in range(300):
+            # Batches mix duplicates, live, dead and never-inserted rows
+            rows = rng.integers(0, 3000, rng.integers(1, 40))
+            if rng.random() < 0.5:
+                grid.insert(rows)
+                live.update(rows.tolist())
+            else:
+                grid.remove(rows)
+                live.difference_update(rows.tolist())
+            self.assertEqual(len(grid), len(live))
+        
+        self.assertEqual(sorted(grid.live_rows().tolist()), sorted(live))
+        expected = sorted(row for row in live if -10 <= xs[row] <= 20 and -30 <= ys[row] <= 5)
+        self.assertEqual(sorted(grid.in_box(-10, -30, 20, 5).tolist()), expected)
+        gaps = {row: np.hypot(xs[row] - 3.0, ys[row] + 4.0) for row in live}
+        self.assertEqual(grid.nearest((3.0, -4.0), 15).tolist(), sorted(live, key=gaps.get)[:15])
+    
+    def test_moved_packages_are_found_at_their_new_destination(self):
+        system, _ = make_system(5000, 1)
+        package = system.packages[10]
+        old = package.destination
+        system.nearest_packages((0.0, 0.0))  # builds the index
+        
+        package.destination = (40.0, -40.0)
+        self.assertEqual(system.nearest_packages((40.0, -40.0))[0], package)
+        self.assertIn(package, system.packages_in_box(39.9, -40.1, 40.1, -39.9))
+        self.assertNotIn(package, system.packages_within(old, 0.01))
+        self.assertEqual(len(system.spatial_index), 5000)
+
+
+class RouteTest(unittest.TestCase):
+    def test_small_routes(self):
+        points = [(3.0, 4.0), (-2.0, 1.0), (5.0, -5.0)]
+        for count in (0, 1, 2, 3):
+            for return_to_start in (True, False):
+                order = optimize_route(points[:count], return_to_start=return_to_start)
+                self.assertEqual(sorted(order.tolist()), list(range(count)))
+        # With an open end the nearer of two stops comes first
+        self.assertEqual(optimize_route([(9.0, 0.0), (1.0, 0.0)], return_to_start=False).tolist(), [1, 0])
+    
+    def test_optimized_route_is_a_permutation_no_longer_than_its_construction(self):
+        points = np.random.default_rng(5).uniform(-30, 30, (400, 2))
+        for construction in ("nearest", "savings"):
+            for return_to_start in (True, False):
+                with self.subTest(construction=construction, return_to_start=return_to_start):
+                    options = dict(start=(1.0, 2.0), construction=construction, return_to_start=return_to_start)
+                    built = optimize_route(points, time_budget=0, **options)
+                    order = optimize_route(points, time_budget=0.5, **options)
+                    self.assertEqual(sorted(order.tolist()), list(range(len(points))))
+                    self.assertLessEqual(route_length(points, order, (1.0, 2.0), return_to_start),
+                                         route_length(points, built, (1.0, 2.0), return_to_start) + 1e-9)
+    
+    def test_priority_tiers_come_in_order(self):
+        rng = np.random.default_rng(6)
+        points = rng.uniform(-30, 30, (300, 2))
+        priorities = rng.integers(1, 4, 300)
+        order = optimize_route(points, priorities=priorities, time_budget=0.3)
+        self.assertEqual(sorted(order.tolist()), list(range(len(points))))
+        self.assertTrue((np.diff(priorities[order]) >= 0).all())
+
+
+class FleetPlanTest(unittest.TestCase):
+    def test_plan_depends_only_on_inputs_and_seed(self):
+        plans = []
+        for workers in (1, 3):
+            system, _ = make_system(11000, 30, capacity=400)
+            report = system.plan_fleet(workers=workers, seed=7)
+            self.assertEqual(len(np.unique(report.segments)), 3)
+            plans.append([[package._row for package in vehicle.route] for vehicle in system.vehicles])
+        self.assertEqual(plans[0], plans[1])
+
+
+class SimulatorTest(unittest.TestCase):
+    def test_packages_assigned_mid_trip_are_delivered(self):
+        system, generator = make_system(50, 1)
+        system.assign_packages()
+        simulator = Simulator(system, start=START)
+        simulator.dispatch_all()
+        simulator.run(until=0.5)
+        
+        generator.populate(system, 20)
+        system.assign_packages()
+        vehicle = system.vehicles[0]
+        self.assertEqual(len(vehicle.packages), 70)
+        
+        simulator.run()
+        simulator.dispatch_all()
+        simulator.run()
+        self.assertEqual(len(system.delivered_packages), 70)
+        self.assertEqual(len(system.packages), 0)
+        self.assertEqual(vehicle.packages, [])
+        self.assertEqual(vehicle.status, "available")
+    
+    def test_late_assignments_follow_the_planned_route(self):
+        system, generator = make_system(200, 1, capacity=5000)
+        system.assign_packages()
+        system.plan_routes(time_budget=0.2)
+        vehicle = system.vehicles[0]
+        planned = [package.id for package in vehicle.route]
+        self.assertNotEqual(planned, [package.id for package in vehicle.packages])
+        generator.populate(system, 1)
+        system.assign_packages()
+        self.assertEqual(len(vehicle.packages), 201)
+        extra = vehicle.packages[-1].id
+        
+        delivered = []
+        simulator = Simulator(system, start=START)
+        simulator.subscribe(lambda event: delivered.append(event.package) if event.kind == "deliver" else None)
+        simulator.dispatch_all()
+        simulator.run()
+        self.assertEqual(delivered, planned + [extra])
+
+
+class EstimateTest(unittest.TestCase):
+    def test_estimates_keep_promises_of_packages_on_the_road(self):
+        system, _ = make_system(300, 3)
+        system.assign_packages()
+        system.plan_routes(time_budget=0.1)
+        system.estimate_deliveries(START)
+        simulator = Simulator(system, start=START)
+        simulator.dispatch_all()
+        simulator.run(until=1.0)
+        store = system.store
+        on_road = system.select_packages(status="in-transit")
+        self.assertTrue(on_road)
+        promised = [package.estimated_delivery for package in on_road]
+        
+        system.estimate_deliveries(simulator.clock)
+        self.assertEqual([package.estimated_delivery for package in on_road], promised)
+        etas = [package.eta for package in on_road]
+        # Vehicles already under way do not load again
+        system.estimate_deliveries(simulator.clock, loading_minutes=0)
+        self.assertEqual([package.eta for package in on_road], etas)
+        self.assertEqual(store.size, 300)
+    
+    def test_estimates_match_the_simulation_after_late_assignments(self):
+        system, generator = make_system(200, 2, capacity=5000)
+        system.assign_packages()
+        system.plan_routes(time_budget=0)
+        generator.populate(system, 20)
+        system.assign_packages()
+        self.assertTrue(any(len(vehicle.route) < len(vehicle.packages) for vehicle in system.vehicles))
+        system.estimate_deliveries(START)
+        projected = system.store.eta[:system.store.size].copy()
+        simulator = Simulator(system, start=START)
+        simulator.dispatch_all()
+        simulator.run()
+        delivered = system.store.actual_delivery[:system.store.size]
+        drift = np.abs((delivered - projected).astype(np.int64))
+        self.assertEqual(len(system.delivered_packages), 220)
+        self.assertLessEqual(int(drift.max()), 1000)  # microseconds of float rounding
+
+
+class ManifestTest(unittest.TestCase):
+    def load(self, name, text):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, name)
+            with open(path, "w", encoding="utf-8") as handle:
+                handle.write(text)
+            system = LogisticsSystem()
+            report = load_manifest(path, system, batch_size=4)
+        return system, report
+    
+    def test_bad_csv_rows_are_rejected(self):
+        system, report = self.load("manifest.csv", "\n".join([
+            "id,x,y,priority,weight,estimated_delivery",
+            "A,1,2,1,3,2026-01-01T10:00",
+            "B,1,two,1,3,",
+            "C,1,2,4,3,",
+            "A,5,5,2,1,",
+            "D,1,2",
+            "E,1,2,2,3,,extra",
+            "F,-3.5,4,3,0.5,",
+        ]) + "\n")
+        self.assertEqual([package.id for package in system.packages], ["A", "F"])
+        self.assertEqual((report.rows, report.loaded, report.rejected), (7, 2, 5))
+        self.assertEqual([line for line, _ in report.errors], [3, 4, 5, 6, 7])
+        messages = [message for _, message in report.errors]
+        self.assertIn("invalid y", messages[0])
+        self.assertIn("priority", messages[1])
+        self.assertIn("duplicate id A", messages[2])
+        self.assertIn("missing priority", messages[3])
+        self.assertIn("7 fields", messages[4])
+    
+    def test_bad_json_lines_are_rejected(self):
+        system, report = self.load("manifest.jsonl", "\n".join([
+            '{"id": "A", "x": 1, "y": 2, "priority": 1, "weight": 3}',
+            '["B", 1, 2, 1, 3]',
+            "not json",
+            '{"id": "C", "x": 1, "y": 2, "priority": 1, "weight": true}',
+            '{"id": "D", "x": 1, "y": 2, "priority": true, "weight": 2}',
+            '{"id": "E", "x": 1, "y": 2, "priority": 2, "weight": 2.5}',
+        ]) + "\n")
+        self.assertEqual([package.id for package in system.packages], ["A", "E"])
+        self.assertEqual([line for line, _ in report.errors], [2, 3, 4, 5])
+        self.assertEqual([message for _, message in report.errors][:2], ["not a JSON object"] * 2)
+        self.assertIn("invalid weight: True", report.errors[2][1])
+        self.assertIn("invalid priority: True", report.errors[3][1])
+
+
+class ExternalSortTest(unittest.TestCase):
+    def test_sorted_manifest_is_ordered_and_gzipped(self):
+        rng = np.random.default_rng(9)
+        count = 3000
+        priorities = rng.integers(1, 4, count)
+        weights = rng.integers(1, 50, count) / 4  # plenty of ties, broken by input order
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "manifest.csv")
+            with open(source, "w", encoding="utf-8") as handle:
+                handle.write("id,x,y,priority,weight\n")
+                for i in range(count):
+                    handle.write(f"P{i},{i % 97},{i % 89},{priorities[i]},{weights[i]}\n")
+            expected = [f"P{i}" for i in np.lexsort((np.arange(count), -weights, priorities)).tolist()]
+            
+            for name in ("sorted.csv.gz", "sorted.jsonl.gz"):
+                with self.subTest(output=name):
+                    output = os.path.join(directory, name)
+                    records = sort_manifest(source, output, keys=("priority", "-weight"), memory_limit=16384,
+                                            tmpdir=directory, batch_size=500)
+                    self.assertEqual(records, count)
+                    with open(output, "rb") as handle:
+                        self.assertEqual(handle.read(2), b"\x1f\x8b")
+                    system = LogisticsSystem()
+                    report = load_manifest(output, system)
+                    self.assertEqual(report.rejected, 0)
+                    self.assertEqual([package.id for package in system.packages], expected)
+
+
+class RoadNetworkTest(unittest.TestCase):
+    def dijkstra(self, count, sources, targets, speeds, origin):
+        """Fastest hours from origin to every node, straight from the edge list"""
+        lengths = [math.hypot(self.x[u] - self.x[v], self.y[u] - self.y[v]) for u, v in zip(sources, targets)]
+        adjacency = [[] for _ in range(count)]
+        for u, v, km, speed in zip(sources, targets, lengths, speeds):
+            adjacency[u].append((v, km / speed))
+            adjacency[v].append((u, km / speed))
+        hours = [math.inf] * count
+        hours[origin] = 0.0
+        heap = [(0.0, origin)]
+        while heap:
+            settled, node = heapq.heappop(heap)
+            if settled > hours[node]:
+                continue
+            for neighbour, leg in adjacency[node]:
+                if settled + leg < hours[neighbour]:
+                    hours[neighbour] = settled + leg
+                    heapq.heappush(heap, (settled + leg, neighbour))
+        return hours
+    
+    def setUp(self):
+        # A congested 7 x 7 grid with a few random diagonals and one unreachable node
+        rng = np.random.default_rng(2)
+        side = 7
+        gx, gy = np.meshgrid(np.arange(side) * 2.0, np.arange(side) * 2.0, indexing="ij")
+        self.x = gx.ravel().tolist() + [30.0]
+        self.y = gy.ravel().tolist() + [30.0]
+        node = np.arange(side * side).reshape(side, side)
+        sources = np.concatenate((node[:-1, :].ravel(), node[:, :-1].ravel(), rng.integers(0, side * side, 10)))
+        targets = np.concatenate((node[1:, :].ravel(), node[:, 1:].ravel(), rng.integers(0, side * side, 10)))
+        self.edges = sources.tolist(), targets.tolist(), rng.uniform(20, 60, len(sources)).tolist()
+        self.network = RoadNetwork(self.x, self.y, *self.edges, access_speed=30.0)
+    
+    def test_travel_times_match_dijkstra(self):
+        count = len(self.x)
+        for origin in range(count):
+            expected = self.dijkstra(count, *self.edges, origin)
+            for target in range(count):
+                hours, km = self.network.node_route(origin, target)
+                if math.isinf(expected[target]):
+                    self.assertTrue(math.isinf(hours))
+                else:
+                    self.assertAlmostEqual(hours, expected[target], places=9)
+                    self.assertGreaterEqual(km + 1e-9, math.hypot(self.x[origin] - self.x[target],
+                                                                  self.y[origin] - self.y[target]))
+    
+    def test_points_snap_to_their_nearest_node(self):
+        rng = np.random.default_rng(3)
+        nodes = np.column_stack((self.x, self.y))
+        for point in rng.uniform(-5, 35, (300, 2)).tolist():
+            node, gap = self.network.snap(point)
+            gaps = np.hypot(nodes[:, 0] - point[0], nodes[:, 1] - point[1])
+            self.assertAlmostEqual(gap, gaps.min())
+            self.assertAlmostEqual(gaps[node], gaps.min())
+        start, end = (0.3, 0.4), (11.5, 7.8)
+        u, off_u = self.network.snap(start)
+        v, off_v = self.network.snap(end)
+        self.assertAlmostEqual(self.network.travel_time(start, end),
+                               self.network.node_route(u, v)[0] + (off_u + off_v) / 30.0)
+    
+    def test_road_network_belongs_to_one_system(self):
+        on_roads, _ = make_system(20, 2)
+        straight, _ = make_system(20, 2)
+        on_roads.road_network = RoadNetwork.grid(extent=60.0, spacing=4.0)
+        self.assertIsNone(straight.road_network)
+        vehicle, destination = on_roads.vehicles[0], on_roads.packages[0].destination
+        self.assertAlmostEqual(vehicle.calculate_travel_time(destination, on_roads.road_network),
+                               on_roads.road_network.travel_time(vehicle.location, destination)
+                               * on_roads.road_network.reference_speed / vehicle.speed)
+        self.assertTrue(np.allclose(straight.vehicle_travel_time_matrix(),
+                                    straight.vehicle_distance_matrix() / vehicle.speed))
+        self.assertFalse(np.allclose(on_roads.vehicle_travel_time_matrix(),
+                                     on_roads.vehicle_distance_matrix() / vehicle.speed))
+
+
+class TrafficReplanTest(unittest.TestCase):
+    def test_replanned_etas_follow_the_delivery_estimate_timing(self):
+        system, _ = make_system(400, 4)
+        system.assign_packages()
+        system.plan_routes(time_budget=0)
+        system.vehicles[1].status = "in-transit"
+        now = START + timedelta(hours=1)
+        report = system.update_traffic("jam", (-30.0, -30.0, 30.0, 30.0), 3.0, now=now, time_budget=0.01)
+        self.assertTrue(report.vehicles)
+        self.assertIn("V2", report.vehicles)
+        replanned = system.store.eta.copy()
+        for vehicle_id in report.vehicles:
+            with self.subTest(vehicle=vehicle_id):
+                vehicle = system.vehicles[int(vehicle_id[1:]) - 1]
+                rows = np.array([package._row for package in vehicle.route], dtype=np.int64)
+                self.assertEqual(len(report.etas[vehicle_id]), len(rows))
+                system.estimate_deliveries(now, [vehicle_id])
+                np.testing.assert_array_equal(replanned[rows], system.store.eta[rows])
+
+
+class DispatchQueueTest(unittest.TestCase):
+    def expected_order(self, system):
+        """Brute force: sorting packages by priority, then deadline (missing last), then arrival"""
+        waiting = [(row, package) for row, package in enumerate(system.packages) if package.status == "sorting"]
+        waiting.sort(key=lambda item: (item[1].priority, item[1].estimated_delivery is None,
+                                       item[1].estimated_delivery or START, item[0]))
+        return [package.id for _, package in waiting]
+    
+    def drain(self, queue):
+        return [package.id for package in queue.pop_many(len(queue))]
+    
+    def make_queue(self, count=400):
+        system, self.generator = make_system(count, 1)
+        rng = np.random.default_rng(4)
+        for package in system.packages:
+            if rng.random() < 0.7:
+                package.estimated_delivery = START + timedelta(minutes=int(rng.integers(0, 50)))
+        return system, system.dispatch_queue
+    
+    def test_pops_in_priority_then_deadline_order(self):
+        system, queue = self.make_queue()
+        self.assertEqual(len(queue), len(system.packages))
+        self.assertEqual(queue.peek().id, self.expected_order(system)[0])
+        self.assertEqual(self.drain(queue), self.expected_order(system))
+        self.assertIsNone(queue.pop())
+    
+    def test_update_and_remove_rekey_in_place(self):
+        system, queue = self.make_queue()
+        rng = np.random.default_rng(5)
+        ids = [package.id for package in system.packages]
+        for package_id in rng.choice(ids, 80, replace=False).tolist():
+            queue.update(package_id, priority=int(rng.integers(1, 4)),
+                         estimated_delivery=START + timedelta(minutes=int(rng.integers(0, 50))))
+        removed = rng.choice(ids, 20, replace=False).tolist()
+        for package_id in removed:
+            self.assertTrue(queue.remove(package_id))
+            self.assertNotIn(package_id, queue)
+            self.assertFalse(queue.remove(package_id))
+        order = [package_id for package_id in self.expected_order(system) if package_id not in removed]
+        self.assertEqual(self.drain(queue), order)
+    
+    def test_update_requeues_a_popped_package(self):
+        system, queue = self.make_queue(50)
+        popped = queue.pop()
+        self.assertNotIn(popped.id, queue)
+        queue.update(popped.id, priority=1)
+        self.assertIn(popped.id, queue)
+        self.assertEqual(self.drain(queue), self.expected_order(system))
+    
+    def test_follows_status_changes_in_the_store(self):
+        system, queue = self.make_queue()
+        rng = np.random.default_rng(6)
+        packages = system.packages
+        for count in (5, 300):  # a few changes are sifted, many trigger a rebuild
+            with self.subTest(changed=count):
+                for row in rng.choice(len(packages), count, replace=False).tolist():
+                    packages[row].status = str(rng.choice(["sorting", "processed", "delivered"]))
+                self.assertEqual(len(queue), sum(package.status == "sorting" for package in packages))
+                self.assertEqual(queue.peek().id, self.expected_order(system)[0])
+        self.generator.populate(system, 15)
+        self.assertEqual(self.drain(queue), self.expected_order(system))
+
+
+def _profiled_marker():
+    return 1
+
+
+class TrackingServiceTest(unittest.TestCase):
+    def setUp(self):
+        self.system, _ = make_system(50, 2)
+        self.system.assign_packages()
+        self.service = TrackingService(self.system, batch_window=0, max_ids=5)
+    
+    def respond(self, method, target, body=b""):
+        status, payload = asyncio.run(self.service.respond(method, target, body))
+        return status, json.loads(payload)
+    
+    def test_unknown_ids_and_routes_are_not_found(self):
+        for target in ("/packages/NOPE", "/vehicles/NOPE", "/parcels/P1"):
+            with self.subTest(target=target):
+                status, body = self.respond("GET", target)
+                self.assertEqual(status, 404)
+                self.assertIn("error", body)
+    
+    def test_malformed_requests_are_rejected(self):
+        for body in (b"not json", b'{"id": ["P1"]}', b'{"ids": [1, 2]}'):
+            with self.subTest(body=body):
+                self.assertEqual(self.respond("POST", "/packages", body)[0], 400)
+        self.assertEqual(self.respond("POST", "/packages/P1")[0], 405)
+        self.assertEqual(self.respond("GET", "/packages?ids=" + ",".join("abcdef"))[0], 413)
+    
+    def test_bulk_lookup_reports_missing_ids(self):
+        known = [package.id for package in self.system.packages[:3]]
+        requested = [known[0], "NOPE", known[1], known[2], "GONE"]
+        for method, target, body in (("GET", "/packages?ids=" + ",".join(requested), b""),
+                                     ("POST", "/packages", json.dumps({"ids": requested}).encode())):
+            with self.subTest(method=method):
+                status, result = self.respond(method, target, body)
+                self.assertEqual(status, 200)
+                self.assertEqual([package["id"] for package in result["packages"]], known)
+                self.assertEqual(result["missing"], ["NOPE", "GONE"])
+    
+    def test_cached_package_is_refreshed_after_a_status_change(self):
+        package = self.system.vehicles[0].packages[0]
+        target = f"/packages/{package.id}"
+        self.assertEqual(self.respond("GET", target)[1]["status"], "processed")
+        self.assertEqual(self.respond("GET", target)[1]["status"], "processed")
+        self.assertEqual(self.service.cache_hits, 1)
+        
+        self.system.deliver_package(package.id, delivered_at=START)
+        status, body = self.respond("GET", target)
+        self.assertEqual(status, 200)
+        self.assertEqual(body["status"], "delivered")
+        self.assertEqual(body["actual_delivery"][:16], START.isoformat()[:16])
+        self.assertEqual(self.service.cache_hits, 1)
+        self.assertEqual(self.respond("GET", "/status")[1]["packages"]["delivered"], 1)
+
+
+class ProfilerTest(unittest.TestCase):
+    def calls_recorded(self, profiler, directory):
+        """Calls of _profiled_marker in a fresh pstats export"""
+        path = os.path.join(directory, "stats.prof")
+        profiler.export_pstats(path)
+        return sum(calls for (_, _, function), (calls, *_) in pstats.Stats(path).stats.items()
+                   if function == "_profiled_marker")
+    
+    def test_export_keeps_cprofile_as_it_was(self):
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = Profiler()
+            profiler.enable(cprofile=True)
+            _profiled_marker()
+            self.assertEqual(self.calls_recorded(profiler, directory), 1)
+            _profiled_marker()  # still collecting after the export
+            self.assertEqual(self.calls_recorded(profiler, directory), 2)
+            
+            # Timers stay on with cProfile switched off; an export must not switch it back on
+            profiler.disable()
+            profiler.enable()
+            self.calls_recorded(profiler, directory)
+            _profiled_marker()
+            self.assertEqual(self.calls_recorded(profiler, directory), 2)
+            profiler.reset()
+            self.assertRaises(ValueError, profiler.export_pstats, os.path.join(directory, "none.prof"))
+            profiler.disable()
+
+
+class CommandLineTest(unittest.TestCase):
+    def assert_usage_error(self, argv):
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit) as raised:
+            main(argv)
+        self.assertEqual(raised.exception.code, 2)
+        return stderr.getvalue()
+    
+    def test_generate_rejects_manifest_only_options(self):
+        for option in (["--batch-size", "5"], ["--assign-as-loaded"], ["--rejects", "bad.txt"],
+                       ["--sort", "priority"], ["--sort-memory", "8"], ["--sorted-output", "sorted.csv"]):
+            with self.subTest(option=option[0]):
+                message = self.assert_usage_error(["--generate", "10", "-q", *option])
+                self.assertIn(f"{option[0]} only applies to a manifest", message)
+        self.assertEqual(main(["--generate", "10", "-q"]), 0)
+    
+    def test_sorted_output_needs_sort(self):
+        self.assertIn("--sorted-output needs --sort", self.assert_usage_error(["in.csv", "--sorted-output", "out.csv"]))
+
+
+class JournalTest(unittest.TestCase):
+    def test_restore_mid_trip_and_resume(self):
+        system, _ = make_system(500, 5)
+        with tempfile.TemporaryDirectory() as directory:
+            with StateJournal(system, directory) as journal:
+                system.assign_packages()
+                system.plan_routes(time_budget=0.1)
+                simulator = Simulator(system, start=START)
+                simulator.subscribe(journal.observe)
+                simulator.dispatch_all()
+                simulator.run(until=1.0)
+            delivered = len(system.delivered_packages)
+            self.assertTrue(0 < delivered < 500)
+            
+            restored = restore_system(directory)
+        self.assertEqual(len(restored.delivered_packages), delivered)
+        self.assertTrue(all(vehicle.status == "available" for vehicle in restored.vehicles))
+        simulator = Simulator(restored, start=START)
+        simulator.dispatch_all()
+        simulator.run()
+        self.assertEqual(len(restored.delivered_packages), 500)
+        self.assertEqual(len(restored.packages), 0)
+        self.assertEqual(restored.delivery_stats.total.delivered, 500)
+        for vehicle in restored.vehicles:
+            self.assertEqual(vehicle.packages, [])
+            self.assertEqual(vehicle.location, vehicle.home)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,73 +1,430 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, scrolledtext
 import math
-import random
-from datetime import datetime, timedelta
+import os
+import queue
+import threading
+import time
 
-# ----------------------
-# Core Data Models
-# ----------------------
+import numpy as np
 
-class Package:
-    def __init__(self, id, destination, priority, weight):
-        self.id = id
-        self.destination = destination  # (x, y) coordinates
-        self.priority = priority  # 1 (highest) to 3 (lowest)
-        self.weight = weight
-        self.status = "sorting"  # sorting, processed, in-transit, delivered
-        self.assigned_vehicle = None
-        self.pickup_time = None
-        self.estimated_delivery = None
-        self.actual_delivery = None
-    
-    def __repr__(self):
-        return f"Package({self.id}, priority={self.priority}, status={self.status})"
+try:
+    import tkinter as tk
+    from tkinter import ttk, messagebox, scrolledtext, filedialog
+except ImportError:  # headless install: only the batch CLI is available
+    tk = None
 
-
-class Vehicle:
-    def __init__(self, id, capacity=100, speed=50):
-        self.id = id
-        self.capacity = capacity  # Maximum weight capacity
-        self.speed = speed  # Movement speed
-        self.location = (0, 0)  # Start at depot
-        self.status = "available"  # available, loading, in-transit, returning
-        self.packages = []
-    
-    def __repr__(self):
-        return f"Vehicle({self.id}, {self.status}, packages={len(self.packages)})"
-    
-    def calculate_travel_time(self, destination):
-        """Calculate travel time to destination in hours"""
-        distance = calculate_distance(self.location, destination)
-        return distance / self.speed  # Time = distance / speed
+from logistics import (DEPOT_LOCATION, ON_TIME_GRACE_MINUTES, PACKAGE_STATUSES, SPATIAL_DISTRIBUTIONS, Depot,
+                       LogisticsSystem, Package, Simulator, StateJournal, TrackingService, Vehicle, WorkloadGenerator,
+                       grid_clusters, load_manifest, main as batch_main, profiler, restore_system, timed)
 
 
 # ----------------------
-# Logistics System
+# Background Tasks
 # ----------------------
 
-class LogisticsSystem:
-    def __init__(self):
-        self.packages = []
-        self.vehicles = []
-        self.delivered_packages = []
+class TaskCancelled(Exception):
+    """Raised inside a background task once cancel() has been requested"""
+
+
+class BackgroundTask:
+    """Handle for a job started by TaskRunner; thread jobs receive it as their argument"""
+    
+    def __init__(self, name, messages):
+        self.name = name
+        self.future = None  # set for process-pool jobs
+        self._messages = messages
+        self._cancel = threading.Event()
+    
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+    
+    def cancel(self):
+        """Ask the job to stop at its next report()/check(); pending pool jobs are dropped"""
+        self._cancel.set()
+        if self.future is not None:
+            self.future.cancel()
+    
+    def check(self):
+        """Cancellation point: raise TaskCancelled if cancel() was called"""
+        if self._cancel.is_set():
+            raise TaskCancelled(self.name)
+    
+    def report(self, fraction, message=""):
+        """Post progress (0.0-1.0) to the UI thread; also a cancellation point"""
+        self.check()
+        self._messages.put((self, "progress", (fraction, message)))
+
+
+class TaskRunner:
+    """Runs long operations off the Tk thread and hands results back through a queue
+    
+    Jobs run on a daemon thread (submit) or in a process pool (submit_process). Workers
+    never touch widgets: progress, results and errors are queued and dispatched to the
+    callbacks from a root.after poll on the Tk thread. Widgets passed as `disable` are
+    disabled while the job runs.
+    """
     
-    def add_package(self, package):
-        self.packages.append(package)
+    def __init__(self, root, poll_ms=50, process_workers=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.process_workers = process_workers
+        self._messages = queue.Queue()
+        self._active = {}  # task -> (callbacks, disabled widgets)
+        self._polling = False
+        self._pool = None
+    
+    @property
+    def busy(self):
+        return bool(self._active)
+    
+    def submit(self, name, work, on_done=None, on_progress=None, on_error=None, on_cancel=None, disable=()):
+        """Run work(task) on a worker thread and return the BackgroundTask"""
+        task = BackgroundTask(name, self._messages)
+        self._track(task, (on_done, on_progress, on_error, on_cancel), disable)
+        threading.Thread(target=self._run, args=(task, work), name=f"task-{name}", daemon=True).start()
+        return task
+    
+    def submit_process(self, name, function, *args, on_done=None, on_error=None, on_cancel=None, disable=()):
+        """Run a picklable function(*args) in a process pool; cancellable until it starts"""
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor  # deferred: costly to import
+            self._pool = ProcessPoolExecutor(max_workers=self.process_workers)
+        task = BackgroundTask(name, self._messages)
+        self._track(task, (on_done, None, on_error, on_cancel), disable)
+        task.future = self._pool.submit(function, *args)
+        task.future.add_done_callback(lambda future: self._messages.put((task, "finished", future)))
+        return task
+    
+    def cancel_all(self):
+        for task in list(self._active):
+            task.cancel()
+    
+    def shutdown(self):
+        self.cancel_all()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    def _track(self, task, callbacks, disable):
+        for widget in disable:
+            widget.state(["disabled"])
+        self._active[task] = (callbacks, tuple(disable))
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+    
+    def _run(self, task, work):
+        try:
+            result = work(task)
+        except TaskCancelled:
+            self._messages.put((task, "cancelled", None))
+        except Exception as e:
+            self._messages.put((task, "error", e))
+        else:
+            self._messages.put((task, "done", result))
+    
+    def _poll(self):
+        """Drain the queue on the Tk thread and dispatch callbacks"""
+        while True:
+            try:
+                task, kind, payload = self._messages.get_nowait()
+            except queue.Empty:
+                break
+            if task not in self._active:
+                continue
+            (on_done, on_progress, on_error, on_cancel), _ = self._active[task]
+            
+            if kind == "progress":
+                if on_progress:
+                    on_progress(*payload)
+                continue
+            if kind == "finished":
+                # Unpack a process-pool future into done / cancelled / error
+                if payload.cancelled():
+                    kind, payload = "cancelled", None
+                elif payload.exception() is not None:
+                    kind, payload = "error", payload.exception()
+                else:
+                    kind, payload = "done", payload.result()
+            
+            self._finish(task)
+            if kind == "cancelled":
+                if on_cancel:
+                    on_cancel()
+            else:
+                callback = on_done if kind == "done" else on_error
+                if callback:
+                    callback(payload)
+        
+        if self._active:
+            self.root.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
     
-    def add_vehicle(self, vehicle):
-        self.vehicles.append(vehicle)
+    def _finish(self, task):
+        _, disabled = self._active.pop(task)
+        for widget in disabled:
+            widget.state(["!disabled"])
 
 
 # ----------------------
-# Helper Functions
+# Fleet Map
 # ----------------------
 
-def calculate_distance(point1, point2):
-    """Calculate Euclidean distance between two points"""
-    dx = point2[0] - point1[0]
-    dy = point2[1] - point1[1]
-    return math.sqrt(dx*dx + dy*dy)
+STATUS_COLORS = {"sorting": "gray55", "processed": "dark orange", "in-transit": "royal blue",
+                 "delivered": "forest green"}
+VEHICLE_COLORS = {"available": "black", "loading": "dark orange", "in-transit": "royal blue",
+                  "returning": "purple"}
+
+
+class FleetMap:
+    """Canvas view of every active package, vehicle, depot and planned route
+    
+    Canvas items are pooled per kind and moved with coords/itemconfigure instead of
+    being recreated, and anything outside the view is culled. When more than
+    POINT_LIMIT destinations are in view they are drawn as one counted marker per
+    CLUSTER_PIXELS grid cell instead, and long routes are decimated to ROUTE_POINTS
+    vertices. Redraw requests are coalesced into at most one frame per FRAME_MS.
+    Drag to pan, use the mouse wheel to zoom.
+    """
+    
+    POINT_LIMIT = 1500
+    CLUSTER_PIXELS = 36
+    ROUTE_POINTS = 400
+    FRAME_MS = 33
+    MIN_SCALE, MAX_SCALE = 0.05, 500.0  # pixels per world unit
+    
+    def __init__(self, canvas, get_system, status_label=None):
+        self.canvas = canvas
+        self.get_system = get_system
+        self.status_label = status_label
+        self.center = (0.0, 0.0)  # world point shown at the middle of the canvas
+        self.scale = 4.0
+        self.show_routes = True
+        self._pools = {}  # kind -> canvas items, visible ones first
+        self._shown = {}  # kind -> number of items visible after the last frame
+        self._options = {}  # item -> options last passed to itemconfigure
+        self._created = False  # new items this frame, so stacking order needs fixing
+        self._pending = None
+        self._last_frame = 0.0
+        self._drag = None
+        self._routes = {}  # vehicle id -> (route list, length, (n, 2) decimated path, bounding box)
+        
+        canvas.bind("<Configure>", lambda event: self.request_redraw())
+        canvas.bind("<Map>", lambda event: self.request_redraw())
+        canvas.bind("<ButtonPress-1>", self._start_drag)
+        canvas.bind("<B1-Motion>", self._drag_to)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            canvas.bind(sequence, self._wheel)
+    
+    def request_redraw(self):
+        """Schedule a frame; calls arriving faster than FRAME_MS share one"""
+        if self._pending is None:
+            wait = self.FRAME_MS - (time.perf_counter() - self._last_frame) * 1000
+            self._pending = self.canvas.after(max(int(wait), 0), self.draw)
+    
+    def reset(self):
+        """Forget cached routes, e.g. after the system was replaced"""
+        self._routes = {}
+        self.request_redraw()
+    
+    def fit(self):
+        """Zoom and pan so every package, vehicle and depot is in view"""
+        system = self.get_system()
+        points = np.vstack((system.destination_array(), system.depot_locations(),
+                            np.array([vehicle.location for vehicle in system.vehicles], dtype=np.float64)
+                            .reshape(-1, 2)))
+        low, high = points.min(axis=0), points.max(axis=0)
+        span = np.maximum(high - low, 1.0)
+        width, height = max(self.canvas.winfo_width(), 2), max(self.canvas.winfo_height(), 2)
+        self.scale = min(max(0.9 * min(width / span[0], height / span[1]), self.MIN_SCALE), self.MAX_SCALE)
+        self.center = tuple(((low + high) / 2).tolist())
+        self.request_redraw()
+    
+    # Coordinates
+    
+    def _to_screen(self, points):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        xs = width / 2 + (points[:, 0] - self.center[0]) * self.scale
+        ys = height / 2 - (points[:, 1] - self.center[1]) * self.scale  # Y is inverted in canvas
+        return xs, ys
+    
+    def _to_world(self, x, y):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        return (self.center[0] + (x - width / 2) / self.scale, self.center[1] - (y - height / 2) / self.scale)
+    
+    def _view_bounds(self):
+        x0, y1 = self._to_world(0, 0)
+        x1, y0 = self._to_world(self.canvas.winfo_width(), self.canvas.winfo_height())
+        return x0, y0, x1, y1
+    
+    # Item pools
+    
+    def _items(self, kind, count, create):
+        """The first `count` pooled items of a kind, creating hidden ones as needed"""
+        pool = self._pools.setdefault(kind, [])
+        while len(pool) < count:
+            pool.append(create(state="hidden", tags=(kind,)))
+            self._created = True
+        return pool[:count]
+    
+    def _finish(self, kind, used):
+        """Show the first `used` items of a kind and hide the rest"""
+        pool = self._pools.get(kind, [])
+        shown = self._shown.get(kind, 0)
+        for item in pool[shown:used]:
+            self.canvas.itemconfigure(item, state="normal")
+        for item in pool[used:shown]:
+            self.canvas.itemconfigure(item, state="hidden")
+        self._shown[kind] = used
+    
+    def _configure(self, item, **options):
+        """itemconfigure, skipped when nothing changed since the last call"""
+        if self._options.get(item) != options:
+            self.canvas.itemconfigure(item, **options)
+            self._options[item] = options
+    
+    # Drawing
+    
+    @timed()
+    def draw(self):
+        self._pending = None
+        self._last_frame = time.perf_counter()
+        if not self.canvas.winfo_ismapped():
+            return  # redrawn on <Map> when its tab is shown
+        system = self.get_system()
+        bounds = self._view_bounds()
+        
+        if self.show_routes:
+            self._draw_routes(system, bounds)
+        else:
+            self._finish("route", 0)
+        shown, clustered = self._draw_packages(system, bounds)
+        self._draw_markers(system, bounds)
+        
+        if self._created:
+            for kind in ("route", "cluster", "cluster-label", "point", "depot", "vehicle"):
+                self.canvas.tag_raise(kind)
+            self._created = False
+        
+        if self.status_label is not None:
+            elapsed = (time.perf_counter() - self._last_frame) * 1000
+            view = "clustered" if clustered else "shown"
+            self.status_label.config(text=f"{shown} of {len(system.packages)} destinations in view ({view}), "
+                                          f"frame {elapsed:.1f} ms")
+    
+    def _draw_packages(self, system, bounds):
+        """Destinations in view, one dot each or clustered; returns (count in view, clustered)"""
+        store = system.store
+        rows = system.packages.rows
+        xs, ys = store.x[rows], store.y[rows]
+        x0, y0, x1, y1 = bounds
+        visible = np.flatnonzero((xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1))
+        points = np.column_stack((xs[visible], ys[visible]))
+        
+        if len(visible) > self.POINT_LIMIT:
+            self._finish("point", 0)
+            # Cells aligned to the world grid so clusters stay put while panning
+            cell = self.CLUSTER_PIXELS / self.scale
+            aligned = (math.floor(x0 / cell) * cell, math.floor(y0 / cell) * cell, x1 + cell, y1 + cell)
+            centroids, counts = grid_clusters(points, aligned, cell)
+            markers = self._items("cluster", len(counts), lambda **options: self.canvas.create_oval(
+                0, 0, 0, 0, fill="steel blue", outline="white", **options))
+            labels = self._items("cluster-label", len(counts), lambda **options: self.canvas.create_text(
+                0, 0, fill="white", font=("Arial", 8), **options))
+            sx, sy = self._to_screen(centroids)
+            radii = 6 + 3 * np.log10(counts)
+            for marker, label, x, y, radius, count in zip(markers, labels, sx.tolist(), sy.tolist(),
+                                                          radii.tolist(), counts.tolist()):
+                self.canvas.coords(marker, x - radius, y - radius, x + radius, y + radius)
+                self.canvas.coords(label, x, y)
+                self._configure(label, text=str(count) if count < 1000 else f"{count // 1000}k")
+            self._finish("cluster", len(counts))
+            self._finish("cluster-label", len(counts))
+            return len(visible), True
+        
+        self._finish("cluster", 0)
+        self._finish("cluster-label", 0)
+        dots = self._items("point", len(visible), lambda **options: self.canvas.create_oval(
+            0, 0, 0, 0, outline="", **options))
+        sx, sy = self._to_screen(points)
+        statuses = store.status[rows[visible]].tolist()
+        for dot, x, y, status in zip(dots, sx.tolist(), sy.tolist(), statuses):
+            self.canvas.coords(dot, x - 3, y - 3, x + 3, y + 3)
+            self._configure(dot, fill=STATUS_COLORS[PACKAGE_STATUSES[status]])
+        self._finish("point", len(visible))
+        return len(visible), False
+    
+    def _draw_markers(self, system, bounds):
+        """Depots as squares and vehicles as diamonds, culled to the view"""
+        x0, y0, x1, y1 = bounds
+        depots = system.depot_locations()
+        inside = depots[(depots[:, 0] >= x0) & (depots[:, 0] <= x1) & (depots[:, 1] >= y0) & (depots[:, 1] <= y1)]
+        squares = self._items("depot", len(inside), lambda **options: self.canvas.create_rectangle(
+            0, 0, 0, 0, fill="blue", outline="white", **options))
+        sx, sy = self._to_screen(inside)
+        for square, x, y in zip(squares, sx.tolist(), sy.tolist()):
+            self.canvas.coords(square, x - 6, y - 6, x + 6, y + 6)
+        self._finish("depot", len(inside))
+        
+        vehicles = [vehicle for vehicle in system.vehicles
+                    if x0 <= vehicle.location[0] <= x1 and y0 <= vehicle.location[1] <= y1]
+        diamonds = self._items("vehicle", len(vehicles), lambda **options: self.canvas.create_polygon(
+            0, 0, 0, 0, 0, 0, 0, 0, outline="white", **options))
+        locations = np.array([vehicle.location for vehicle in vehicles], dtype=np.float64).reshape(-1, 2)
+        sx, sy = self._to_screen(locations)
+        for diamond, vehicle, x, y in zip(diamonds, vehicles, sx.tolist(), sy.tolist()):
+            self.canvas.coords(diamond, x, y - 7, x + 7, y, x, y + 7, x - 7, y)
+            self._configure(diamond, fill=VEHICLE_COLORS.get(vehicle.status, "black"))
+        self._finish("vehicle", len(vehicles))
+    
+    def _draw_routes(self, system, bounds):
+        """One polyline per planned route that crosses the view, decimated when long"""
+        x0, y0, x1, y1 = bounds
+        paths = []
+        for vehicle in system.vehicles:
+            if not vehicle.route:
+                continue
+            cached = self._routes.get(vehicle.id)
+            if cached is None or cached[0] is not vehicle.route or cached[1] != len(vehicle.route):
+                rows = np.array([package._row for package in vehicle.route], dtype=np.int64)
+                stops = system.destination_array(rows)
+                step = -(-len(stops) // self.ROUTE_POINTS)
+                path = np.vstack(([vehicle.home], stops[::step], stops[-1:], [vehicle.home]))
+                cached = self._routes[vehicle.id] = (vehicle.route, len(vehicle.route), path,
+                                                     *path.min(axis=0).tolist(), *path.max(axis=0).tolist())
+            _, _, path, low_x, low_y, high_x, high_y = cached
+            if high_x >= x0 and low_x <= x1 and high_y >= y0 and low_y <= y1:
+                paths.append(path)
+        
+        lines = self._items("route", len(paths), lambda **options: self.canvas.create_line(
+            0, 0, 0, 0, fill="forest green", **options))
+        for line, path in zip(lines, paths):
+            sx, sy = self._to_screen(path)
+            self.canvas.coords(line, *np.column_stack((sx, sy)).ravel().tolist())
+        self._finish("route", len(paths))
+    
+    # Pan and zoom
+    
+    def _start_drag(self, event):
+        self._drag = (event.x, event.y, self.center)
+    
+    def _drag_to(self, event):
+        if self._drag is None:
+            return
+        x, y, (center_x, center_y) = self._drag
+        self.center = (center_x - (event.x - x) / self.scale, center_y + (event.y - y) / self.scale)
+        self.request_redraw()
+    
+    def _wheel(self, event):
+        """Zoom about the cursor, keeping the world point under it in place"""
+        factor = 1.25 if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0 else 0.8
+        world_x, world_y = self._to_world(event.x, event.y)
+        self.scale = min(max(self.scale * factor, self.MIN_SCALE), self.MAX_SCALE)
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        self.center = (world_x - (event.x - width / 2) / self.scale, world_y + (event.y - height / 2) / self.scale)
+        self.request_redraw()
+        return "break"
 
 
 # ----------------------
@@ -87,6 +444,34 @@ class LogisticsApp:
         # Initialize variables
         self.vehicle_count = tk.IntVar(value=5)
         self.package_count = tk.IntVar(value=100)
+        self.seed = tk.StringVar(value="")  # blank = different packages every time
+        
+        # Long operations run in the background and report back via root.after
+        self.tasks = TaskRunner(self.root)
+        
+        # Vehicle table state for incremental refreshes
+        self._vehicle_items = {}  # vehicle id -> (tree item, last values)
+        self._hidden_vehicles = set()
+        self._vehicle_table_system = None
+        
+        # Performance panel state
+        self.profiling = tk.BooleanVar(value=False)
+        self.use_cprofile = tk.BooleanVar(value=False)
+        self._performance_items = {}  # operation name -> tree item
+        self._performance_job = None  # pending after() id of the table refresh loop
+        
+        # Fleet map simulation state
+        self.simulation_speed = tk.DoubleVar(value=1.0)  # virtual hours per second
+        self.simulator = None
+        self._simulation_job = None
+        
+        # Journal persisting the current system, once saved or restored
+        self.journal = None
+        
+        # Local tracking API, served from a background thread while enabled
+        self.api_port = tk.IntVar(value=8080)
+        self.serving_api = tk.BooleanVar(value=False)
+        self.tracking_service = None
         
         # Setup the user interface
         self.setup_ui()
@@ -109,18 +494,24 @@ class LogisticsApp:
         self.packages_tab = ttk.Frame(self.tab_control)
         self.vehicles_tab = ttk.Frame(self.tab_control)
         self.tracking_tab = ttk.Frame(self.tab_control)
+        self.fleet_map_tab = ttk.Frame(self.tab_control)
+        self.performance_tab = ttk.Frame(self.tab_control)
         
         # Add tabs to notebook
         self.tab_control.add(self.setup_tab, text="System Setup")
         self.tab_control.add(self.packages_tab, text="Packages")
         self.tab_control.add(self.vehicles_tab, text="Vehicles")
         self.tab_control.add(self.tracking_tab, text="Package Tracking")
+        self.tab_control.add(self.fleet_map_tab, text="Fleet Map")
+        self.tab_control.add(self.performance_tab, text="Performance")
         
         # Initialize each tab
         self.init_setup_tab()
         self.init_packages_tab()
         self.init_vehicles_tab()
         self.init_tracking_tab()
+        self.init_fleet_map_tab()
+        self.init_performance_tab()
     
     def setup_styles(self):
         """Set up the TTK styles for consistent UI appearance"""
@@ -149,7 +540,7 @@ class LogisticsApp:
         vehicle_frame.pack(fill=tk.X, pady=10)
         
         ttk.Label(vehicle_frame, text="Number of Vehicles:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
-        ttk.Spinbox(vehicle_frame, from_=1, to=20, textvariable=self.vehicle_count, width=5).grid(
+        ttk.Spinbox(vehicle_frame, from_=1, to=1000, textvariable=self.vehicle_count, width=7).grid(
             row=0, column=1, padx=5, pady=5, sticky=tk.W)
         
         # Package setup
@@ -157,15 +548,57 @@ class LogisticsApp:
         package_frame.pack(fill=tk.X, pady=10)
         
         ttk.Label(package_frame, text="Number of Packages:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
-        ttk.Spinbox(package_frame, from_=1, to=500, textvariable=self.package_count, width=5).grid(
-            row=0, column=1, padx=5, pady=5, sticky=tk.W)
+        ttk.Spinbox(package_frame, from_=1, to=2000000, increment=100, textvariable=self.package_count,
+                    width=9).grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
+        
+        ttk.Label(package_frame, text="Distribution:").grid(row=0, column=2, padx=5, pady=5, sticky=tk.W)
+        self.distribution = ttk.Combobox(package_frame, values=list(SPATIAL_DISTRIBUTIONS), width=10,
+                                         state="readonly")
+        self.distribution.grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
+        self.distribution.current(0)
+        
+        ttk.Label(package_frame, text="Seed:").grid(row=0, column=4, padx=5, pady=5, sticky=tk.W)
+        ttk.Entry(package_frame, textvariable=self.seed, width=8).grid(row=0, column=5, padx=5, pady=5, sticky=tk.W)
         
         # Action buttons
         button_frame = ttk.Frame(frame)
         button_frame.pack(fill=tk.X, pady=20)
         
-        ttk.Button(button_frame, text="Initialize System", command=self.initialize_system).pack(side=tk.LEFT, padx=5)
-        ttk.Button(button_frame, text="Clear System", command=self.clear_system).pack(side=tk.LEFT, padx=5)
+        self.initialize_button = ttk.Button(button_frame, text="Initialize System", command=self.initialize_system)
+        self.initialize_button.pack(side=tk.LEFT, padx=5)
+        self.clear_button = ttk.Button(button_frame, text="Clear System", command=self.clear_system)
+        self.clear_button.pack(side=tk.LEFT, padx=5)
+        self.load_button = ttk.Button(button_frame, text="Load Manifest...", command=self.load_manifest)
+        self.load_button.pack(side=tk.LEFT, padx=5)
+        self.save_button = ttk.Button(button_frame, text="Save State...", command=self.save_state)
+        self.save_button.pack(side=tk.LEFT, padx=5)
+        self.restore_button = ttk.Button(button_frame, text="Restore State...", command=self.restore_state)
+        self.restore_button.pack(side=tk.LEFT, padx=5)
+        
+        # Assignment controls
+        assign_frame = ttk.LabelFrame(frame, text="Assignment", padding="10")
+        assign_frame.pack(fill=tk.X, pady=10)
+        
+        ttk.Label(assign_frame, text="Mode:").grid(row=0, column=0, padx=5, pady=5, sticky=tk.W)
+        self.assignment_mode = ttk.Combobox(assign_frame, values=["greedy", "compact"], width=10, state="readonly")
+        self.assignment_mode.grid(row=0, column=1, padx=5, pady=5, sticky=tk.W)
+        self.assignment_mode.current(0)
+        self.assign_button = ttk.Button(assign_frame, text="Assign Packages", command=self.assign_packages)
+        self.assign_button.grid(row=0, column=2, padx=5, pady=5, sticky=tk.W)
+        self.plan_button = ttk.Button(assign_frame, text="Plan Routes", command=self.plan_routes)
+        self.plan_button.grid(row=0, column=3, padx=5, pady=5, sticky=tk.W)
+        self.estimate_button = ttk.Button(assign_frame, text="Estimate Deliveries", command=self.estimate_deliveries)
+        self.estimate_button.grid(row=0, column=4, padx=5, pady=5, sticky=tk.W)
+        
+        # Background job progress
+        progress_frame = ttk.Frame(frame)
+        progress_frame.pack(fill=tk.X, pady=10)
+        
+        self.progress_bar = ttk.Progressbar(progress_frame, maximum=1.0, mode="determinate")
+        self.progress_bar.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+        self.cancel_button = ttk.Button(progress_frame, text="Cancel", command=self.tasks.cancel_all)
+        self.cancel_button.pack(side=tk.LEFT, padx=5)
+        self.cancel_button.state(["disabled"])
         
         # Status label
         self.setup_status_label = ttk.Label(frame, text="")
@@ -203,6 +636,7 @@ class LogisticsApp:
         # Create scrollbar
         scrollbar = ttk.Scrollbar(table_frame)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.packages_scrollbar = scrollbar
         
         # Create treeview
         columns = ("ID", "Destination", "Priority", "Weight", "Status", "Vehicle", "Delivery Time")
@@ -224,6 +658,13 @@ class LogisticsApp:
         
         scrollbar.config(command=self.packages_tree.yview)
         self.packages_tree.pack(fill=tk.BOTH, expand=True)
+        
+        # Virtual mode scrolling and page sizing
+        self.packages_tree.bind("<Configure>", self._resize_package_page)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.packages_tree.bind(sequence, self._wheel_packages)
+        
+        self._reset_package_table()
     
     # ----------------------
     # Vehicles Tab
@@ -312,6 +753,13 @@ class LogisticsApp:
         
         ttk.Button(search_frame, text="Track Package", command=self.track_package).pack(side=tk.LEFT, padx=5)
         
+        ttk.Checkbutton(search_frame, text="Serve API", variable=self.serving_api,
+                        command=self.toggle_tracking_api).pack(side=tk.RIGHT, padx=5)
+        ttk.Spinbox(search_frame, from_=1024, to=65535, textvariable=self.api_port, width=6).pack(side=tk.RIGHT, padx=5)
+        ttk.Label(search_frame, text="API port:").pack(side=tk.RIGHT, padx=5)
+        self.api_status_label = ttk.Label(frame, text="")
+        self.api_status_label.pack(fill=tk.X)
+        
         # Tracking result section
         result_frame = ttk.LabelFrame(frame, text="Tracking Information", padding="10")
         result_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -326,47 +774,294 @@ class LogisticsApp:
         self.map_canvas = tk.Canvas(map_frame, bg="white")
         self.map_canvas.pack(fill=tk.BOTH, expand=True)
     
+    def toggle_tracking_api(self):
+        """Start or stop the HTTP tracking API over the current system"""
+        if not self.serving_api.get():
+            self._stop_tracking_api()
+            self.api_status_label.config(text="")
+            return
+        try:
+            service = TrackingService(lambda: self.system)
+            port = service.start_thread(port=self.api_port.get())
+        except (OSError, tk.TclError) as error:
+            self.serving_api.set(False)
+            messagebox.showerror("Error", f"Could not start the tracking API: {error}")
+            return
+        self.tracking_service = service
+        self.api_status_label.config(text=f"Tracking API on http://127.0.0.1:{port}/packages/<id>, "
+                                          f"/vehicles/<id> and /status")
+    
+    def _stop_tracking_api(self):
+        if self.tracking_service is not None:
+            self.tracking_service.stop()
+            self.tracking_service = None
+    
+    # ----------------------
+    # Fleet Map Tab
+    # ----------------------
+    
+    # Milliseconds of real time between simulation steps
+    SIMULATION_TICK_MS = 50
+    
+    def init_fleet_map_tab(self):
+        """Initialize the fleet map tab: every package, vehicle and route on one canvas"""
+        frame = ttk.Frame(self.fleet_map_tab, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Map controls
+        control_frame = ttk.Frame(frame)
+        control_frame.pack(fill=tk.X, pady=(0, 10))
+        
+        self.show_routes = tk.BooleanVar(value=True)
+        ttk.Button(control_frame, text="Fit", command=lambda: self.fleet_map.fit()).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(control_frame, text="Show routes", variable=self.show_routes,
+                        command=self._toggle_routes).pack(side=tk.LEFT, padx=5)
+        
+        self.simulate_button = ttk.Button(control_frame, text="Simulate", command=self.toggle_simulation)
+        self.simulate_button.pack(side=tk.RIGHT, padx=5)
+        ttk.Spinbox(control_frame, from_=0.1, to=100, increment=0.5, textvariable=self.simulation_speed,
+                    width=6).pack(side=tk.RIGHT, padx=5)
+        ttk.Label(control_frame, text="Hours per second:").pack(side=tk.RIGHT, padx=5)
+        
+        map_status = ttk.Label(frame, text="")
+        map_status.pack(side=tk.BOTTOM, fill=tk.X, pady=(10, 0))
+        canvas = tk.Canvas(frame, bg="white")
+        canvas.pack(fill=tk.BOTH, expand=True)
+        self.fleet_map = FleetMap(canvas, lambda: self.system, map_status)
+    
+    def _toggle_routes(self):
+        self.fleet_map.show_routes = self.show_routes.get()
+        self.fleet_map.request_redraw()
+    
+    def toggle_simulation(self):
+        """Start or pause the simulation, drawing it live on the fleet map"""
+        if self._simulation_job is not None:
+            self.stop_simulation()
+            return
+        if self.tasks.busy:
+            return
+        if self.simulator is None or self.simulator.system is not self.system:
+            self.simulator = Simulator(self.system)
+        self.simulator.dispatch_all()
+        if not self.simulator.pending:
+            messagebox.showinfo("Info", "Assign packages to vehicles first")
+            return
+        for button in self._action_buttons():
+            button.state(["disabled"])
+        self.simulate_button.config(text="Pause")
+        self._simulation_step()
+    
+    def _simulation_step(self):
+        try:
+            speed = max(self.simulation_speed.get(), 0.0)
+        except tk.TclError:
+            speed = 1.0
+        self.simulator.run(until=self.simulator.now + speed * self.SIMULATION_TICK_MS / 1000)
+        self.fleet_map.request_redraw()  # throttled, however short the tick
+        if self.journal is not None:
+            self.journal.maybe_flush()
+        if self.simulator.pending:
+            self._simulation_job = self.root.after(self.SIMULATION_TICK_MS, self._simulation_step)
+        else:
+            self._simulation_job = None
+            self.stop_simulation()
+    
+    def stop_simulation(self):
+        """Pause the simulation and bring the tables up to date"""
+        if self._simulation_job is not None:
+            self.root.after_cancel(self._simulation_job)
+            self._simulation_job = None
+        for button in self._action_buttons():
+            button.state(["!disabled"])
+        self.simulate_button.config(text="Simulate")
+        text = f"Simulated {self.simulator.now:.1f} h, {len(self.system.delivered_packages)} delivered"
+        stats = self.system.delivery_stats.total
+        if stats.scheduled:
+            text += f", {stats.on_time_rate:.1%} on time ({stats.late} late, {stats.mean_lateness:.0f} min on average)"
+        self.setup_status_label.config(text=text, style="Success.TLabel")
+        self.refresh_packages()
+        self.refresh_vehicles()
+    
+    # ----------------------
+    # Performance Tab
+    # ----------------------
+    
+    # Milliseconds between table updates while profiling
+    PERFORMANCE_POLL_MS = 1000
+    
+    def init_performance_tab(self):
+        """Initialize the performance tab: live timings of instrumented operations"""
+        frame = ttk.Frame(self.performance_tab, padding="10")
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        # Title
+        ttk.Label(frame, text="Performance", style="Header.TLabel").pack(pady=(0, 20))
+        
+        # Profiling controls
+        control_frame = ttk.Frame(frame)
+        control_frame.pack(fill=tk.X, pady=10)
+        
+        ttk.Checkbutton(control_frame, text="Enable profiling", variable=self.profiling,
+                        command=self.toggle_profiling).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(control_frame, text="Include cProfile", variable=self.use_cprofile,
+                        command=self.toggle_profiling).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Export cProfile...", command=self.export_pstats).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(control_frame, text="Export JSON...", command=self.export_profile).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(control_frame, text="Reset", command=self.reset_profile).pack(side=tk.RIGHT, padx=5)
+        
+        # Timings table
+        table_frame = ttk.Frame(frame)
+        table_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        
+        scrollbar = ttk.Scrollbar(table_frame)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        columns = ("Operation", "Calls", "Mean ms", "p50 ms", "p95 ms", "Max ms", "Last ms", "Throughput/s")
+        self.performance_tree = ttk.Treeview(table_frame, columns=columns, yscrollcommand=scrollbar.set,
+                                             selectmode="browse")
+        self.performance_tree.column("#0", width=0, stretch=tk.NO)
+        self.performance_tree.column("Operation", anchor=tk.W, width=260)
+        for col in columns:
+            if col != "Operation":
+                self.performance_tree.column(col, anchor=tk.E, width=80)
+            self.performance_tree.heading(col, text=col, anchor=tk.W if col == "Operation" else tk.E)
+        
+        scrollbar.config(command=self.performance_tree.yview)
+        self.performance_tree.pack(fill=tk.BOTH, expand=True)
+        
+        # Counters
+        self.performance_counters_label = ttk.Label(frame, text="Profiling is off")
+        self.performance_counters_label.pack(fill=tk.X, pady=10)
+    
+    def toggle_profiling(self):
+        """Switch the shared profiler on or off to match the checkboxes"""
+        if self.profiling.get():
+            profiler.disable()  # re-enable below so a cProfile change takes effect
+            profiler.enable(cprofile=self.use_cprofile.get())
+            if self._performance_job is None:  # toggling cProfile keeps the one loop running
+                self._performance_job = self.root.after(self.PERFORMANCE_POLL_MS, self._poll_performance)
+        else:
+            profiler.disable()
+            if self._performance_job is not None:
+                self.root.after_cancel(self._performance_job)
+                self._performance_job = None
+        self.refresh_performance()
+    
+    def _poll_performance(self):
+        self._performance_job = None
+        if not profiler.enabled:
+            return
+        if self.tab_control.select() == str(self.performance_tab):
+            self.refresh_performance()
+        self._performance_job = self.root.after(self.PERFORMANCE_POLL_MS, self._poll_performance)
+    
+    def refresh_performance(self):
+        """Update the timings table in place from a profiler snapshot"""
+        snapshot = profiler.snapshot()
+        for name, stats in snapshot["operations"].items():
+            values = (name, stats["calls"], f"{stats['mean_ms']:.2f}", f"{stats['p50_ms']:.2f}",
+                      f"{stats['p95_ms']:.2f}", f"{stats['max_ms']:.2f}", f"{stats['last_ms']:.2f}",
+                      f"{stats['throughput']:,.0f}")
+            item = self._performance_items.get(name)
+            if item is None:
+                self._performance_items[name] = self.performance_tree.insert("", tk.END, values=values)
+            else:
+                self.performance_tree.item(item, values=values)
+        
+        counters = ", ".join(f"{name} {count:,}" for name, count in snapshot["counters"].items())
+        state = "on" if profiler.enabled else "off"
+        since = f" since {snapshot['started']}" if snapshot["started"] else ""
+        self.performance_counters_label.config(text=f"Profiling is {state}{since}. {counters}")
+    
+    def reset_profile(self):
+        profiler.reset()
+        children = self.performance_tree.get_children()
+        if children:
+            self.performance_tree.delete(*children)
+        self._performance_items = {}
+        self.refresh_performance()
+    
+    def export_profile(self):
+        """Save the profiler snapshot as JSON"""
+        path = filedialog.asksaveasfilename(title="Export Timings", defaultextension=".json",
+                                            filetypes=[("JSON", "*.json"), ("All files", "*.*")])
+        if path:
+            try:
+                profiler.export_json(path)
+            except OSError as error:
+                messagebox.showerror("Error", f"Could not write {path}: {error}")
+    
+    def export_pstats(self):
+        """Save cProfile statistics of the GUI thread for pstats or snakeviz"""
+        path = filedialog.asksaveasfilename(title="Export cProfile Stats", defaultextension=".prof",
+                                            filetypes=[("cProfile stats", "*.prof"), ("All files", "*.*")])
+        if path:
+            try:
+                profiler.export_pstats(path)
+            except (OSError, ValueError) as error:
+                messagebox.showerror("Error", f"Could not export cProfile stats: {error}")
+    
     # ----------------------
     # System Operations
     # ----------------------
     
+    def _run_task(self, name, work, on_done):
+        """Run work(task) in the background with the action buttons disabled"""
+        def progress(fraction, message):
+            self.progress_bar.config(value=fraction)
+            if message:
+                self.setup_status_label.config(text=message, style="TLabel")
+        
+        def done(result):
+            self.cancel_button.state(["disabled"])
+            self.progress_bar.config(value=1.0)
+            on_done(result)
+        
+        def failed(error):
+            self.cancel_button.state(["disabled"])
+            messagebox.showerror("Error", f"{name} failed: {error}")
+            self.setup_status_label.config(text=f"Error: {error}", style="Error.TLabel")
+        
+        def cancelled():
+            self.cancel_button.state(["disabled"])
+            self.progress_bar.config(value=0.0)
+            self.setup_status_label.config(text=f"{name} cancelled", style="Error.TLabel")
+            self.refresh_packages()
+            self.refresh_vehicles()
+        
+        self.progress_bar.config(value=0.0)
+        self.cancel_button.state(["!disabled"])
+        return self.tasks.submit(name, work, on_done=done, on_progress=progress, on_error=failed,
+                                 on_cancel=cancelled, disable=self._action_buttons())
+    
+    def _action_buttons(self):
+        return (self.initialize_button, self.clear_button, self.load_button, self.save_button, self.restore_button,
+                self.assign_button, self.plan_button, self.estimate_button)
+    
     def initialize_system(self):
         """Initialize the logistics system with vehicles and packages"""
+        # Tk variables must be read on this thread
         try:
-            # Clear existing system
-            self.clear_system()
-            
-            # Create new system
-            self.system = LogisticsSystem()
-            
-            # Add vehicles with increasing capacity and speed
-            for i in range(self.vehicle_count.get()):
-                capacity = 100 + i * 20  # Base capacity + increment
-                speed = 50 + i * 5       # Base speed + increment
-                self.system.add_vehicle(Vehicle(f"V{i+1}", capacity=capacity, speed=speed))
-            
-            # Generate random packages
-            for i in range(self.package_count.get()):
-                # Random coordinates within range
-                x = random.uniform(-50, 50)
-                y = random.uniform(-50, 50)
-                
-                # Random priority (1-3) and weight
-                priority = random.randint(1, 3)  # 1=highest, 3=lowest
-                weight = random.uniform(0.5, 10)
-                
-                # Create package
-                package = Package(f"P{i+1}", (x, y), priority, weight)
-                
-                # Set estimated delivery time (random for demo)
-                package.estimated_delivery = datetime.now() + timedelta(hours=random.uniform(1, 5))
-                
-                # Add to system
-                self.system.add_package(package)
+            vehicle_count = self.vehicle_count.get()
+            package_count = self.package_count.get()
+            seed = int(self.seed.get()) if self.seed.get().strip() else None
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Error", "Vehicle count, package count and seed must be whole numbers")
+            return
+        distribution = self.distribution.get()
+        
+        # Clear existing system
+        self.clear_system()
+        
+        def work(task):
+            return self._generate_system(task, vehicle_count, package_count, distribution, seed)
+        
+        def done(system):
+            self.system = system
             
             # Update status
             self.setup_status_label.config(
-                text=f"System initialized with {self.vehicle_count.get()} vehicles and {self.package_count.get()} packages", 
+                text=f"System initialized with {vehicle_count} vehicles and {package_count} packages", 
                 style="Success.TLabel"
             )
             
@@ -377,13 +1072,171 @@ class LogisticsApp:
             # Update tab labels with counts
             self.tab_control.tab(1, text=f"Packages ({len(self.system.packages)})")
             self.tab_control.tab(2, text=f"Vehicles ({len(self.system.vehicles)})")
+        
+        self._run_task("Initialization", work, done)
+    
+    @staticmethod
+    @timed("LogisticsApp.initialize_system", items=lambda system: len(system.packages))
+    def _generate_system(task, vehicle_count, package_count, distribution="uniform", seed=None,
+                         chunk_size=100000):
+        """Build a fresh random system off the Tk thread, reporting progress per chunk"""
+        system = LogisticsSystem()
+        
+        # Add vehicles with increasing capacity and speed
+        for i in range(vehicle_count):
+            capacity = 100 + i * 20  # Base capacity + increment
+            speed = 50 + i * 5       # Base speed + increment
+            system.add_vehicle(Vehicle(f"V{i+1}", capacity=capacity, speed=speed))
+        
+        # Generate packages column-wise: priority 1=highest, 3=lowest; deliveries due in 1-5 hours
+        generator = WorkloadGenerator(seed=seed, distribution=distribution)
+        generator.populate(system, package_count, chunk_size, progress=lambda fraction: task.report(
+            fraction, f"Generated {round(fraction * package_count)} of {package_count} packages"))
+        return system
+    
+    def load_manifest(self):
+        """Stream packages from a CSV or JSON Lines manifest into the current system"""
+        path = filedialog.askopenfilename(
+            title="Load Manifest",
+            filetypes=[("Manifests", "*.csv *.jsonl *.ndjson *.gz"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+        system = self.system
+        
+        def work(task):
+            def progress(fraction):
+                task.report(fraction, f"Loading {path}: {len(system.packages)} packages")
+            return load_manifest(path, system, progress=progress)
+        
+        def done(report):
+            status = f"Loaded {report.loaded} packages from {path}"
+            if report.rejected:
+                status += f", rejected {report.rejected} (first: line {report.errors[0][0]}, {report.errors[0][1]})"
+            self.setup_status_label.config(text=status, style="Success.TLabel")
             
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to initialize system: {str(e)}")
-            self.setup_status_label.config(text=f"Error: {str(e)}", style="Error.TLabel")
+            # Refresh displays
+            self.refresh_packages()
+            self.tab_control.tab(1, text=f"Packages ({len(self.system.packages)})")
+        
+        self._run_task("Manifest load", work, done)
+    
+    def assign_packages(self):
+        """Assign sorting packages to vehicles and report utilization"""
+        if not self.system.vehicles:
+            messagebox.showinfo("Info", "Initialize the system first")
+            return
+        
+        mode = self.assignment_mode.get()
+        
+        def work(task):
+            task.report(0.0, f"Assigning packages ({mode})...")
+            return self.system.assign_packages(mode=mode)
+        
+        def done(report):
+            mean_utilization = sum(fraction for _, _, fraction in report.utilization.values()) / len(report.utilization)
+            self.setup_status_label.config(
+                text=(f"Assigned {report.assigned} packages ({len(report.unassigned)} left in sorting), "
+                      f"mean utilization {mean_utilization:.0%}, {report.elapsed:.2f}s"),
+                style="Success.TLabel"
+            )
+            
+            # Refresh displays
+            self.refresh_packages()
+            self.refresh_vehicles()
+        
+        self._run_task("Assignment", work, done)
+    
+    def plan_routes(self):
+        """Optimize the stop order for every vehicle with assigned packages"""
+        if not any(vehicle.packages for vehicle in self.system.vehicles):
+            messagebox.showinfo("Info", "Assign packages to vehicles first")
+            return
+        
+        started = time.perf_counter()
+        
+        def work(task):
+            self.system.plan_routes(progress=lambda fraction: task.report(fraction, "Planning routes..."))
+            return sum(self.system.route_distance(vehicle) for vehicle in self.system.vehicles)
+        
+        def done(total):
+            self.fleet_map.request_redraw()
+            self.setup_status_label.config(
+                text=f"Planned routes for {len(self.system.vehicles)} vehicles, total distance {total:.1f} "
+                     f"({time.perf_counter() - started:.2f}s)",
+                style="Success.TLabel"
+            )
+        
+        self._run_task("Route planning", work, done)
+    
+    def estimate_deliveries(self):
+        """Project arrivals from the planned routes as if waiting vehicles left now; promise them
+        to packages not yet picked up"""
+        started = time.perf_counter()
+        count = self.system.estimate_deliveries()
+        if not count:
+            messagebox.showinfo("Info", "Assign packages to vehicles first")
+            return
+        self.setup_status_label.config(
+            text=f"Projected delivery times for {count} packages ({time.perf_counter() - started:.2f}s)",
+            style="Success.TLabel")
+    
+    def save_state(self):
+        """Snapshot the system into a journal directory and keep journaling changes there"""
+        path = filedialog.askdirectory(title="Save State To")
+        if not path:
+            return
+        try:
+            if self.journal is not None and self.journal.system is self.system and \
+                    os.path.samefile(self.journal.directory, path):
+                self.journal.snapshot()
+            else:
+                self._close_journal()
+                self.journal = StateJournal(self.system, path)
+        except OSError as error:
+            messagebox.showerror("Error", f"Could not save state: {error}")
+            return
+        self.setup_status_label.config(text=f"Saved state to {path}; changes are journaled there",
+                                       style="Success.TLabel")
+    
+    def restore_state(self):
+        """Load the latest snapshot in a journal directory and replay its log"""
+        path = filedialog.askdirectory(title="Restore State From")
+        if not path:
+            return
+        self.clear_system()
+        
+        def work(task):
+            task.report(0.0, f"Restoring {path}...")
+            system = restore_system(path)
+            task.report(0.9, "Writing a fresh snapshot...")
+            return system, StateJournal(system, path)
+        
+        def done(result):
+            self.system, self.journal = result
+            self.setup_status_label.config(
+                text=f"Restored {len(self.system.packages)} active and {len(self.system.delivered_packages)} "
+                     f"delivered packages, {len(self.system.vehicles)} vehicles from {path}",
+                style="Success.TLabel"
+            )
+            self.refresh_packages()
+            self.refresh_vehicles()
+            self.tab_control.tab(1, text=f"Packages ({len(self.system.packages)})")
+            self.tab_control.tab(2, text=f"Vehicles ({len(self.system.vehicles)})")
+        
+        self._run_task("Restore", work, done)
+    
+    def _close_journal(self):
+        if self.journal is not None:
+            try:
+                self.journal.close()
+            except OSError:
+                pass  # the last batch is lost; the snapshot and earlier batches remain
+            self.journal = None
     
     def clear_system(self):
         """Clear the logistics system"""
+        self._close_journal()
         self.system = LogisticsSystem()
         self.setup_status_label.config(text="System cleared", style="Success.TLabel")
         
@@ -398,80 +1251,239 @@ class LogisticsApp:
         # Clear tracking display
         self.tracking_info_area.delete(1.0, tk.END)
         self.map_canvas.delete("all")
+        self.fleet_map.reset()
     
     # ----------------------
     # Package Management
     # ----------------------
     
+    # Tables above this many packages switch to a paged view of the visible rows only
+    VIRTUAL_TABLE_THRESHOLD = 5000
+    ROW_HEIGHT = 20
+    
+    def _reset_package_table(self, virtual=False):
+        """Drop every table row and per-row bookkeeping, e.g. after the system is replaced"""
+        children = self.packages_tree.get_children()
+        if children:
+            self.packages_tree.delete(*children)
+        self._package_items = {}  # store row -> tree item
+        self._package_status = {}  # store row -> status shown in the table
+        self._status_buckets = {status: set() for status in PACKAGE_STATUSES}
+        self._hidden_packages = set()  # rows detached by the status filter
+        self._package_revision = 0
+        self._package_table_store = self.system.store
+        self._package_virtual = virtual
+        
+        # Virtual mode: a fixed set of slot items shows the window at _package_offset
+        self._package_slots = []
+        self._package_view_rows = np.empty(0, dtype=np.int64)
+        self._package_offset = 0
+        if virtual:
+            self.packages_tree.configure(yscrollcommand="")
+            self.packages_scrollbar.config(command=self._scroll_packages)
+            self._resize_package_page()
+        else:
+            self.packages_tree.configure(yscrollcommand=self.packages_scrollbar.set)
+            self.packages_scrollbar.config(command=self.packages_tree.yview)
+    
+    @staticmethod
+    def _package_values(package):
+        delivery_time = package.actual_delivery.strftime("%Y-%m-%d %H:%M:%S") if package.actual_delivery else "-"
+        return (
+            package.id,
+            f"({package.destination[0]:.1f}, {package.destination[1]:.1f})",
+            package.priority,
+            f"{package.weight:.1f}",
+            package.status,
+            package.assigned_vehicle or "-",
+            delivery_time
+        )
+    
+    @timed()
     def refresh_packages(self):
-        """Refresh the packages table display"""
-        # Clear existing items
-        for item in self.packages_tree.get_children():
-            self.packages_tree.delete(item)
+        """Refresh the packages table, applying only rows changed since the last refresh"""
+        if self.tasks.busy:
+            return  # a background job is changing the system; its callback refreshes
+        self.fleet_map.request_redraw()
+        if self.journal is not None:
+            self.journal.maybe_flush()
+        store = self.system.store
+        virtual = len(store) > self.VIRTUAL_TABLE_THRESHOLD
+        if store is not self._package_table_store or virtual != self._package_virtual:
+            self._reset_package_table(virtual)
+        
+        if virtual:
+            self._package_revision = store.revision
+            self._update_virtual_packages()
+            return
         
         # Get selected filter
         filter_status = self.status_filter.get()
         
-        # Add active packages
-        for package in self.system.packages:
-            if filter_status == "All" or package.status == filter_status:
-                self.packages_tree.insert("", tk.END, values=(
-                    package.id, 
-                    f"({package.destination[0]:.1f}, {package.destination[1]:.1f})",
-                    package.priority,
-                    f"{package.weight:.1f}",
-                    package.status,
-                    package.assigned_vehicle or "-",
-                    "-"
-                ))
-        
-        # Add delivered packages
-        for package in self.system.delivered_packages:
-            if filter_status == "All" or package.status == filter_status:
-                delivery_time = package.actual_delivery.strftime("%Y-%m-%d %H:%M:%S") if package.actual_delivery else "-"
-                self.packages_tree.insert("", tk.END, values=(
-                    package.id, 
-                    f"({package.destination[0]:.1f}, {package.destination[1]:.1f})",
-                    package.priority,
-                    f"{package.weight:.1f}",
-                    package.status,
-                    package.assigned_vehicle or "-",
-                    delivery_time
-                ))
+        changed = store.changed_since(self._package_revision)
+        self._package_revision = store.revision
+        for row in changed.tolist():
+            package = Package._view(store, row)
+            status = package.status
+            item = self._package_items.get(row)
+            if item is None:
+                item = self._package_items[row] = self.packages_tree.insert(
+                    "", tk.END, values=self._package_values(package))
+            else:
+                self.packages_tree.item(item, values=self._package_values(package))
+            
+            # Keep the per-status buckets current
+            previous = self._package_status.get(row)
+            if previous != status:
+                if previous is not None:
+                    self._status_buckets[previous].discard(row)
+                self._status_buckets[status].add(row)
+                self._package_status[row] = status
+            
+            visible = filter_status == "All" or status == filter_status
+            if visible and row in self._hidden_packages:
+                self._hidden_packages.discard(row)
+                self.packages_tree.move(item, "", tk.END)
+            elif not visible and row not in self._hidden_packages:
+                self._hidden_packages.add(row)
+                self.packages_tree.detach(item)
     
+    @timed()
     def filter_packages(self, event=None):
         """Filter packages based on selected status"""
+        if self._package_virtual:
+            self._package_offset = 0
+            self.refresh_packages()
+            return
+        
+        # Swap visibility bucket by bucket instead of rescanning every package
+        filter_status = self.status_filter.get()
+        shown = set(self._package_status) if filter_status == "All" else self._status_buckets[filter_status]
+        hide = [self._package_items[row] for status, bucket in self._status_buckets.items()
+                if filter_status != "All" and status != filter_status
+                for row in bucket if row not in self._hidden_packages]
+        if hide:
+            self.packages_tree.detach(*hide)
+        for status, bucket in self._status_buckets.items():
+            if filter_status != "All" and status != filter_status:
+                self._hidden_packages |= bucket
+        for row in sorted(shown & self._hidden_packages):
+            self.packages_tree.move(self._package_items[row], "", tk.END)
+        self._hidden_packages -= shown
+        
         self.refresh_packages()
     
+    # ----------------------
+    # Virtual Package Table
+    # ----------------------
+    
+    def _update_virtual_packages(self):
+        """Recompute the filtered row list with column masks and redraw the visible window"""
+        filter_status = self.status_filter.get()
+        if filter_status == "All":
+            self._package_view_rows = np.concatenate((self.system.packages.rows, self.system.delivered_packages.rows))
+        else:
+            self._package_view_rows = np.flatnonzero(self.system.package_mask(status=filter_status))
+        self._fill_package_window()
+    
+    def _fill_package_window(self):
+        """Write the rows at the current offset into the reusable slot items"""
+        total = len(self._package_view_rows)
+        page = len(self._package_slots)
+        self._package_offset = max(0, min(self._package_offset, total - page))
+        window = self._package_view_rows[self._package_offset:self._package_offset + page].tolist()
+        for index, item in enumerate(self._package_slots):
+            if index < len(window):
+                self.packages_tree.item(item, values=self._package_values(Package._view(self.system.store, window[index])))
+                self.packages_tree.move(item, "", index)
+            else:
+                self.packages_tree.detach(item)
+        if total:
+            self.packages_scrollbar.set(self._package_offset / total, (self._package_offset + len(window)) / total)
+        else:
+            self.packages_scrollbar.set(0, 1)
+    
+    def _resize_package_page(self, event=None):
+        """Match the number of slot items to the rows that fit in the table"""
+        if not self._package_virtual:
+            return
+        height = event.height if event else self.packages_tree.winfo_height()
+        page = max(1, (height - self.ROW_HEIGHT) // self.ROW_HEIGHT)
+        while len(self._package_slots) < page:
+            self._package_slots.append(self.packages_tree.insert("", tk.END, values=()))
+        while len(self._package_slots) > page:
+            self.packages_tree.delete(self._package_slots.pop())
+        self._fill_package_window()
+    
+    def _scroll_packages(self, action, amount, unit=None):
+        """Scrollbar command for virtual mode (moveto / scroll units / scroll pages)"""
+        total = len(self._package_view_rows)
+        if action == "moveto":
+            self._package_offset = int(float(amount) * total)
+        else:
+            step = len(self._package_slots) if unit == "pages" else 1
+            self._package_offset += int(amount) * step
+        self._fill_package_window()
+    
+    def _wheel_packages(self, event):
+        if not self._package_virtual:
+            return None
+        direction = -1 if getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0 else 1
+        self._scroll_packages("scroll", direction * 3, "units")
+        return "break"
+    
     # ----------------------
     # Vehicle Management
     # ----------------------
     
+    @timed()
     def refresh_vehicles(self):
-        """Refresh the vehicles table display"""
-        # Clear existing items
-        for item in self.vehicles_tree.get_children():
-            self.vehicles_tree.delete(item)
+        """Refresh the vehicles table, rewriting only rows whose values changed"""
+        if self.tasks.busy:
+            return  # a background job is changing the system; its callback refreshes
+        if self._vehicle_table_system is not self.system:
+            # New system: start over with an empty table
+            children = self.vehicles_tree.get_children()
+            if children:
+                self.vehicles_tree.delete(*children)
+            self._vehicle_items = {}
+            self._hidden_vehicles = set()
+            self._vehicle_table_system = self.system
         
         # Get selected filter
         filter_status = self.vehicle_status_filter.get()
         
-        # Add vehicles matching filter
         for vehicle in self.system.vehicles:
-            if filter_status == "All" or vehicle.status == filter_status:
-                self.vehicles_tree.insert("", tk.END, values=(
-                    vehicle.id, 
-                    vehicle.capacity,
-                    vehicle.speed,
-                    f"({vehicle.location[0]:.1f}, {vehicle.location[1]:.1f})",
-                    vehicle.status,
-                    len(vehicle.packages)
-                ))
+            values = (
+                vehicle.id, 
+                vehicle.capacity,
+                vehicle.speed,
+                f"({vehicle.location[0]:.1f}, {vehicle.location[1]:.1f})",
+                vehicle.status,
+                len(vehicle.packages)
+            )
+            entry = self._vehicle_items.get(vehicle.id)
+            if entry is None:
+                item = self.vehicles_tree.insert("", tk.END, values=values)
+            else:
+                item, previous = entry
+                if previous != values:
+                    self.vehicles_tree.item(item, values=values)
+            self._vehicle_items[vehicle.id] = (item, values)
+            
+            visible = filter_status == "All" or vehicle.status == filter_status
+            if visible and vehicle.id in self._hidden_vehicles:
+                self._hidden_vehicles.discard(vehicle.id)
+                self.vehicles_tree.move(item, "", self.system.vehicles.index(vehicle))
+            elif not visible and vehicle.id not in self._hidden_vehicles:
+                self._hidden_vehicles.add(vehicle.id)
+                self.vehicles_tree.detach(item)
     
     def filter_vehicles(self, event=None):
         """Filter vehicles based on selected status"""
         self.refresh_vehicles()
     
+    @timed()
     def show_vehicle_details(self, event=None):
         """Show details for the selected vehicle"""
         # Get selected item
@@ -483,7 +1495,7 @@ class LogisticsApp:
         vehicle_id = self.vehicles_tree.item(selection[0])["values"][0]
         
         # Find the vehicle object
-        vehicle = next((v for v in self.system.vehicles if v.id == vehicle_id), None)
+        vehicle = self.system.find_vehicle(str(vehicle_id))
         if not vehicle:
             return
         
@@ -494,8 +1506,15 @@ class LogisticsApp:
         details = f"ID: {vehicle.id}\n"
         details += f"Status: {vehicle.status}\n"
         details += f"Capacity: {vehicle.capacity}\n"
+        load = sum(package.weight for package in vehicle.packages)
+        details += f"Load: {load:.1f} ({load / vehicle.capacity:.0%} utilized)\n"
         details += f"Speed: {vehicle.speed}\n"
-        details += f"Location: ({vehicle.location[0]:.1f}, {vehicle.location[1]:.1f})\n\n"
+        details += f"Location: ({vehicle.location[0]:.1f}, {vehicle.location[1]:.1f})\n"
+        record = self.system.delivery_stats.by_vehicle.get(vehicle.id)
+        if record is not None and record.scheduled:
+            details += (f"On Time: {record.on_time} of {record.scheduled} ({record.on_time_rate:.0%}), "
+                        f"mean lateness {record.mean_lateness:.0f} min\n")
+        details += "\n"
         
         details += f"Assigned Packages ({len(vehicle.packages)}):\n"
         for package in vehicle.packages:
@@ -507,6 +1526,7 @@ class LogisticsApp:
     # Package Tracking
     # ----------------------
     
+    @timed()
     def track_package(self):
         """Track a package by ID"""
         package_id = self.package_id_entry.get().strip()
@@ -514,13 +1534,17 @@ class LogisticsApp:
             messagebox.showinfo("Info", "Please enter a package ID")
             return
         
-        # Search for the package in active and delivered packages
-        package = next((p for p in self.system.packages if p.id == package_id), None)
-        if not package:
-            package = next((p for p in self.system.delivered_packages if p.id == package_id), None)
+        # Look up the package in the system's ID index (active and delivered)
+        package = self.system.find_package(package_id)
         
         if not package:
-            messagebox.showinfo("Info", f"Package {package_id} not found")
+            # Offer IDs sharing the entered prefix before giving up
+            matches = self.system.find_packages_by_prefix(package_id)
+            if matches:
+                suggestions = ", ".join(p.id for p in matches[:10])
+                messagebox.showinfo("Info", f"Package {package_id} not found. Did you mean: {suggestions}")
+            else:
+                messagebox.showinfo("Info", f"Package {package_id} not found")
             return
         
         # Clear tracking info area
@@ -542,16 +1566,19 @@ class LogisticsApp:
         if package.estimated_delivery:
             info += f"Estimated Delivery: {package.estimated_delivery.strftime('%Y-%m-%d %H:%M:%S')}\n"
         
+        if package.eta and not package.actual_delivery:
+            info += f"Projected Arrival: {package.eta.strftime('%Y-%m-%d %H:%M:%S')}\n"
+        
         if package.actual_delivery:
             info += f"Actual Delivery: {package.actual_delivery.strftime('%Y-%m-%d %H:%M:%S')}\n"
             
-            # Determine if delivered on time
+            # Determine if delivered on time, with the same grace as the system's on-time statistics
             if package.estimated_delivery:
-                if package.actual_delivery <= package.estimated_delivery:
+                delta = package.actual_delivery - package.estimated_delivery
+                minutes_late = delta.total_seconds() / 60
+                if minutes_late <= ON_TIME_GRACE_MINUTES:
                     info += "Delivery Status: On Time ✓\n"
                 else:
-                    delta = package.actual_delivery - package.estimated_delivery
-                    minutes_late = delta.total_seconds() / 60
                     info += f"Delivery Status: {minutes_late:.0f} minutes late ✗\n"
         
         self.tracking_info_area.insert(tk.END, info)
@@ -559,6 +1586,7 @@ class LogisticsApp:
         # Update the map visualization
         self.update_package_map(package)
     
+    @timed()
     def update_package_map(self, package):
         """Update the package map visualization"""
         # Clear canvas
@@ -579,11 +1607,12 @@ class LogisticsApp:
         # Scale factor for visualization
         scale = min(width, height) / 150
         
-        # Draw depot
-        depot_x = origin_x
-        depot_y = origin_y
-        self.map_canvas.create_rectangle(depot_x-5, depot_y-5, depot_x+5, depot_y+5, fill="blue")
-        self.map_canvas.create_text(depot_x, depot_y-15, text="Depot", fill="blue")
+        # Draw depots
+        for depot in self.system.depots or [Depot("Depot")]:
+            depot_x = origin_x + depot.location[0] * scale
+            depot_y = origin_y - depot.location[1] * scale
+            self.map_canvas.create_rectangle(depot_x-5, depot_y-5, depot_x+5, depot_y+5, fill="blue")
+            self.map_canvas.create_text(depot_x, depot_y-15, text=depot.id, fill="blue")
         
         # Draw package destination
         dest_x = origin_x + package.destination[0] * scale
@@ -592,8 +1621,24 @@ class LogisticsApp:
         self.map_canvas.create_oval(dest_x-5, dest_y-5, dest_x+5, dest_y+5, fill="red")
         self.map_canvas.create_text(dest_x, dest_y-15, text=f"{package.id}", fill="red")
         
-        # Draw route line from depot to destination
-        self.map_canvas.create_line(depot_x, depot_y, dest_x, dest_y, fill="green", arrow=tk.LAST)
+        # Draw the planned route up to this package, or a straight line if none is planned
+        vehicle = self.system.find_vehicle(package.assigned_vehicle) if package.assigned_vehicle else None
+        if vehicle:
+            home = vehicle.home
+        elif package.depot is not None:
+            home = self.system.find_depot(package.depot).location
+        else:
+            home = DEPOT_LOCATION
+        depot_x = origin_x + home[0] * scale
+        depot_y = origin_y - home[1] * scale
+        if vehicle and package in vehicle.route:
+            stops = vehicle.route[:vehicle.route.index(package) + 1]
+            coords = [depot_x, depot_y]
+            for stop in stops:
+                coords += [origin_x + stop.destination[0] * scale, origin_y - stop.destination[1] * scale]
+            self.map_canvas.create_line(*coords, fill="green", arrow=tk.LAST)
+        else:
+            self.map_canvas.create_line(depot_x, depot_y, dest_x, dest_y, fill="green", arrow=tk.LAST)
         
         # Draw coordinates
         self.map_canvas.create_text(
@@ -608,9 +1653,23 @@ class LogisticsApp:
 # ----------------------
 
 def main():
+    if tk is None:
+        raise SystemExit("tkinter is not available; run the batch planner with: python x.py MANIFEST ...")
     root = tk.Tk()
     app = LogisticsApp(root)
     root.mainloop()
+    app.tasks.shutdown()
+    app._close_journal()
+    app._stop_tracking_api()
+
+
+def cli(argv=None):
+    """Headless batch run; see logistics.main for the options"""
+    return batch_main(argv)
+
 
 if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1:
+        raise SystemExit(cli())
     main()
\ No newline at end of file